@@ -6,27 +6,30 @@ __author__ = 'Zitong Lu'
 
 import numpy as np
 from neurora.rdm_corr import rdm_correlation_spearman, rdm_correlation_pearson, rdm_correlation_kendall, \
-    rdm_similarity, rdm_distance
-from neurora.stuff import show_progressbar
+    rdm_similarity, rdm_distance, rdm_correlation_spearman_batch
+from neurora.stuff import show_progressbar, CondensedRDM, rdm_vector, permutation_indices, \
+    permutation_corr_batch, mantel_indices
 
 np.seterr(divide='ignore', invalid='ignore')
 
 
 ' a function for calculating the similarity between RDMs based on RDMs of EEG-like data and a demo RDM'
 
-def rdms_corr(demo_rdm, eeg_rdms, method="spearman", rescale=False, permutation=False, iter=1000):
+def rdms_corr(demo_rdm, eeg_rdms, method="spearman", rescale=False, permutation=False, iter=1000, seed=None,
+              mantel=False):
 
     """
     Calculate the similarity between RDMs based on RDMs of EEG-like data and a demo RDM
 
     Parameters
     ----------
-    demo_rdm : array [n_cons, n_cons]
+    demo_rdm : array [n_cons, n_cons] or CondensedRDM
         A demo RDM.
-    eeg_rdms : array
+    eeg_rdms : array or CondensedRDM
         The EEG/MEG/fNIRS/ECoG/sEEG/electrophysiological RDM(s).
         The shape can be [n_cons, n_cons] or [n1, n_cons, n_cons] or [n1, n2, n_cons, n_cons] or
         [n1, n2, n3, n_cons, n_cons]. ni(i=1, 2, 3) can be int(n_ts/timw_win), n_chls, n_subs.
+        It can also be a CondensedRDM with a shape of [], [n1], [n1, n2] or [n1, n2, n3].
     method : string 'spearman' or 'pearson' or 'kendall' or 'similarity' or 'distance'. Default is 'spearman'.
         The method to calculate the similarities.
         If method='spearman', calculate the Spearman Correlations. If method='pearson', calculate the Pearson
@@ -39,6 +42,12 @@ def rdms_corr(demo_rdm, eeg_rdms, method="spearman", rescale=False, permutation=
         Use permutation test or not.
     iter : int. Default is 1000.
         The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutation test.
+    mantel : bool True or False. Default is False.
+        Permute the condition labels (the rows & columns together) of the demo RDM or not (Mantel test). Only works
+        when permutation=True.
+        If mantel=False, the values above the diagonal are permuted independently.
 
     Returns
     -------
@@ -53,146 +62,114 @@ def rdms_corr(demo_rdm, eeg_rdms, method="spearman", rescale=False, permutation=
     Notes
     -----
     The demo RDM could be a behavioral RDM, a hypothesis-based coding model RDM or a computational model RDM.
+    If method='spearman', the demo RDM is ranked only once and all the correlations are calculated in a batch (see
+    neurora.rdm_corr.rdm_correlation_spearman_batch).
+    If permutation=True, the same permutations of the demo RDM are used for all the RDMs and the permuted correlations
+    are calculated in batches (see neurora.stuff.permutation_corr_batch). If mantel=True, the permuted demo RDMs are
+    obtained from an index table of the permuted condition labels (see neurora.stuff.mantel_indices).
     """
 
-    if len(np.shape(demo_rdm)) != 2 or np.shape(demo_rdm)[0] != np.shape(demo_rdm)[1]:
+    if isinstance(demo_rdm, CondensedRDM):
+        cons = demo_rdm.n_cons
+    else:
+        cons = np.shape(demo_rdm)[0]
+
+    if isinstance(demo_rdm, CondensedRDM) == False and (len(np.shape(demo_rdm)) != 2 or
+                                                       np.shape(demo_rdm)[0] != np.shape(demo_rdm)[1]):
 
         print("\nThe shape of the demo RDM should be [n_cons, n_cons].\n")
 
         return "Invalid input!"
 
-    if len(np.shape(eeg_rdms)) < 2 or len(np.shape(eeg_rdms)) > 5 or np.shape(eeg_rdms)[-1] != np.shape(eeg_rdms)[-2]:
+    if isinstance(eeg_rdms, CondensedRDM):
 
-        print("\nThe shape of the EEG-like RDMs should be [n_cons, n_cons] or [n1, n_cons, n_cons] or "
-              "[n1, n2, n_cons, n_cons] or [n1, n2, n3, n_cons, n_cons].\n")
+        # the shape of the batch of RDMs
+        shape = eeg_rdms.shape
 
-        return "Invalid input!"
+        rdms = CondensedRDM(np.reshape(eeg_rdms.vectors, [-1, int(cons * (cons - 1) / 2)]), dtype=eeg_rdms.dtype)
 
-    if len(eeg_rdms.shape) == 5:
+    else:
 
-        print("\nComputing similarities")
+        if len(np.shape(eeg_rdms)) < 2 or len(np.shape(eeg_rdms)) > 5 or \
+                np.shape(eeg_rdms)[-1] != np.shape(eeg_rdms)[-2]:
 
-        n1, n2, n3 = eeg_rdms.shape[:3]
+            print("\nThe shape of the EEG-like RDMs should be [n_cons, n_cons] or [n1, n_cons, n_cons] or "
+                  "[n1, n2, n_cons, n_cons] or [n1, n2, n3, n_cons, n_cons].\n")
 
-        # initialize the corrs
-        corrs = np.zeros([n1, n2, n3, 2], dtype=np.float64)
+            return "Invalid input!"
 
-        total = n1 * n2 * n3
+        # the shape of the batch of RDMs
+        shape = np.shape(eeg_rdms)[:-2]
 
-        # calculate the corrs
-        for i in range(n1):
-            for j in range(n2):
-                for k in range(n3):
+        rdms = np.reshape(eeg_rdms, [-1, cons, cons])
 
-                    # show the progressbar
-                    percent = (i * n2 * n2 + j * n3 + k + 1) / total * 100
-                    show_progressbar("Calculating", percent)
+    if len(shape) > 3 or (isinstance(eeg_rdms, CondensedRDM) and eeg_rdms.n_cons != cons):
 
-                    if method == "spearman":
-                        corrs[i, j, k] = rdm_correlation_spearman(demo_rdm, eeg_rdms[i, j, k], rescale=rescale,
-                                                                  permutation=permutation, iter=iter)
-                    elif method == "pearson":
-                        corrs[i, j, k] = rdm_correlation_pearson(demo_rdm, eeg_rdms[i, j, k], rescale=rescale,
-                                                                 permutation=permutation, iter=iter)
-                    elif method == "kendall":
-                        corrs[i, j, k] = rdm_correlation_kendall(demo_rdm, eeg_rdms[i, j, k], rescale=rescale,
-                                                                 permutation=permutation, iter=iter)
-                    elif method == "similarity":
-                        corrs[i, j, k, 0] = rdm_similarity(demo_rdm, eeg_rdms[i, j, k], rescale=rescale)
-                    elif method == "distance":
-                        corrs[i, j, k, 0] = rdm_distance(demo_rdm, eeg_rdms[i, j, k], rescale=rescale)
-
-        print("\nComputing finished!")
-
-        return corrs
+        print("\nThe shape of the EEG-like RDMs should be [n_cons, n_cons] or [n1, n_cons, n_cons] or "
+              "[n1, n2, n_cons, n_cons] or [n1, n2, n3, n_cons, n_cons].\n")
 
-    if len(eeg_rdms.shape) == 4:
+        return "Invalid input!"
 
+    if len(shape) == 0:
+        print("\nComputing the similarity")
+    else:
         print("\nComputing similarities")
 
-        n1, n2 = eeg_rdms.shape[:2]
-
-        # initialize the corrs
-        corrs = np.zeros([n1, n2, 2], dtype=np.float64)
-
-        total = n1 * n2
-
-        # calculate the corrs
-        for i in range(n1):
-            for j in range(n2):
-
-                if method == "spearman":
-                    corrs[i, j] = rdm_correlation_spearman(demo_rdm, eeg_rdms[i, j], rescale=rescale,
-                                                           permutation=permutation, iter=iter)
-                elif method == "pearson":
-                    corrs[i, j] = rdm_correlation_pearson(demo_rdm, eeg_rdms[i, j], rescale=rescale,
-                                                          permutation=permutation, iter=iter)
-                elif method == "kendall":
-                    corrs[i, j] = rdm_correlation_kendall(demo_rdm, eeg_rdms[i, j], rescale=rescale,
-                                                          permutation=permutation, iter=iter)
-                elif method == "similarity":
-                    corrs[i, j, 0] = rdm_similarity(demo_rdm, eeg_rdms[i, j], rescale=rescale)
-                elif method == "distance":
-                    corrs[i, j, 0] = rdm_distance(demo_rdm, eeg_rdms[i, j], rescale=rescale)
-
-        print("\nComputing finished!")
+    n = len(rdms)
 
-        return corrs
-
-    if len(eeg_rdms.shape) == 3:
+    # initialize the corrs
+    corrs = np.zeros([n, 2], dtype=np.float64)
 
-        print("\nComputing similarities")
+    # calculate all the Spearman Correlations in a batch
+    if method == "spearman":
+        corrs = rdm_correlation_spearman_batch(demo_rdm, rdms)
+        n = 0
 
-        n1 = eeg_rdms.shape[0]
+    # calculate the corrs
+    for i in range(n):
 
-        # initialize the corrs
-        corrs = np.zeros([n1, 2], dtype=np.float64)
+        # show the progressbar
+        if n > 1:
+            percent = (i + 1) / n * 100
+            show_progressbar("Calculating", percent)
 
-        # calculate the corrs
-        for i in range(n1):
-            if method == "spearman":
-                corrs[i] = rdm_correlation_spearman(demo_rdm, eeg_rdms[i], rescale=rescale, permutation=permutation,
-                                                    iter=iter)
-            elif method == "pearson":
-                corrs[i] = rdm_correlation_pearson(demo_rdm, eeg_rdms[i], rescale=rescale, permutation=permutation,
-                                                   iter=iter)
-            elif method == "kendall":
-                corrs[i] = rdm_correlation_kendall(demo_rdm, eeg_rdms[i], rescale=rescale, permutation=permutation,
-                                                   iter=iter)
-            elif method == "similarity":
-                corrs[i, 0] = rdm_similarity(demo_rdm, eeg_rdms[i], rescale=rescale)
-            elif method == "distance":
-                corrs[i, 0] = rdm_distance(demo_rdm, eeg_rdms[i], rescale=rescale)
+        if method == "spearman":
+            corrs[i] = rdm_correlation_spearman(demo_rdm, rdms[i], rescale=rescale)
+        elif method == "pearson":
+            corrs[i] = rdm_correlation_pearson(demo_rdm, rdms[i], rescale=rescale)
+        elif method == "kendall":
+            corrs[i] = rdm_correlation_kendall(demo_rdm, rdms[i], rescale=rescale)
+        elif method == "similarity":
+            corrs[i, 0] = rdm_similarity(demo_rdm, rdms[i], rescale=rescale)
+        elif method == "distance":
+            corrs[i, 0] = rdm_distance(demo_rdm, rdms[i], rescale=rescale)
 
-        print("\nComputing finished!")
+    # the permutation test with the same permutations for all the RDMs
+    if permutation == True and (method == "spearman" or method == "pearson" or method == "kendall"):
 
-        return corrs
+        iu = np.triu_indices(cons, 1)
 
-    print("\nComputing the similarity")
+        if isinstance(rdms, CondensedRDM):
+            vectors = rdms.vectors
+        else:
+            vectors = rdms[:, iu[0], iu[1]]
 
-    # initialize the corrs
-    corr = np.zeros([2], dtype=np.float64)
+        if mantel == True:
+            perms = mantel_indices(cons, iter=iter, seed=seed)
+        else:
+            perms = permutation_indices(len(iu[0]), iter=iter, seed=seed)
 
-    # calculate the corrs
-    if method == "spearman":
-        corr = rdm_correlation_spearman(demo_rdm, eeg_rdms, rescale=rescale, permutation=permutation, iter=iter)
-    elif method == "pearson":
-        corr = rdm_correlation_pearson(demo_rdm, eeg_rdms, rescale=rescale, permutation=permutation, iter=iter)
-    elif method == "kendall":
-        corr = rdm_correlation_kendall(demo_rdm, eeg_rdms, rescale=rescale, permutation=permutation, iter=iter)
-    elif method == "similarity":
-        corr[0] = rdm_similarity(demo_rdm, eeg_rdms, rescale=rescale)
-    elif method == "distance":
-        corr[0] = rdm_distance(demo_rdm, eeg_rdms, rescale=rescale)
+        corrs[:, 1] = permutation_corr_batch(rdm_vector(demo_rdm), vectors, method=method, perms=perms)
 
     print("\nComputing finished!")
 
-    return corr
+    return np.reshape(corrs, tuple(shape) + (2,))
 
 
 ' a function for calculating the similarity between fMRI searchlight RDMs and a demo RDM'
 
-def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permutation=False, iter=1000):
+def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permutation=False, iter=1000, seed=None,
+                  mantel=False):
 
 
     """
@@ -200,12 +177,16 @@ def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permuta
 
     Parameters
     ----------
-    demo_rdm : array [n_cons, n_cons]
+    demo_rdm : array [n_cons, n_cons] or CondensedRDM
         A demo RDM.
-    fmri_rdms : array
+    fmri_rdms : array or string or CondensedRDM
         The fMRI-Searchlight RDMs.
         The shape of RDMs is [n_x, n_y, n_z, n_cons, n_cons]. n_x, n_y, n_z represent the number of calculation units
         for searchlight along the x, y, z axis.
+        The RDMs can also be the upper triangles of the RDMs with a shape of [n_x, n_y, n_z, n_cons*(n_cons-1)/2],
+        such as the results of fmriRDM(..., sub_opt=0, out=filename), or the filename of a .npy file saving them.
+        The .npy file is memory-mapped and read slice by slice.
+        A CondensedRDM with a shape of [n_x, n_y, n_z] is also supported.
     method : string 'spearman' or 'pearson' or 'kendall' or 'similarity' or 'distance'. Default is 'spearman'.
         The method to calculate the similarities.
         If method='spearman', calculate the Spearman Correlations. If method='pearson', calculate the Pearson
@@ -218,6 +199,12 @@ def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permuta
         Use permutation test or not.
     iter : int. Default is 1000.
         The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutation test.
+    mantel : bool True or False. Default is False.
+        Permute the condition labels (the rows & columns together) of the demo RDM or not (Mantel test). Only works
+        when permutation=True.
+        If mantel=False, the values above the diagonal are permuted independently.
 
     Returns
     -------
@@ -229,15 +216,41 @@ def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permuta
     Notes
     -----
     The demo RDM could be a behavioral RDM, a hypothesis-based coding model RDM or a computational model RDM.
+    If method='spearman', the demo RDM is ranked only once and all the correlations are calculated in a batch (see
+    neurora.rdm_corr.rdm_correlation_spearman_batch).
+    If permutation=True, the same permutations of the demo RDM are used for all the RDMs and the permuted correlations
+    are calculated in batches (see neurora.stuff.permutation_corr_batch). If mantel=True, the permuted demo RDMs are
+    obtained from an index table of the permuted condition labels (see neurora.stuff.mantel_indices).
     """
 
-    if len(np.shape(demo_rdm)) != 2 or np.shape(demo_rdm)[0] != np.shape(demo_rdm)[1]:
+    if isinstance(demo_rdm, CondensedRDM) == False and (len(np.shape(demo_rdm)) != 2 or
+                                                       np.shape(demo_rdm)[0] != np.shape(demo_rdm)[1]):
 
         print("\nThe shape of the demo RDM should be [n_cons, n_cons].\n")
 
         return "Invalid input!"
 
-    if len(np.shape(fmri_rdms)) != 5 or np.shape(fmri_rdms)[3] != np.shape(fmri_rdms)[4]:
+    if isinstance(fmri_rdms, str):
+        fmri_rdms = np.load(fmri_rdms, mmap_mode="r")
+
+    if isinstance(fmri_rdms, CondensedRDM):
+        fmri_rdms = fmri_rdms.vectors
+
+    # the upper triangles of the RDMs
+    condensed = len(np.shape(fmri_rdms)) == 4
+
+    if isinstance(demo_rdm, CondensedRDM):
+        cons = demo_rdm.n_cons
+    else:
+        cons = np.shape(demo_rdm)[0]
+
+    if condensed == True and np.shape(fmri_rdms)[3] != int(cons * (cons - 1) / 2):
+
+        print("\nThe shape of the fMRI RDMs should be [n_x, n_y, n_z, n_cons*(n_cons-1)/2].\n")
+
+        return "Invalid input!"
+
+    if condensed == False and (len(np.shape(fmri_rdms)) != 5 or np.shape(fmri_rdms)[3] != np.shape(fmri_rdms)[4]):
 
         print("\nThe shape of the fMRI RDMs should be [n_x, n_y, n_z, n_cons, n_cons].\n")
 
@@ -253,27 +266,59 @@ def fmrirdms_corr(demo_rdm, fmri_rdms, method="spearman", rescale=False, permuta
     # initialize the corrs
     corrs = np.full([n_x, n_y, n_z, 2], np.nan)
 
+    # the indices of the upper triangle of an RDM
+    iu = np.triu_indices(cons, 1)
+
+    # the same permutations for all the RDMs
+    if permutation == True and mantel == True:
+        perms = mantel_indices(cons, iter=iter, seed=seed)
+    elif permutation == True:
+        perms = permutation_indices(len(iu[0]), iter=iter, seed=seed)
+
     total = n_x * n_y * n_z
 
     # calculate the corrs
     for i in range(n_x):
-        for j in range(n_y):
-            for k in range(n_z):
-
-                # show the progressbar
-                percent = (i * n_y * n_z + j * n_z + k + 1) / total * 100
-                show_progressbar("Calculating", percent)
-
-                if method == "spearman":
-                    corrs[i, j, k] = rdm_correlation_spearman(demo_rdm, fmri_rdms[i, j, k], rescale=rescale, permutation=permutation, iter=iter)
-                elif method == "pearson":
-                    corrs[i, j, k] = rdm_correlation_pearson(demo_rdm, fmri_rdms[i, j, k], rescale=rescale, permutation=permutation, iter=iter)
-                elif method == "kendall":
-                    corrs[i, j, k] = rdm_correlation_kendall(demo_rdm, fmri_rdms[i, j, k], rescale=rescale, permutation=permutation, iter=iter)
-                elif method == "similarity":
-                    corrs[i, j, k, 0] = rdm_similarity(demo_rdm, fmri_rdms[i, j, k], rescale=rescale)
-                elif method == "distance":
-                    corrs[i, j, k, 0] = rdm_distance(demo_rdm, fmri_rdms[i, j, k], rescale=rescale)
+
+        # read the RDMs slice by slice
+        # shape of vectors: [n_y, n_z, n_cons*(n_cons-1)/2]
+        if condensed == True:
+            vectors = np.asarray(fmri_rdms[i])
+            rdms = CondensedRDM(vectors)
+        else:
+            rdms = np.asarray(fmri_rdms[i])
+            vectors = rdms[:, :, iu[0], iu[1]]
+
+        # calculate the Spearman Correlations of the slice in a batch
+        if method == "spearman":
+
+            # show the progressbar
+            percent = (i + 1) / n_x * 100
+            show_progressbar("Calculating", percent)
+
+            corrs[i] = rdm_correlation_spearman_batch(demo_rdm, rdms)
+
+        else:
+
+            for j in range(n_y):
+                for k in range(n_z):
+
+                    # show the progressbar
+                    percent = (i * n_y * n_z + j * n_z + k + 1) / total * 100
+                    show_progressbar("Calculating", percent)
+
+                    if method == "pearson":
+                        corrs[i, j, k] = rdm_correlation_pearson(demo_rdm, rdms[j, k], rescale=rescale)
+                    elif method == "kendall":
+                        corrs[i, j, k] = rdm_correlation_kendall(demo_rdm, rdms[j, k], rescale=rescale)
+                    elif method == "similarity":
+                        corrs[i, j, k, 0] = rdm_similarity(demo_rdm, rdms[j, k], rescale=rescale)
+                    elif method == "distance":
+                        corrs[i, j, k, 0] = rdm_distance(demo_rdm, rdms[j, k], rescale=rescale)
+
+        # the permutation test of the slice
+        if permutation == True and (method == "spearman" or method == "pearson" or method == "kendall"):
+            corrs[i, :, :, 1] = permutation_corr_batch(rdm_vector(demo_rdm), vectors, method=method, perms=perms)
 
     print("\nComputing finished!")
 
@@ -7,557 +7,753 @@ __author__ = 'Zitong Lu'
 import numpy as np
 from sklearn.svm import SVC
 from sklearn.model_selection import train_test_split, StratifiedKFold
-from sklearn.preprocessing import StandardScaler
-from neurora.stuff import show_progressbar
+from neurora.stuff import show_progressbar, sliding_time_windows, window_average, ledoit_wolf_shrinkage, \
+    to_shared_memory, from_shared_memory, pool_imap
 
 np.seterr(divide='ignore', invalid='ignore')
 
-' a function for time-by-time decoding for EEG-like data (cross validation) '
+' a function for fitting the linear classifiers of all the time-points '
 
-def tbyt_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, nfolds=5, nrepeats=2,
-                        normalization=False, smooth=True):
+def linear_classifiers_fit(x, y, n=2, classifier="svm", normalization=False):
 
     """
-    Conduct time-by-time decoding for EEG-like data (cross validation)
+    Fit a linear classifier for each time-point and return the weights of all the classifiers
 
     Parameters
     ----------
-    data : array
-        The neural data.
-        The shape of data must be [n_subs, n_trials, n_chls, n_ts]. n_subs, n_trials, n_chls and n_ts represent the
-        number of subjects, the number of trails, the number of channels and the number of time-points.
-    labels : array
-        The labels of each trial.
-        The shape of labels must be [n_subs, n_trials]. n_subs and n_trials represent the number of subjects and the
-        number of trials.
+    x : array
+        The training data. The shape of x must be [n_trials, n_features, n_ts].
+    y : array
+        The labels (0, 1, ..., n-1) of the training trials. The shape of y must be [n_trials].
     n : int. Default is 2.
         The number of categories for classification.
-    navg : int. Default is 5.
-        The number of trials used to average.
-    time_opt : string "average" or "features". Default is "average".
-        Average the time-points or regard the time points as features for classification
-        If time_opt="average", the time-points in a certain time-window will be averaged.
-        If time_opt="features", the time-points in a certain time-window will be used as features for classification.
-    time_win : int. Default is 5.
-        Set a time-window for decoding for different time-points.
-        If time_win=5, that means each decoding process based on 5 time-points.
-    time_step : int. Default is 5.
-        The time step size for each time of decoding.
-    nfolds : int. Default is 5.
-        The number of folds.
-        k should be at least 2.
-    nrepeats : int. Default is 2.
-        The times for iteration.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier.
+        If classifier='svm', a linear Support Vector Machine (sklearn.svm.SVC) is fitted for each time-point.
+        If classifier='lda', a Linear Discriminant Analysis with the Ledoit-Wolf shrinkage of the covariance of each
+        category is used (the same as sklearn's LinearDiscriminantAnalysis(solver='lsqr', shrinkage='auto')).
+        If classifier='ridge', a ridge regression classifier (alpha=1) on the one-hot (-1 & 1) labels is used.
+        The 'lda' & 'ridge' classifiers are solved in closed form for all the time-points at once.
     normalization : boolean True or False. Default is False.
-        Normalize the data or not.
-    smooth : boolean True or False. Default is True.
-        Smooth the decoding result or not.
+        Normalize the data (by the mean & the standard deviation of the training data) or not. The normalization is
+        absorbed into the weights, so that the raw test data can be scored directly.
 
     Returns
     -------
-    accuracies : array
-        The time-by-time decoding accuracies.
-        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1].
+    weights : array
+        The weights of the classifiers. The shape of weights is [n_ts, n_features, n_scores].
+    biases : array
+        The biases of the classifiers. The shape of biases is [n_ts, n_scores].
+        For classifier='svm' & n>2, n_scores is n*(n-1)/2 (the one-vs-one decision values). Otherwise, n_scores is n
+        and the predicted category is the one with the highest score.
     """
 
-    if np.shape(data)[0] != np.shape(labels)[0]:
+    # shape of x: [n_ts, n_trials, n_features]
+    x = np.transpose(np.asarray(x, dtype=np.float64), (2, 0, 1))
+    y = np.asarray(y, dtype=int)
+    nts, ntrials, nfeatures = np.shape(x)
 
-        print("\nThe number of epochs doesn't match the number of labels.\n")
+    if normalization is True:
+        mean = np.average(x, axis=1, keepdims=True)
+        std = np.std(x, axis=1, keepdims=True)
+        std[std == 0] = 1
+        x = (x - mean) / std
 
-        return "Invalid input!"
+    if classifier == "svm":
 
-    nsubs, ntrials, nchls, nts = np.shape(data)
+        nscores = n if n == 2 else n * (n - 1) // 2
 
-    ncategories = np.zeros([nsubs], dtype=int)
+        weights = np.zeros([nts, nfeatures, nscores])
+        biases = np.zeros([nts, nscores])
 
-    labels = np.array(labels)
+        for t in range(nts):
 
-    for sub in range(nsubs):
+            svm = SVC(kernel='linear', tol=1e-4, probability=False)
+            svm.fit(x[t], y)
 
-        sublabels_set = set(labels[sub].tolist())
-        ncategories[sub] = len(sublabels_set)
+            if n == 2:
+                # the scores of the 2 categories are -decision & decision
+                weights[t] = np.concatenate((-svm.coef_, svm.coef_)).T
+                biases[t] = np.concatenate((-svm.intercept_, svm.intercept_))
+            else:
+                weights[t] = svm.coef_.T
+                biases[t] = svm.intercept_
+
+    elif classifier == "lda":
+
+        # the class means & the within-class residuals
+        onehot = np.eye(n)[y]
+        counts = np.sum(onehot, axis=0)
+        means = np.matmul(onehot.T, x) / counts[:, None]
+        residuals = x - means[:, y]
+
+        # the covariance of each category is shrunk by the Ledoit-Wolf shrinkage of its standardized residuals and the
+        # covariances are weighted by the priors, so cov = diag(d) + u.T * u, where u stacks the scaled residuals
+        d = np.zeros([nts, nfeatures])
+        u = np.zeros([nts, ntrials, nfeatures])
+
+        for k in range(n):
+
+            r = residuals[:, y == k]
+            scale = np.std(r, axis=1)
+            scale[scale == 0] = 1
+
+            shrinkage, mu = ledoit_wolf_shrinkage(r / scale[:, None])
+            d = d + (counts[k] / ntrials * shrinkage * mu)[:, None] * scale ** 2
+            u[:, y == k] = np.sqrt((1 - shrinkage) / ntrials)[:, None, None] * r
+
+        # shape of means: [n_ts, n, n_features] -> [n_ts, n_features, n]
+        means = np.transpose(means, (0, 2, 1))
+
+        if nfeatures > ntrials and np.all(d > 0):
+            # Woodbury identity: inv(cov) = inv(D) - inv(D) * u.T * inv(I + u * inv(D) * u.T) * u * inv(D)
+            ud = u / d[:, None]
+            inner = np.matmul(ud, np.transpose(u, (0, 2, 1))) + np.eye(ntrials)
+            weights = means / d[:, :, None] - np.matmul(np.transpose(ud, (0, 2, 1)),
+                                                        np.linalg.solve(inner, np.matmul(ud, means)))
+        else:
+            # the pseudo-inverse gives the least-squares solution (as sklearn) if the covariance is singular
+            cov = np.matmul(np.transpose(u, (0, 2, 1)), u) + d[:, :, None] * np.eye(nfeatures)
+            weights = np.matmul(np.linalg.pinv(cov, hermitian=True), means)
+
+        biases = -0.5 * np.sum(weights * means, axis=1) + np.log(counts / ntrials)
+
+    elif classifier == "ridge":
+
+        targets = 2 * np.eye(n)[y] - 1
+
+        xmean = np.average(x, axis=1, keepdims=True)
+        ymean = np.average(targets, axis=0)
+        xc = x - xmean
+        yc = targets - ymean
+
+        # solve in the smaller of the feature & the trial spaces
+        if nfeatures <= ntrials:
+            gram = np.matmul(np.transpose(xc, (0, 2, 1)), xc) + np.eye(nfeatures)
+            weights = np.linalg.solve(gram, np.matmul(np.transpose(xc, (0, 2, 1)), yc))
+        else:
+            gram = np.matmul(xc, np.transpose(xc, (0, 2, 1))) + np.eye(ntrials)
+            weights = np.matmul(np.transpose(xc, (0, 2, 1)), np.linalg.solve(gram, np.broadcast_to(yc, (nts, ntrials,
+                                                                                                           n))))
+        biases = ymean - np.matmul(xmean, weights)[:, 0]
 
-    if len(set(ncategories.tolist())) != 1:
+    else:
 
-        print("\nInvalid labels!\n")
+        print("\nThe classifier should be 'svm' or 'lda' or 'ridge'.\n")
 
         return "Invalid input!"
 
-    if n != ncategories[0]:
+    if normalization is True:
+        # absorb the normalization into the weights
+        weights = weights / np.transpose(std, (0, 2, 1))
+        biases = biases - np.matmul(mean, weights)[:, 0]
 
-        print("\nThe number of categories for decoding doesn't match ncategories (" + str(ncategories) + ")!\n")
+    return weights, biases
 
-        return "Invalid input!"
 
-    categories = list(sublabels_set)
+' a function for predicting the categories by the linear classifiers of all the time-points '
 
-    newnts = int((nts-time_win)/time_step)+1
+def linear_classifiers_predict(weights, biases, x, n=2, classifier="svm", cross=False):
 
-    if time_opt == "average":
+    """
+    Predict the categories of the trials by the linear classifiers fitted by linear_classifiers_fit()
 
-        avgt_data = np.zeros([nsubs, ntrials, nchls, newnts])
+    Parameters
+    ----------
+    weights : array
+        The weights of the classifiers. The shape of weights must be [n_ts, n_features, n_scores].
+    biases : array
+        The biases of the classifiers. The shape of biases must be [n_ts, n_scores].
+    x : array
+        The test data. The shape of x must be [n_trials, n_features, n_ts].
+    n : int. Default is 2.
+        The number of categories for classification.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier used by linear_classifiers_fit().
+    cross : boolean True or False. Default is False.
+        Score the test data of every time-point by the classifiers of every time-point (temporal generalization) or
+        only by the classifiers of the same time-points.
 
-        for t in range(newnts):
-            avgt_data[:, :, :, t] = np.average(data[:, :, :, t * time_step:t * time_step + time_win], axis=3)
+    Returns
+    -------
+    predictions : array
+        The predicted categories (0, 1, ..., n-1).
+        If cross=False, the shape of predictions is [n_ts, n_trials].
+        If cross=True, the shape of predictions is [n_ts_train, n_trials, n_ts_test].
+    """
 
-        acc = np.zeros([nsubs, newnts])
+    if cross is True:
 
-        total = nsubs * nrepeats * newnts * nfolds
+        nts = np.shape(weights)[0]
+        ntrials, nfeatures, ntests = np.shape(x)
 
-        for sub in range(nsubs):
+        # shape of x: [n_trials*n_ts_test, n_features]
+        x = np.reshape(np.transpose(x, (0, 2, 1)), [ntrials * ntests, nfeatures])
 
-            ns = np.zeros([n], dtype=int)
+        predictions = np.zeros([nts, ntrials, ntests], dtype=int)
 
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+        # score the test data by blocks of classifiers to limit the memory
+        block = max(1, int(2 ** 22 / (ntrials * ntests * np.shape(weights)[2])))
 
-            minn = int(np.min(ns) / navg)
+        for t in range(0, nts, block):
 
-            subacc = np.zeros([nrepeats, newnts, nfolds])
+            # shape of scores: [block, n_trials*n_ts_test, n_scores]
+            scores = np.matmul(x, weights[t:t + block]) + biases[t:t + block, None]
+            predictions[t:t + block] = np.reshape(linear_scores_to_labels(scores, n, classifier),
+                                                  [-1, ntrials, ntests])
 
-            for i in range(nrepeats):
+        return predictions
 
-                datai = np.zeros([n, minn * navg, nchls, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+    # the scores of all the time-points by one batched matrix product
+    # shape of scores: [n_ts, n_trials, n_scores]
+    scores = np.matmul(np.transpose(x, (2, 0, 1)), weights) + biases[:, None]
 
-                for j in range(n):
-                    labelsi[j] = j
+    return linear_scores_to_labels(scores, n, classifier)
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
 
-                m = np.zeros([n], dtype=int)
+' a function for converting the scores of the linear classifiers to the predicted categories '
 
-                for j in range(ntrials):
-                    for k in range(n):
+def linear_scores_to_labels(scores, n=2, classifier="svm"):
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+    """
+    Convert the scores of the linear classifiers to the predicted categories
 
-                avg_datai = np.zeros([n, minn, nchls, newnts])
+    Parameters
+    ----------
+    scores : array
+        The scores. The shape of scores must be [..., n_scores].
+    n : int. Default is 2.
+        The number of categories for classification.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier used by linear_classifiers_fit().
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+    Returns
+    -------
+    predictions : array
+        The predicted categories (0, 1, ..., n-1). The shape of predictions is [...].
+    """
 
-                x = np.reshape(avg_datai, [n * minn, nchls, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    if classifier == "svm" and n > 2:
 
-                for t in range(newnts):
+        # the one-vs-one votes (a positive decision value votes for the first category of the pair)
+        votes = np.zeros(np.shape(scores)[:-1] + (n, ))
 
-                    state = np.random.randint(0, 100)
-                    kf = StratifiedKFold(n_splits=nfolds, shuffle=True, random_state=state)
-                    xt = x[:, :, t]
+        k = 0
+        for i in range(n):
+            for j in range(i + 1, n):
+                votes[..., i] += scores[..., k] > 0
+                votes[..., j] += scores[..., k] <= 0
+                k = k + 1
 
-                    fold_index = 0
-                    for train_index, test_index in kf.split(xt, y):
+        scores = votes
 
-                        if normalization is False:
+    return np.argmax(scores, axis=-1)
 
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(xt[train_index], y[train_index])
-                            subacc[i, t, fold_index] = svm.score(xt[test_index], y[test_index])
 
-                        if normalization is True:
-                            scaler = StandardScaler()
-                            x_train = scaler.fit_transform(xt[train_index])
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(x_train, y[train_index])
-                            subacc[i, t, fold_index] = svm.score(scaler.transform(xt[test_index]), y[test_index])
+' a function for extracting the features of each time-window for the decoding functions '
 
-                        percent = (sub * nrepeats * newnts * nfolds + i * newnts * nfolds + t * nfolds + fold_index + 1) / total * 100
-                        show_progressbar("Calculating", percent)
+def decoding_features(data, time_opt="average", time_win=5, time_step=5):
+
+    """
+    Extract the features of each time-window of the trials
 
-                        if sub == (nsubs - 1) and i == (nrepeats - 1) and t == (newnts - 1) and fold_index == (
-                                nfolds - 1):
-                            print("\nDecoding finished!\n")
+    Parameters
+    ----------
+    data : array
+        The neural data. The shape of data must be [n_subs, n_trials, n_chls, n_ts].
+    time_opt : string "average" or "features". Default is "average".
+        Average the time-points or regard the time points as features for classification.
+    time_win : int. Default is 5.
+        The time-window.
+    time_step : int. Default is 5.
+        The time step size.
 
-                        fold_index = fold_index + 1
+    Returns
+    -------
+    features : array
+        The features. The shape of features is [n_subs, n_trials, n_features, int((n_ts-time_win)/time_step)+1].
+        If time_opt="average", n_features is n_chls. If time_opt="features", n_features is n_chls*time_win.
+    """
 
-            acc[sub] = np.average(subacc, axis=(0, 2))
+    nsubs, ntrials, nchls, nts = np.shape(data)
 
     if time_opt == "features":
 
-        avgt_data = np.zeros([nsubs, ntrials, nchls, time_win, newnts])
+        newnts = int((nts - time_win) / time_step) + 1
 
-        for t in range(newnts):
-            avgt_data[:, :, :, :, t] = data[:, :, :, t * time_step:t * time_step + time_win]
+        # shape of features: [nsubs, ntrials, nchls, newnts, time_win] -> [nsubs, ntrials, nchls*time_win, newnts]
+        features = np.transpose(sliding_time_windows(data, time_win, time_step), (0, 1, 2, 4, 3))
 
-        avgt_data = np.reshape(avgt_data, [nsubs, ntrials, nchls*time_win, newnts])
+        return np.reshape(features, [nsubs, ntrials, nchls * time_win, newnts])
 
-        acc = np.zeros([nsubs, newnts])
+    return window_average(data, time_win, time_step)
 
-        total = nsubs * nrepeats * newnts * nfolds
 
-        for sub in range(nsubs):
+' a function for converting the labels to the indices of the categories for the decoding functions '
 
-            ns = np.zeros([n], dtype=int)
+def decoding_labels(labels, categories=None):
 
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+    """
+    Convert the labels of each subject to the indices (0, 1, ..., n-1) of the categories
 
-            minn = int(np.min(ns) / navg)
+    Parameters
+    ----------
+    labels : array
+        The labels of each trial. The shape of labels must be [n_subs, n_trials].
+    categories : array. Default is None.
+        The categories of each subject. The shape of categories must be [n_subs, n].
+        If categories=None, the sorted unique labels of each subject are used.
+
+    Returns
+    -------
+    indices : array
+        The indices of the categories. The shape of indices is [n_subs, n_trials].
+        The trials whose labels are not in the categories get the index -1.
+    categories : array
+        The categories of each subject. The shape of categories is [n_subs, n].
+    """
 
-            subacc = np.zeros([nrepeats, newnts, nfolds])
+    labels = np.asarray(labels)
 
-            for i in range(nrepeats):
+    if categories is None:
+        categories = np.array([np.unique(sublabels) for sublabels in labels])
 
-                datai = np.zeros([n, minn * navg, nchls * time_win, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+    indices = np.full(np.shape(labels), -1, dtype=int)
 
-                for j in range(n):
-                    labelsi[j] = j
+    for sub in range(np.shape(labels)[0]):
+        for k, category in enumerate(categories[sub]):
+            indices[sub, labels[sub] == category] = k
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+    return indices, categories
 
-                m = np.zeros([n], dtype=int)
 
-                for j in range(ntrials):
-                    for k in range(n):
+' a function for building the pseudo-trials of a subject for the decoding functions '
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+def decoding_pseudo_trials(data, labels, n=2, navg=5, nrepeats=1, rng=None):
+
+    """
+    Build the class-balanced pseudo-trials (averages of navg trials) of a subject for several repeats at once
 
-                avg_datai = np.zeros([n, minn, nchls * time_win, newnts])
+    Parameters
+    ----------
+    data : array
+        The features of the trials. The shape of data must be [n_trials, n_features, n_tws].
+    labels : array
+        The indices (0, 1, ..., n-1) of the categories of the trials. The shape of labels must be [n_trials].
+        The trials with negative indices are ignored.
+    n : int. Default is 2.
+        The number of categories.
+    navg : int. Default is 5.
+        The number of trials used to average.
+    nrepeats : int. Default is 1.
+        The number of repeats. The trials are shuffled independently for each repeat.
+    rng : numpy.random.Generator or int or None. Default is None.
+        The random generator (or the seed of it) for shuffling the trials.
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+    Returns
+    -------
+    pseudo : array
+        The pseudo-trials. The shape of pseudo is [nrepeats, n, minn, n_features, n_tws]. minn is the number of
+        pseudo-trials of each category, int(the number of trials of the smallest category / navg).
+
+    Notes
+    -----
+    In each repeat, the trials are sorted by their categories and shuffled within each category by sorting random
+    keys, so the trials of each category in all the repeats are drawn by one argsort.
+    """
 
-                x = np.reshape(avg_datai, [n * minn, nchls * time_win, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    rng = np.random.default_rng(rng)
+    labels = np.asarray(labels, dtype=int)
 
-                for t in range(newnts):
+    ntrials, nfeatures, nts = np.shape(data)
 
-                    state = np.random.randint(0, 100)
-                    kf = StratifiedKFold(n_splits=nfolds, shuffle=True, random_state=state)
-                    xt = x[:, :, t]
+    # the number of trials of each category & the start of each category in the sorted trials
+    ns = np.bincount(labels[labels >= 0], minlength=n)[:n]
+    starts = np.concatenate(([np.sum(labels < 0)], np.sum(labels < 0) + np.cumsum(ns)[:-1]))
 
-                    fold_index = 0
-                    for train_index, test_index in kf.split(xt, y):
+    minn = int(np.min(ns) / navg)
 
-                        if normalization is True:
-                            scaler = StandardScaler()
-                            x_train = scaler.fit_transform(xt[train_index])
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(x_train, y[train_index])
-                            subacc[i, t, fold_index] = svm.score(scaler.transform(xt[test_index]), y[test_index])
+    # shape of order: [nrepeats, ntrials], the trials grouped by categories & shuffled within each category
+    order = np.argsort(labels + rng.random([nrepeats, ntrials]), axis=1)
 
-                        if normalization is False:
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(xt[train_index], y[train_index])
-                            subacc[i, t, fold_index] = svm.score(xt[test_index], y[test_index])
+    # shape of index: [nrepeats, n, minn, navg]
+    index = order[:, starts[:, None] + np.arange(minn * navg)]
+    index = np.reshape(index, [nrepeats, n, minn, navg])
 
-                        percent = (sub * nrepeats * newnts * nfolds + i * newnts * nfolds + t * nfolds + fold_index + 1) / total * 100
-                        show_progressbar("Calculating", percent)
+    # average the trials of each pseudo-trial
+    pseudo = np.zeros([nrepeats, n, minn, nfeatures, nts])
 
-                        if sub == (nsubs - 1) and i == (nrepeats - 1) and t == (newnts - 1) and fold_index == (
-                                nfolds - 1):
-                            print("\nDecoding finished!\n")
+    for j in range(navg):
+        pseudo += data[index[..., j]]
 
-                        fold_index = fold_index + 1
+    return pseudo / navg
 
-            acc[sub] = np.average(subacc, axis=(0, 2))
 
-    if smooth is True:
+' a function for flattening the pseudo-trials of all the categories for the classifiers '
 
-        smooth_acc = np.zeros([nsubs, newnts])
+def decoding_flatten(pseudo):
 
-        for t in range(newnts):
+    """
+    Flatten the pseudo-trials of all the categories into the trials & the labels for the classifiers
 
-            if t >= 2 and t < (newnts - 2):
-                smooth_acc[:, t] = np.average(acc[:, t - 2:t + 3], axis=1)
-            elif t < 2:
-                smooth_acc[:, t] = np.average(acc[:, :t + 3], axis=1)
-            else:
-                smooth_acc[:, t] = np.average(acc[:, t - 2:], axis=1)
+    Parameters
+    ----------
+    pseudo : array
+        The pseudo-trials of a repeat. The shape of pseudo must be [n, minn, n_features, n_tws].
 
-        return smooth_acc
+    Returns
+    -------
+    x : array
+        The pseudo-trials. The shape of x is [n*minn, n_features, n_tws].
+    y : array
+        The categories (0, 1, ..., n-1) of the pseudo-trials. The shape of y is [n*minn].
+    """
 
-    else:
+    n, minn = np.shape(pseudo)[:2]
 
-        return acc
+    return np.reshape(pseudo, (n * minn, ) + np.shape(pseudo)[2:]), np.repeat(np.arange(n), minn)
 
 
-' a function for time-by-time decoding for EEG-like data (hold out) '
+' a function for decoding a (subject, repeat) unit by cross validation '
 
-def tbyt_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, iter=10,
-                          test_size=0.3, normalization=False, smooth=True):
+def decoding_unit_kfold(data, labels, task, context):
 
     """
-    Conduct time-by-time decoding for EEG-like data (hold out)
+    Decode the pseudo-trials of a subject in one repeat by cross validation
 
     Parameters
     ----------
-    data : array
-        The neural data.
-        The shape of data must be [n_subs, n_trials, n_chls, n_ts]. n_subs, n_trials, n_chls and n_ts represent the
-        number of subjects, the number of trails, the number of channels and the number of time-points.
-    labels : array
-        The labels of each trial.
-        The shape of labels must be [n_subs, n_trials]. n_subs and n_trials represent the number of subjects and the
-        number of trials.
-    n : int. Default is 2.
-        The number of categories for classification.
-    navg : int. Default is 5.
-        The number of trials used to average.
-    time_opt : string "average" or "features". Default is "average".
-        Average the time-points or regard the time points as features for classification
-        If time_opt="average", the time-points in a certain time-window will be averaged.
-        If time_opt="features", the time-points in a certain time-window will be used as features for classification.
-    time_win : int. Default is 5.
-        Set a time-window for decoding for different time-points.
-        If time_win=5, that means each decoding process based on 5 time-points.
-    time_step : int. Default is 5.
-        The time step size for each time of decoding.
-    iter : int. Default is 10.
-        The times for iteration.
-    test_size : float. Default is 0.3.
-        The proportion of the test set.
-        test_size should be between 0.0 and 1.0.
-    normalization : boolean True or False. Default is False.
-        Normalize the data or not.
-    smooth : boolean True or False. Default is True.
-        Smooth the decoding result or not.
+    data : tuple
+        (features, ): the features of all the subjects with a shape of [n_subs, n_trials, n_features, n_tws].
+    labels : tuple
+        (indices, ): the indices of the categories of all the subjects with a shape of [n_subs, n_trials].
+    task : tuple
+        (sub, repeat, seed): the subject, the repeat & the numpy.random.SeedSequence of the unit.
+    context : dict
+        The settings shared by all the units, prepared by the decoding functions.
 
     Returns
     -------
     accuracies : array
-        The time-by-time decoding accuracies.
-        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1].
+        The accuracies averaged over the folds.
+        If context["cross"]=False, the shape of accuracies is [n_tws]. Otherwise, it is [n_tws, n_tws].
     """
 
-    if np.shape(data)[0] != np.shape(labels)[0]:
+    sub, repeat, seed = task
+    n = context["n"]
+    nfolds = context["nfolds"]
+    classifier = context["classifier"]
 
-        print("\nThe number of epochs doesn't match the number of labels.\n")
+    rng = np.random.default_rng(seed)
 
-        return "Invalid input!"
+    x, y = decoding_flatten(decoding_pseudo_trials(data[0][sub], labels[0][sub], n, context["navg"], 1, rng)[0])
 
-    nsubs, ntrials, nchls, nts = np.shape(data)
+    # the same splits of the folds for all the time-points
+    kf = StratifiedKFold(n_splits=nfolds, shuffle=True, random_state=int(rng.integers(2 ** 31 - 1)))
 
-    ncategories = np.zeros([nsubs], dtype=int)
+    acc = 0
 
-    labels = np.array(labels)
+    for train_index, test_index in kf.split(x[:, :, 0], y):
 
-    for sub in range(nsubs):
+        weights, biases = linear_classifiers_fit(x[train_index], y[train_index], n, classifier,
+                                                 context["normalization"])
 
-        sublabels_set = set(labels[sub].tolist())
-        ncategories[sub] = len(sublabels_set)
+        if context["cross"] is True:
+            # score the test trials of all the time-points by all the classifiers at once
+            predictions = linear_classifiers_predict(weights, biases, x[test_index], n, classifier, cross=True)
+            acc = acc + np.average(predictions == y[test_index, None], axis=1) / nfolds
+        else:
+            predictions = linear_classifiers_predict(weights, biases, x[test_index], n, classifier)
+            acc = acc + np.average(predictions == y[test_index], axis=1) / nfolds
 
-    if len(set(ncategories.tolist())) != 1:
+    return acc
 
-        print("\nInvalid labels!\n")
 
-        return "Invalid input!"
+' a function for decoding a (subject, repeat) unit by hold-out '
 
-    if n != ncategories[0]:
+def decoding_unit_holdout(data, labels, task, context):
 
-        print("\nThe number of categories for decoding doesn't match ncategories (" + str(ncategories) + ")!\n")
+    """
+    Decode the pseudo-trials of a subject in one repeat by hold-out
 
-        return "Invalid input!"
+    Parameters
+    ----------
+    data : tuple
+        (features, ): the features of all the subjects with a shape of [n_subs, n_trials, n_features, n_tws].
+    labels : tuple
+        (indices, ): the indices of the categories of all the subjects with a shape of [n_subs, n_trials].
+    task : tuple
+        (sub, repeat, seed): the subject, the repeat & the numpy.random.SeedSequence of the unit.
+    context : dict
+        The settings shared by all the units, prepared by the decoding functions.
 
-    categories = list(sublabels_set)
+    Returns
+    -------
+    accuracies : array
+        If context["cross"]=False, the shape of accuracies is [n_tws]. Otherwise, it is [n_tws, n_tws].
+    """
 
-    newnts = int((nts-time_win)/time_step)+1
+    sub, repeat, seed = task
+    n = context["n"]
+    classifier = context["classifier"]
 
-    if time_opt == "average":
+    rng = np.random.default_rng(seed)
 
-        avgt_data = np.zeros([nsubs, ntrials, nchls, newnts])
+    x, y = decoding_flatten(decoding_pseudo_trials(data[0][sub], labels[0][sub], n, context["navg"], 1, rng)[0])
 
-        for t in range(newnts):
-            avgt_data[:, :, :, t] = np.average(data[:, :, :, t * time_step:t * time_step + time_win], axis=3)
+    # the same split for all the time-points
+    train_index, test_index = train_test_split(np.arange(len(y)), test_size=context["test_size"],
+                                               random_state=int(rng.integers(2 ** 31 - 1)))
 
-        acc = np.zeros([nsubs, newnts])
+    weights, biases = linear_classifiers_fit(x[train_index], y[train_index], n, classifier, context["normalization"])
 
-        total = nsubs * iter * newnts
+    if context["cross"] is True:
+        # score the test trials of all the time-points by all the classifiers at once
+        predictions = linear_classifiers_predict(weights, biases, x[test_index], n, classifier, cross=True)
+        return np.average(predictions == y[test_index, None], axis=1)
 
-        print("\nDecoding")
+    predictions = linear_classifiers_predict(weights, biases, x[test_index], n, classifier)
 
-        for sub in range(nsubs):
+    return np.average(predictions == y[test_index], axis=1)
 
-            ns = np.zeros([n], dtype=int)
 
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+' a function for decoding a (subject, repeat) unit by transfer decoding '
 
-            minn = int(np.min(ns) / navg)
+def decoding_unit_transfer(data, labels, task, context):
 
-            subacc = np.zeros([iter, newnts])
+    """
+    Train the classifiers on the pseudo-trials of a subject under condition1 and test them under condition2 (and
+    conversely)
 
-            for i in range(iter):
+    Parameters
+    ----------
+    data : tuple
+        (features1, features2): the features of all the subjects under the two conditions with a shape of
+        [n_subs, n_trials, n_features, n_tws].
+    labels : tuple
+        (indices1, indices2): the indices of the categories of all the subjects under the two conditions with a shape
+        of [n_subs, n_trials].
+    task : tuple
+        (sub, repeat, seed): the subject, the repeat & the numpy.random.SeedSequence of the unit.
+    context : dict
+        The settings shared by all the units, prepared by the decoding functions.
 
-                datai = np.zeros([n, minn * navg, nchls, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+    Returns
+    -------
+    accuracies : array
+        The transfer decoding accuracies. The shape of accuracies is [n_tws1, n_tws2].
+        If context["bidirectional"]=True, the accuracies of both directions are returned with a shape of
+        [2, n_tws1, n_tws2]. The second one (condition2 to condition1) is transposed.
+    """
 
-                for j in range(n):
-                    labelsi[j] = j
+    sub, repeat, seed = task
+    n = context["n"]
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+    rng = np.random.default_rng(seed)
 
-                m = np.zeros([n], dtype=int)
+    x1, y1 = decoding_flatten(decoding_pseudo_trials(data[0][sub], labels[0][sub], n, context["navg"], 1, rng)[0])
+    x2, y2 = decoding_flatten(decoding_pseudo_trials(data[1][sub], labels[1][sub], n, context["navg"], 1, rng)[0])
 
-                for j in range(ntrials):
-                    for k in range(n):
+    classifier = context["classifier"]
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+    # fit the classifiers of all the time-points under condition1 once (the data are standardized as before)
+    weights, biases = linear_classifiers_fit(x1, y1, n, classifier, True)
 
-                avg_datai = np.zeros([n, minn, nchls, newnts])
+    # score the test trials of all the time-points under condition2 by all the classifiers at once
+    predictions = linear_classifiers_predict(weights, biases, x2, n, classifier, cross=True)
+    acc = np.average(predictions == y2[:, None], axis=1)
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+    if context["bidirectional"] is False:
+        return acc
 
-                x = np.reshape(avg_datai, [n * minn, nchls, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    # the other direction with the same pseudo-trials
+    weights, biases = linear_classifiers_fit(x2, y2, n, classifier, True)
+    predictions = linear_classifiers_predict(weights, biases, x1, n, classifier, cross=True)
 
-                for t in range(newnts):
+    return np.stack((acc, np.transpose(np.average(predictions == y1[:, None], axis=1))))
 
-                    percent = (sub * iter * newnts + i * newnts + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
 
-                    if normalization is True:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        scaler = StandardScaler()
-                        x_train = scaler.fit_transform(x_train)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t] = svm.score(scaler.transform(x_test), y_test)
+# the data shared by the worker processes of the decoding functions
+decoding_context = {}
 
-                    if normalization is False:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t] = svm.score(x_test, y_test)
 
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts - 1):
-                        print("\nDecoding finished!\n")
+' a function for initializing the worker processes of the decoding functions '
 
-            acc[sub] = np.average(subacc, axis=0)
+def decoding_init(blocks, labels, context):
 
-    if time_opt == "features":
+    decoding_context["shm"] = []
+    data = []
 
-        avgt_data = np.zeros([nsubs, ntrials, nchls, time_win, newnts])
+    for name, shape, dtype in blocks:
+        shm, shared = from_shared_memory(name, shape, dtype)
+        decoding_context["shm"].append(shm)
+        data.append(shared)
 
-        for t in range(newnts):
-            avgt_data[:, :, :, :, t] = data[:, :, :, t * time_step:t * time_step + time_win]
+    decoding_context["data"] = tuple(data)
+    decoding_context["labels"] = labels
+    decoding_context["context"] = context
 
-        avgt_data = np.reshape(avgt_data, [nsubs, ntrials, nchls * time_win, newnts])
 
-        acc = np.zeros([nsubs, newnts])
+' a function for decoding a (subject, repeat) unit in the worker processes of the decoding functions '
 
-        total = nsubs * iter * newnts
+def decoding_worker(task):
 
-        print("\nDecoding")
+    context = decoding_context["context"]
 
-        for sub in range(nsubs):
+    return context["unit"](decoding_context["data"], decoding_context["labels"], task, context)
 
-            ns = np.zeros([n], dtype=int)
 
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+' a function for running the (subject, repeat) units of the decoding functions '
 
-            minn = int(np.min(ns) / navg)
+def decoding_run(data, labels, nrepeats, context, seed=None, n_jobs=1):
 
-            subacc = np.zeros([iter, newnts])
+    """
+    Run the (subject, repeat) units of a decoding function serially or in a pool of processes
 
-            for i in range(iter):
+    Parameters
+    ----------
+    data : tuple
+        The features of all the subjects, each with a shape of [n_subs, n_trials, n_features, n_tws].
+    labels : tuple
+        The indices of the categories of all the subjects, each with a shape of [n_subs, n_trials].
+    nrepeats : int
+        The number of repeats of each subject.
+    context : dict
+        The settings shared by all the units. context["unit"] is the function decoding a unit.
+    seed : int or None. Default is None.
+        The master seed. Each unit gets its own seed spawned from it by numpy.random.SeedSequence, so that the results
+        don't depend on n_jobs. If seed=None, the master seed is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes. If n_jobs=-1, all the CPUs are used.
 
-                datai = np.zeros([n, minn * navg, nchls * time_win, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+    Returns
+    -------
+    accuracies : array
+        The accuracies of all the units in order. The shape of accuracies is [n_subs, nrepeats, ...].
+    """
 
-                for j in range(n):
-                    labelsi[j] = j
+    if context["classifier"] not in ("svm", "lda", "ridge"):
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+        print("\nThe classifier should be 'svm' or 'lda' or 'ridge'.\n")
 
-                m = np.zeros([n], dtype=int)
+        return "Invalid input!"
 
-                for j in range(ntrials):
-                    for k in range(n):
+    nsubs = np.shape(data[0])[0]
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+    if seed is None:
+        seed = np.random.randint(0, 2 ** 31 - 1)
 
-                avg_datai = np.zeros([n, minn, nchls * time_win, newnts])
+    # the deterministic seeds of the units
+    seeds = np.random.SeedSequence(seed).spawn(nsubs * nrepeats)
+    tasks = [(sub, i, seeds[sub * nrepeats + i]) for sub in range(nsubs) for i in range(nrepeats)]
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+    print("\nDecoding")
 
-                x = np.reshape(avg_datai, [n * minn, nchls * time_win, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    shms = []
 
-                for t in range(newnts):
+    if n_jobs == 1:
+        results = (context["unit"](data, labels, task, context) for task in tasks)
+    else:
+        # share the data with the worker processes instead of pickling it
+        blocks = []
+        for array in data:
+            shm, shared = to_shared_memory(array)
+            shms.append(shm)
+            blocks.append((shm.name, shared.shape, shared.dtype))
+        results = pool_imap(decoding_worker, tasks, n_jobs, decoding_init, (blocks, labels, context))
 
-                    percent = (sub * iter * newnts + i * newnts + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
+    accuracies = []
 
-                    if normalization is True:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        scaler = StandardScaler()
-                        x_train = scaler.fit_transform(x_train)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t] = svm.score(scaler.transform(x_test), y_test)
+    try:
+        for k, acc in enumerate(results):
 
-                    if normalization is False:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t] = svm.score(x_test, y_test)
+            # show the progressbar
+            percent = (k + 1) / len(tasks) * 100
+            show_progressbar("Calculating", percent)
 
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts - 1):
-                        print("\nDecoding finished!\n")
+            accuracies.append(acc)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
 
-            acc[sub] = np.average(subacc, axis=0)
+    print("\nDecoding finished!\n")
 
-    if smooth is True:
+    return np.reshape(np.array(accuracies), (nsubs, nrepeats) + np.shape(accuracies[0]))
 
-        smooth_acc = np.zeros([nsubs, newnts])
 
-        for t in range(newnts):
+' a function for smoothing the 1-D decoding results '
 
-            if t >= 2 and t < (newnts-2):
-                smooth_acc[:, t] = np.average(acc[:, t-2:t+3], axis=1)
-            elif t < 2:
-                smooth_acc[:, t] = np.average(acc[:, :t+3], axis=1)
-            else:
-                smooth_acc[:, t] = np.average(acc[:, t-2:], axis=1)
+def decoding_smooth_1d(acc):
 
-        return smooth_acc
+    """
+    Smooth the 1-D decoding results by averaging the 5 neighbouring time-points (truncated at the edges) of each point
 
-    else:
+    Parameters
+    ----------
+    acc : array
+        The decoding results. The shape of acc must be [..., n_ts].
 
-        return acc
+    Returns
+    -------
+    smooth_acc : array
+        The smoothed results with the same shape as acc.
+    """
 
+    nts = np.shape(acc)[-1]
 
-' a function for cross-temporal decoding for EEG-like data (cross validation) '
+    # cumulative sum with a leading zero
+    csum = np.zeros(np.shape(acc)[:-1] + (nts + 1, ))
+    csum[..., 1:] = np.cumsum(acc, axis=-1)
+
+    starts = np.maximum(np.arange(nts) - 2, 0)
+    ends = np.minimum(np.arange(nts) + 3, nts)
+
+    return (csum[..., ends] - csum[..., starts]) / (ends - starts)
 
-def ct_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, nfolds=5, nrepeats=2,
-                      normalization=False, smooth=True):
+
+' a function for smoothing the 2-D decoding results '
+
+def decoding_smooth_2d(acc):
 
     """
-    Conduct cross-temporal decoding for EEG-like data (cross validation)
+    Smooth the 2-D decoding results by averaging the 5*5 neighbourhood (truncated at the edges) of each point
+
+    Parameters
+    ----------
+    acc : array
+        The decoding results. The shape of acc must be [..., n_ts1, n_ts2].
+
+    Returns
+    -------
+    smooth_acc : array
+        The smoothed results with the same shape as acc.
+    """
+
+    nts1, nts2 = np.shape(acc)[-2:]
+
+    # 2-D cumulative sum with leading zeros
+    csum = np.zeros(np.shape(acc)[:-2] + (nts1 + 1, nts2 + 1))
+    csum[..., 1:, 1:] = np.cumsum(np.cumsum(acc, axis=-2), axis=-1)
+
+    starts1 = np.maximum(np.arange(nts1) - 2, 0)
+    ends1 = np.minimum(np.arange(nts1) + 3, nts1)
+    starts2 = np.maximum(np.arange(nts2) - 2, 0)
+    ends2 = np.minimum(np.arange(nts2) + 3, nts2)
+
+    sums = csum[..., ends1[:, None], ends2] - csum[..., starts1[:, None], ends2] - csum[..., ends1[:, None], starts2] \
+        + csum[..., starts1[:, None], starts2]
+
+    return sums / ((ends1 - starts1)[:, None] * (ends2 - starts2))
+
+
+' a function for time-by-time decoding for EEG-like data (cross validation) '
+
+def tbyt_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, nfolds=5, nrepeats=2,
+                        normalization=False, smooth=True, classifier="svm", seed=None, n_jobs=1):
+
+    """
+    Conduct time-by-time decoding for EEG-like data (cross validation)
 
     Parameters
     ----------
@@ -584,19 +780,29 @@ def ct_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5,
         The time step size for each time of decoding.
     nfolds : int. Default is 5.
         The number of folds.
-        nfolds should be at least 2.
+        k should be at least 2.
     nrepeats : int. Default is 2.
         The times for iteration.
     normalization : boolean True or False. Default is False.
         Normalize the data or not.
     smooth : boolean True or False. Default is True.
         Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()).
+        If classifier='svm', a linear SVM is fitted for each time-point.
+        If classifier='lda' or 'ridge', a shrinkage LDA or a ridge classifier is fitted for all the time-points at once
+        in closed form, which is much faster.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
     Returns
     -------
     accuracies : array
-        The cross-temporal decoding accuracies.
-        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1, int((n_ts-time_win)/time_step)+1].
+        The time-by-time decoding accuracies.
+        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1].
     """
 
     if np.shape(data)[0] != np.shape(labels)[0]:
@@ -628,245 +834,237 @@ def ct_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5,
 
         return "Invalid input!"
 
-    categories = list(sublabels_set)
-
-    newnts = int((nts-time_win)/time_step)+1
-
-    if time_opt == "average":
-
-        avgt_data = np.zeros([nsubs, ntrials, nchls, newnts])
-
-        for t in range(newnts):
-            avgt_data[:, :, :, t] = np.average(data[:, :, :, t * time_step:t * time_step + time_win], axis=3)
-
-        acc = np.zeros([nsubs, newnts, newnts])
-
-        total = nsubs * nrepeats * newnts * nfolds
-
-        print("\nDecoding")
-
-        for sub in range(nsubs):
-
-            ns = np.zeros([n], dtype=int)
-
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+    context = {"unit": decoding_unit_kfold, "n": n, "navg": navg, "nfolds": nfolds, "normalization": normalization,
+               "classifier": classifier, "cross": False}
 
-            minn = int(np.min(ns) / navg)
+    # decode the (subject, repeat) units
+    subacc = decoding_run((decoding_features(data, time_opt, time_win, time_step), ), (decoding_labels(labels)[0], ),
+                          nrepeats, context, seed, n_jobs)
 
-            subacc = np.zeros([nrepeats, newnts, newnts, nfolds])
+    if isinstance(subacc, str):
+        return "Invalid input!"
 
-            for i in range(nrepeats):
+    acc = np.average(subacc, axis=1)
 
-                datai = np.zeros([n, minn * navg, nchls, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+    if smooth is True:
 
-                for j in range(n):
-                    labelsi[j] = j
+        return decoding_smooth_1d(acc)
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+    else:
 
-                m = np.zeros([n], dtype=int)
+        return acc
 
-                for j in range(ntrials):
-                    for k in range(n):
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+' a function for time-by-time decoding for EEG-like data (hold out) '
 
-                avg_datai = np.zeros([n, minn, nchls, newnts])
+def tbyt_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, iter=10,
+                          test_size=0.3, normalization=False, smooth=True, classifier="svm", seed=None, n_jobs=1):
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+    """
+    Conduct time-by-time decoding for EEG-like data (hold out)
 
-                x = np.reshape(avg_datai, [n * minn, nchls, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    Parameters
+    ----------
+    data : array
+        The neural data.
+        The shape of data must be [n_subs, n_trials, n_chls, n_ts]. n_subs, n_trials, n_chls and n_ts represent the
+        number of subjects, the number of trails, the number of channels and the number of time-points.
+    labels : array
+        The labels of each trial.
+        The shape of labels must be [n_subs, n_trials]. n_subs and n_trials represent the number of subjects and the
+        number of trials.
+    n : int. Default is 2.
+        The number of categories for classification.
+    navg : int. Default is 5.
+        The number of trials used to average.
+    time_opt : string "average" or "features". Default is "average".
+        Average the time-points or regard the time points as features for classification
+        If time_opt="average", the time-points in a certain time-window will be averaged.
+        If time_opt="features", the time-points in a certain time-window will be used as features for classification.
+    time_win : int. Default is 5.
+        Set a time-window for decoding for different time-points.
+        If time_win=5, that means each decoding process based on 5 time-points.
+    time_step : int. Default is 5.
+        The time step size for each time of decoding.
+    iter : int. Default is 10.
+        The times for iteration.
+    test_size : float. Default is 0.3.
+        The proportion of the test set.
+        test_size should be between 0.0 and 1.0.
+    normalization : boolean True or False. Default is False.
+        Normalize the data or not.
+    smooth : boolean True or False. Default is True.
+        Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()).
+        If classifier='svm', a linear SVM is fitted for each time-point.
+        If classifier='lda' or 'ridge', a shrinkage LDA or a ridge classifier is fitted for all the time-points at once
+        in closed form, which is much faster.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
-                for t in range(newnts):
+    Returns
+    -------
+    accuracies : array
+        The time-by-time decoding accuracies.
+        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1].
+    """
 
-                    state = np.random.randint(0, 100)
-                    kf = StratifiedKFold(n_splits=nfolds, shuffle=True, random_state=state)
-                    xt = x[:, :, t]
+    if np.shape(data)[0] != np.shape(labels)[0]:
 
-                    fold_index = 0
-                    for train_index, test_index in kf.split(xt, y):
+        print("\nThe number of epochs doesn't match the number of labels.\n")
 
-                        percent = (sub * nrepeats * newnts * nfolds + i * newnts * nfolds + t * nfolds + fold_index + 1) / total * 100
-                        show_progressbar("Calculating", percent)
+        return "Invalid input!"
 
-                        if normalization is True:
-                            scaler = StandardScaler()
-                            x_train = scaler.fit_transform(xt[train_index])
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(x_train, y[train_index])
-                            subacc[i, t, t, fold_index] = svm.score(scaler.transform(xt[test_index]), y[test_index])
+    nsubs, ntrials, nchls, nts = np.shape(data)
 
-                            for tt in range(newnts - 1):
-                                if tt < t:
-                                    xtt = x[:, :, tt]
-                                    subacc[i, t, tt, fold_index] = svm.score(scaler.transform(xtt[test_index]),
-                                                                             y[test_index])
-                                if tt >= t:
-                                    xtt = x[:, :, tt + 1]
-                                    subacc[i, t, tt + 1, fold_index] = svm.score(scaler.transform(xtt[test_index]),
-                                                                                 y[test_index])
+    ncategories = np.zeros([nsubs], dtype=int)
 
-                        if normalization is False:
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(xt[train_index], y[train_index])
-                            subacc[i, t, t, fold_index] = svm.score(xt[test_index], y[test_index])
+    labels = np.array(labels)
 
-                            for tt in range(newnts - 1):
-                                if tt < t:
-                                    xtt = x[:, :, tt]
-                                    subacc[i, t, tt, fold_index] = svm.score(xtt[test_index], y[test_index])
-                                if tt >= t:
-                                    xtt = x[:, :, tt + 1]
-                                    subacc[i, t, tt + 1, fold_index] = svm.score(xtt[test_index], y[test_index])
+    for sub in range(nsubs):
 
-                        if sub == (nsubs - 1) and i == (nrepeats - 1) and t == (newnts - 1) and fold_index == (
-                                nfolds - 1):
-                            print("\nDecoding finished!\n")
+        sublabels_set = set(labels[sub].tolist())
+        ncategories[sub] = len(sublabels_set)
 
-                        fold_index = fold_index + 1
+    if len(set(ncategories.tolist())) != 1:
 
-            acc[sub] = np.average(subacc, axis=(0, 3))
+        print("\nInvalid labels!\n")
 
-    if time_opt == "features":
+        return "Invalid input!"
 
-        avgt_data = np.zeros([nsubs, ntrials, nchls, time_win, newnts])
+    if n != ncategories[0]:
 
-        for t in range(newnts):
-            avgt_data[:, :, :, :, t] = data[:, :, :, t * time_step:t * time_step + time_win]
+        print("\nThe number of categories for decoding doesn't match ncategories (" + str(ncategories) + ")!\n")
 
-        avgt_data = np.reshape(avgt_data, [nsubs, ntrials, nchls * time_win, newnts])
+        return "Invalid input!"
 
-        acc = np.zeros([nsubs, newnts, newnts])
+    context = {"unit": decoding_unit_holdout, "n": n, "navg": navg, "test_size": test_size,
+               "normalization": normalization, "classifier": classifier, "cross": False}
 
-        total = nsubs * nrepeats * newnts * nfolds
+    # decode the (subject, repeat) units
+    subacc = decoding_run((decoding_features(data, time_opt, time_win, time_step), ), (decoding_labels(labels)[0], ),
+                          iter, context, seed, n_jobs)
 
-        print("\nDecoding")
+    if isinstance(subacc, str):
+        return "Invalid input!"
 
-        for sub in range(nsubs):
+    acc = np.average(subacc, axis=1)
 
-            ns = np.zeros([n], dtype=int)
+    if smooth is True:
 
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
+        return decoding_smooth_1d(acc)
 
-            minn = int(np.min(ns) / navg)
+    else:
 
-            subacc = np.zeros([nrepeats, newnts, newnts, nfolds])
+        return acc
 
-            for i in range(nrepeats):
 
-                datai = np.zeros([n, minn * navg, nchls * time_win, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
+' a function for cross-temporal decoding for EEG-like data (cross validation) '
 
-                for j in range(n):
-                    labelsi[j] = j
+def ct_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, nfolds=5, nrepeats=2,
+                      normalization=False, smooth=True, classifier="svm", seed=None, n_jobs=1):
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+    """
+    Conduct cross-temporal decoding for EEG-like data (cross validation)
 
-                m = np.zeros([n], dtype=int)
+    Parameters
+    ----------
+    data : array
+        The neural data.
+        The shape of data must be [n_subs, n_trials, n_chls, n_ts]. n_subs, n_trials, n_chls and n_ts represent the
+        number of subjects, the number of trails, the number of channels and the number of time-points.
+    labels : array
+        The labels of each trial.
+        The shape of labels must be [n_subs, n_trials]. n_subs and n_trials represent the number of subjects and the
+        number of trials.
+    n : int. Default is 2.
+        The number of categories for classification.
+    navg : int. Default is 5.
+        The number of trials used to average.
+    time_opt : string "average" or "features". Default is "average".
+        Average the time-points or regard the time points as features for classification
+        If time_opt="average", the time-points in a certain time-window will be averaged.
+        If time_opt="features", the time-points in a certain time-window will be used as features for classification.
+    time_win : int. Default is 5.
+        Set a time-window for decoding for different time-points.
+        If time_win=5, that means each decoding process based on 5 time-points.
+    time_step : int. Default is 5.
+        The time step size for each time of decoding.
+    nfolds : int. Default is 5.
+        The number of folds.
+        nfolds should be at least 2.
+    nrepeats : int. Default is 2.
+        The times for iteration.
+    normalization : boolean True or False. Default is False.
+        Normalize the data or not.
+    smooth : boolean True or False. Default is True.
+        Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()).
+        If classifier='svm', a linear SVM is fitted for each training time-point.
+        If classifier='lda' or 'ridge', a shrinkage LDA or a ridge classifier is fitted for all the time-points at once
+        in closed form, which is much faster.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
-                for j in range(ntrials):
-                    for k in range(n):
+    Returns
+    -------
+    accuracies : array
+        The cross-temporal decoding accuracies.
+        The shape of accuracies is [n_subs, int((n_ts-time_win)/time_step)+1, int((n_ts-time_win)/time_step)+1].
+    """
 
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
+    if np.shape(data)[0] != np.shape(labels)[0]:
 
-                avg_datai = np.zeros([n, minn, nchls * time_win, newnts])
+        print("\nThe number of epochs doesn't match the number of labels.\n")
 
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
+        return "Invalid input!"
 
-                x = np.reshape(avg_datai, [n * minn, nchls * time_win, newnts])
-                y = np.reshape(labelsi, [n * minn])
+    nsubs, ntrials, nchls, nts = np.shape(data)
 
-                for t in range(newnts):
+    ncategories = np.zeros([nsubs], dtype=int)
 
-                    state = np.random.randint(0, 100)
-                    kf = StratifiedKFold(n_splits=nfolds, shuffle=True, random_state=state)
-                    xt = x[:, :, t]
+    labels = np.array(labels)
 
-                    fold_index = 0
-                    for train_index, test_index in kf.split(xt, y):
+    for sub in range(nsubs):
 
-                        percent = (sub * nrepeats * newnts * nfolds + i * newnts * nfolds + t * nfolds + fold_index + 1) / total * 100
-                        show_progressbar("Calculating", percent)
+        sublabels_set = set(labels[sub].tolist())
+        ncategories[sub] = len(sublabels_set)
 
-                        if normalization is True:
-                            scaler = StandardScaler()
-                            x_train = scaler.fit_transform(xt[train_index])
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(x_train, y[train_index])
-                            subacc[i, t, t, fold_index] = svm.score(scaler.transform(xt[test_index]), y[test_index])
+    if len(set(ncategories.tolist())) != 1:
 
-                            for tt in range(newnts - 1):
-                                if tt < t:
-                                    xtt = x[:, :, tt]
-                                    subacc[i, t, tt, fold_index] = svm.score(scaler.transform(xtt[test_index]),
-                                                                             y[test_index])
-                                if tt >= t:
-                                    xtt = x[:, :, tt + 1]
-                                    subacc[i, t, tt + 1, fold_index] = svm.score(scaler.transform(xtt[test_index]),
-                                                                                 y[test_index])
+        print("\nInvalid labels!\n")
 
-                        if normalization is False:
-                            svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                            svm.fit(xt[train_index], y[train_index])
-                            subacc[i, t, t, fold_index] = svm.score(xt[test_index], y[test_index])
+        return "Invalid input!"
 
-                            for tt in range(newnts - 1):
-                                if tt < t:
-                                    xtt = x[:, :, tt]
-                                    subacc[i, t, tt, fold_index] = svm.score(xtt[test_index], y[test_index])
-                                if tt >= t:
-                                    xtt = x[:, :, tt + 1]
-                                    subacc[i, t, tt + 1, fold_index] = svm.score(xtt[test_index], y[test_index])
+    if n != ncategories[0]:
 
-                        if sub == (nsubs - 1) and i == (nrepeats - 1) and t == (newnts - 1) and fold_index == (
-                                nfolds - 1):
-                            print("\nDecoding finished!\n")
+        print("\nThe number of categories for decoding doesn't match ncategories (" + str(ncategories) + ")!\n")
 
-                        fold_index = fold_index + 1
+        return "Invalid input!"
 
-            acc[sub] = np.average(subacc, axis=(0, 3))
+    context = {"unit": decoding_unit_kfold, "n": n, "navg": navg, "nfolds": nfolds, "normalization": normalization,
+               "classifier": classifier, "cross": True}
 
-    if smooth == True:
+    # decode the (subject, repeat) units
+    subacc = decoding_run((decoding_features(data, time_opt, time_win, time_step), ), (decoding_labels(labels)[0], ),
+                          nrepeats, context, seed, n_jobs)
 
-        smooth_acc = np.zeros([nsubs, newnts, newnts])
+    if isinstance(subacc, str):
+        return "Invalid input!"
 
-        for t1 in range(newnts):
-            for t2 in range(newnts):
+    acc = np.average(subacc, axis=1)
 
-                if t1 < 2 and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 <= 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, :t2 + 3], axis=(1, 2))
+    if smooth is True:
 
-        return smooth_acc
+        return decoding_smooth_2d(acc)
 
     else:
 
@@ -876,7 +1074,7 @@ def ct_decoding_kfold(data, labels, n=2, navg=5, time_opt="average", time_win=5,
 ' a function for cross-temporal decoding for EEG-like data (hold-out) '
 
 def ct_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=5, time_step=5, iter=10, test_size=0.3,
-                        normalization=False, smooth=True):
+                        normalization=False, smooth=True, classifier="svm", seed=None, n_jobs=1):
 
     """
     Conduct cross-temporal decoding for EEG-like data (hold-out)
@@ -913,6 +1111,16 @@ def ct_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=
         Normalize the data or not.
     smooth : boolean True or False. Default is True.
         Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()).
+        If classifier='svm', a linear SVM is fitted for each training time-point.
+        If classifier='lda' or 'ridge', a shrinkage LDA or a ridge classifier is fitted for all the time-points at once
+        in closed form, which is much faster.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
     Returns
     -------
@@ -950,249 +1158,21 @@ def ct_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=
 
         return "Invalid input!"
 
-    categories = list(sublabels_set)
-
-    newnts = int((nts-time_win)/time_step)+1
-
-    if time_opt == "average":
-
-        avgt_data = np.zeros([nsubs, ntrials, nchls, newnts])
-
-        for t in range(newnts):
-            avgt_data[:, :, :, t] = np.average(data[:, :, :, t * time_step:t * time_step + time_win], axis=3)
-
-        acc = np.zeros([nsubs, newnts, newnts])
-
-        total = nsubs * iter * newnts
-
-        print("\nDecoding")
-
-        for sub in range(nsubs):
-
-            ns = np.zeros([n], dtype=int)
-
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
-
-            minn = int(np.min(ns) / navg)
-
-            subacc = np.zeros([iter, newnts, newnts])
-
-            for i in range(iter):
-
-                datai = np.zeros([n, minn * navg, nchls, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
-
-                for j in range(n):
-                    labelsi[j] = j
+    context = {"unit": decoding_unit_holdout, "n": n, "navg": navg, "test_size": test_size,
+               "normalization": normalization, "classifier": classifier, "cross": True}
 
-                randomindex = np.random.permutation(np.array(range(ntrials)))
+    # decode the (subject, repeat) units
+    subacc = decoding_run((decoding_features(data, time_opt, time_win, time_step), ), (decoding_labels(labels)[0], ),
+                          iter, context, seed, n_jobs)
 
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials):
-                    for k in range(n):
-
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
-
-                avg_datai = np.zeros([n, minn, nchls, newnts])
-
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
-
-                x = np.reshape(avg_datai, [n * minn, nchls, newnts])
-                y = np.reshape(labelsi, [n * minn])
-
-                for t in range(newnts):
-
-                    percent = (sub * iter * newnts + i * newnts + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
-
-                    if normalization is True:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        scaler = StandardScaler()
-                        x_train = scaler.fit_transform(x_train)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t, t] = svm.score(scaler.transform(x_test), y_test)
-                        for tt in range(newnts - 1):
-                            if tt < t:
-                                xtt = x[:, :, tt]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt] = svm.score(scaler.transform(x_testt), y_test)
-                            if tt >= t:
-                                xtt = x[:, :, tt + 1]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt + 1] = svm.score(scaler.transform(x_testt), y_test)
-
-                    if normalization is False:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t, t] = svm.score(x_test, y_test)
-                        for tt in range(newnts - 1):
-                            if tt < t:
-                                xtt = x[:, :, tt]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt] = svm.score(x_testt, y_test)
-                            if tt >= t:
-                                xtt = x[:, :, tt + 1]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt + 1] = svm.score(x_testt, y_test)
-
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts - 1):
-                        print("\nDecoding finished!\n")
-
-            acc[sub] = np.average(subacc, axis=0)
-
-    if time_opt == "features":
-
-        avgt_data = np.zeros([nsubs, ntrials, nchls, time_win, newnts])
-
-        for t in range(newnts):
-            avgt_data[:, :, :, :, t] = data[:, :, :, t * time_step:t * time_step + time_win]
-
-        avgt_data = np.reshape(avgt_data, [nsubs, ntrials, nchls * time_win, newnts])
-
-        acc = np.zeros([nsubs, newnts, newnts])
-
-        total = nsubs * iter * newnts
-
-        print("\nDecoding")
-
-        for sub in range(nsubs):
-
-            ns = np.zeros([n], dtype=int)
-
-            for i in range(ntrials):
-                for j in range(n):
-                    if labels[sub, i] == categories[j]:
-                        ns[j] = ns[j] + 1
-
-            minn = int(np.min(ns) / navg)
-
-            subacc = np.zeros([iter, newnts, newnts])
-
-            for i in range(iter):
-
-                datai = np.zeros([n, minn * navg, nchls * time_win, newnts])
-                labelsi = np.zeros([n, minn], dtype=int)
-
-                for j in range(n):
-                    labelsi[j] = j
-
-                randomindex = np.random.permutation(np.array(range(ntrials)))
-
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials):
-                    for k in range(n):
-
-                        if labels[sub, randomindex[j]] == categories[k] and m[k] < minn * navg:
-                            datai[k, m[k]] = avgt_data[sub, randomindex[j]]
-                            m[k] = m[k] + 1
-
-                avg_datai = np.zeros([n, minn, nchls * time_win, newnts])
-
-                for j in range(minn):
-                    avg_datai[:, j] = np.average(datai[:, j * navg:j * navg + navg], axis=1)
-
-                x = np.reshape(avg_datai, [n * minn, nchls * time_win, newnts])
-                y = np.reshape(labelsi, [n * minn])
-
-                for t in range(newnts):
-
-                    percent = (sub * iter * newnts + i * newnts + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
-
-                    if normalization is True:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        scaler = StandardScaler()
-                        x_train = scaler.fit_transform(x_train)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t, t] = svm.score(scaler.transform(x_test), y_test)
-                        for tt in range(newnts - 1):
-                            if tt < t:
-                                xtt = x[:, :, tt]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt] = svm.score(scaler.transform(x_testt), y_test)
-                            if tt >= t:
-                                xtt = x[:, :, tt + 1]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt + 1] = svm.score(scaler.transform(x_testt), y_test)
-
-                    if normalization is False:
-                        state = np.random.randint(0, 100)
-                        xt = x[:, :, t]
-                        x_train, x_test, y_train, y_test = train_test_split(xt, y, test_size=test_size,
-                                                                            random_state=state)
-                        svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                        svm.fit(x_train, y_train)
-                        subacc[i, t, t] = svm.score(x_test, y_test)
-                        for tt in range(newnts - 1):
-                            if tt < t:
-                                xtt = x[:, :, tt]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt] = svm.score(x_testt, y_test)
-                            if tt >= t:
-                                xtt = x[:, :, tt + 1]
-                                x_train, x_testt, y_train, y_test = train_test_split(xtt, y, test_size=test_size,
-                                                                                     random_state=state)
-                                subacc[i, t, tt + 1] = svm.score(x_testt, y_test)
-
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts - 1):
-                        print("\nDecoding finished!\n")
+    if isinstance(subacc, str):
+        return "Invalid input!"
 
-            acc[sub] = np.average(subacc, axis=0)
+    acc = np.average(subacc, axis=1)
 
     if smooth is True:
 
-        smooth_acc = np.zeros([nsubs, newnts, newnts])
-
-        for t1 in range(newnts):
-            for t2 in range(newnts):
-
-                if t1 < 2 and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts - 2) and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 >= (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 >= 2 and t2 < (newnts - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= (newnts - 2) and t2 <= 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, :t2 + 3], axis=(1, 2))
-
-        return smooth_acc
+        return decoding_smooth_2d(acc)
 
     else:
 
@@ -1202,7 +1182,8 @@ def ct_decoding_holdout(data, labels, n=2, navg=5, time_opt="average", time_win=
 ' a function for unidirectional transfer decoding for EEG-like data '
 
 def unidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5, time_opt="average", time_win=5,
-                                     time_step=5, iter=10, normalization=False, smooth=True):
+                                     time_step=5, iter=10, normalization=False, smooth=True, classifier="svm",
+                                     seed=None, n_jobs=1):
 
     """
     Conduct unidirectional transfer decoding for EEG-like data
@@ -1237,9 +1218,17 @@ def unidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5
     iter : int. Default is 10.
         The times for iteration.
     normalization : boolean True or False. Default is False.
-        Normalize the data or not.
+        Normalize the data or not. The data are always standardized by the training data in transfer decoding.
     smooth : boolean True or False. Default is True.
         Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()). The classifier of each time-point is fitted once and
+        scores all the time-points of the other condition by one batched matrix product.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
     Returns
     -------
@@ -1248,6 +1237,25 @@ def unidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5
         The shape of accuracies is [n_subs, int((n_ts1-time_win)/time_step)+1, int((n_ts2-time_win)/time_step)+1].
     """
 
+    return transfer_decoding(data1, labels1, data2, labels2, n=n, navg=navg, time_opt=time_opt, time_win=time_win,
+                             time_step=time_step, iter=iter, smooth=smooth, classifier=classifier, seed=seed,
+                             n_jobs=n_jobs)
+
+
+' a function for transfer decoding for EEG-like data '
+
+def transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5, time_opt="average", time_win=5, time_step=5, iter=10,
+                      smooth=True, classifier="svm", seed=None, n_jobs=1, bidirectional=False):
+
+    """
+    Conduct unidirectional or bidirectional transfer decoding for EEG-like data
+
+    See unidirectional_transfer_decoding() & bidirectional_transfer_decoding() for the parameters.
+    If bidirectional=True, the classifiers of both conditions are fitted once on the same pseudo-trials of each
+    (subject, repeat) unit and each of them scores all the time-points of the other condition by one batched matrix
+    product. The accuracies of both directions are returned.
+    """
+
     if np.shape(data1)[0] != np.shape(labels1)[0]:
 
         print("\nThe number of epochs doesn't match the number of labels.\n")
@@ -1322,257 +1330,37 @@ def unidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5
 
         return "Invalid input!"
 
-    categories = list(sublabels1_set)
-
-    newnts1 = int((nts1-time_win)/time_step)+1
-    newnts2 = int((nts2-time_win)/time_step)+1
-
-    if time_opt == "average":
-
-        avgt_data1 = np.zeros([nsubs, ntrials1, nchls, newnts1])
-        avgt_data2 = np.zeros([nsubs, ntrials2, nchls, newnts2])
-
-        for t in range(newnts1):
-            avgt_data1[:, :, :, t] = np.average(data1[:, :, :, t * time_step:t * time_step + time_win], axis=3)
-
-        for t in range(newnts2):
-            avgt_data2[:, :, :, t] = np.average(data2[:, :, :, t * time_step:t * time_step + time_win], axis=3)
-
-        acc = np.zeros([nsubs, newnts1, newnts2])
-
-        total = nsubs * iter * newnts1
-
-        print("\nDecoding")
-
-        for sub in range(nsubs):
-
-            ns1 = np.zeros([n], dtype=int)
-
-            for i in range(ntrials1):
-                for j in range(n):
-                    if labels1[sub, i] == categories[j]:
-                        ns1[j] = ns1[j] + 1
-
-            minn1 = int(np.min(ns1) / navg)
-
-            ns2 = np.zeros([n], dtype=int)
+    # the categories of data1 are used for both data
+    indices1, categories = decoding_labels(labels1)
+    indices2 = decoding_labels(labels2, categories)[0]
 
-            for i in range(ntrials2):
-                for j in range(n):
-                    if labels2[sub, i] == categories[j]:
-                        ns2[j] = ns2[j] + 1
+    context = {"unit": decoding_unit_transfer, "n": n, "navg": navg, "classifier": classifier,
+               "bidirectional": bidirectional}
 
-            minn2 = int(np.min(ns2) / navg)
+    # decode the (subject, repeat) units
+    subacc = decoding_run((decoding_features(data1, time_opt, time_win, time_step),
+                           decoding_features(data2, time_opt, time_win, time_step)), (indices1, indices2), iter,
+                          context, seed, n_jobs)
 
-            subacc = np.zeros([iter, newnts1, newnts2])
-
-            for i in range(iter):
-
-                datai1 = np.zeros([n, minn1 * navg, nchls, newnts1])
-                datai2 = np.zeros([n, minn2 * navg, nchls, newnts2])
-                labelsi1 = np.zeros([n, minn1], dtype=int)
-                labelsi2 = np.zeros([n, minn2], dtype=int)
-
-                for j in range(n):
-                    labelsi1[j] = j
-                    labelsi2[j] = j
-
-                randomindex1 = np.random.permutation(np.array(range(ntrials1)))
-                randomindex2 = np.random.permutation(np.array(range(ntrials2)))
-
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials1):
-                    for k in range(n):
-
-                        if labels1[sub, randomindex1[j]] == categories[k] and m[k] < minn1 * navg:
-                            datai1[k, m[k]] = avgt_data1[sub, randomindex1[j]]
-                            m[k] = m[k] + 1
-
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials2):
-                    for k in range(n):
-
-                        if labels2[sub, randomindex2[j]] == categories[k] and m[k] < minn2 * navg:
-                            datai2[k, m[k]] = avgt_data2[sub, randomindex2[j]]
-                            m[k] = m[k] + 1
-
-                avg_datai1 = np.zeros([n, minn1, nchls, newnts1])
-                avg_datai2 = np.zeros([n, minn2, nchls, newnts2])
-
-                for j in range(minn1):
-                    avg_datai1[:, j] = np.average(datai1[:, j * navg:j * navg + navg], axis=1)
-
-                for j in range(minn2):
-                    avg_datai2[:, j] = np.average(datai2[:, j * navg:j * navg + navg], axis=1)
-
-                x1 = np.reshape(avg_datai1, [n * minn1, nchls, newnts1])
-                x2 = np.reshape(avg_datai2, [n * minn2, nchls, newnts2])
-                y1 = np.reshape(labelsi1, [n * minn1])
-                y2 = np.reshape(labelsi2, [n * minn2])
-
-                for t in range(newnts1):
-
-                    percent = (sub * iter * newnts1 + i * newnts1 + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
-
-                    scaler = StandardScaler()
-                    xt1 = scaler.fit_transform(x1[:, :, t])
-                    svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                    svm.fit(xt1, y1)
-                    for tt in range(newnts2):
-                        xt2 = x2[:, :, tt]
-                        subacc[i, t, tt] = svm.score(scaler.transform(xt2), y2)
-
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts1 - 1):
-                        print("\nDecoding finished!\n")
-
-            acc[sub] = np.average(subacc, axis=0)
-
-    if time_opt == "features":
-
-        avgt_data1 = np.zeros([nsubs, ntrials1, nchls, time_win, newnts1])
-        avgt_data2 = np.zeros([nsubs, ntrials2, nchls, time_win, newnts2])
-
-        for t in range(newnts1):
-            avgt_data1[:, :, :, :, t] = data1[:, :, :, t * time_step:t * time_step + time_win]
-
-        for t in range(newnts2):
-            avgt_data2[:, :, :, :, t] = data2[:, :, :, t * time_step:t * time_step + time_win]
-
-        avgt_data1 = np.reshape(avgt_data1, [nsubs, ntrials1, nchls * time_win, newnts1])
-        avgt_data2 = np.reshape(avgt_data2, [nsubs, ntrials2, nchls * time_win, newnts2])
-
-        acc = np.zeros([nsubs, newnts1, newnts2])
-
-        total = nsubs * iter * newnts1
-
-        print("\nDecoding")
-
-        for sub in range(nsubs):
-
-            ns1 = np.zeros([n], dtype=int)
-
-            for i in range(ntrials1):
-                for j in range(n):
-                    if labels1[sub, i] == categories[j]:
-                        ns1[j] = ns1[j] + 1
-
-            minn1 = int(np.min(ns1) / navg)
-
-            ns2 = np.zeros([n], dtype=int)
-
-            for i in range(ntrials2):
-                for j in range(n):
-                    if labels2[sub, i] == categories[j]:
-                        ns2[j] = ns2[j] + 1
-
-            minn2 = int(np.min(ns2) / navg)
-
-            subacc = np.zeros([iter, newnts1, newnts2])
-
-            for i in range(iter):
-
-                datai1 = np.zeros([n, minn1 * navg, nchls * time_win, newnts1])
-                datai2 = np.zeros([n, minn2 * navg, nchls * time_win, newnts2])
-                labelsi1 = np.zeros([n, minn1], dtype=int)
-                labelsi2 = np.zeros([n, minn2], dtype=int)
-
-                for j in range(n):
-                    labelsi1[j] = j
-                    labelsi2[j] = j
-
-                randomindex1 = np.random.permutation(np.array(range(ntrials1)))
-                randomindex2 = np.random.permutation(np.array(range(ntrials2)))
-
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials1):
-                    for k in range(n):
-
-                        if labels1[sub, randomindex1[j]] == categories[k] and m[k] < minn1 * navg:
-                            datai1[k, m[k]] = avgt_data1[sub, randomindex1[j]]
-                            m[k] = m[k] + 1
-
-                m = np.zeros([n], dtype=int)
-
-                for j in range(ntrials2):
-                    for k in range(n):
-
-                        if labels2[sub, randomindex2[j]] == categories[k] and m[k] < minn2 * navg:
-                            datai2[k, m[k]] = avgt_data2[sub, randomindex2[j]]
-                            m[k] = m[k] + 1
-
-                avg_datai1 = np.zeros([n, minn1, nchls * time_win, newnts1])
-                avg_datai2 = np.zeros([n, minn2, nchls * time_win, newnts2])
-
-                for j in range(minn1):
-                    avg_datai1[:, j] = np.average(datai1[:, j * navg:j * navg + navg], axis=1)
-
-                for j in range(minn2):
-                    avg_datai2[:, j] = np.average(datai2[:, j * navg:j * navg + navg], axis=1)
-
-                x1 = np.reshape(avg_datai1, [n * minn1, nchls * time_win, newnts1])
-                x2 = np.reshape(avg_datai2, [n * minn2, nchls * time_win, newnts2])
-                y1 = np.reshape(labelsi1, [n * minn1])
-                y2 = np.reshape(labelsi2, [n * minn2])
-
-                for t in range(newnts1):
-
-                    percent = (sub * iter * newnts1 + i * newnts1 + t + 1) / total * 100
-                    show_progressbar("Calculating", percent)
-
-                    scaler = StandardScaler()
-                    xt1 = scaler.fit_transform(x1[:, :, t])
-                    svm = SVC(kernel='linear', tol=1e-4, probability=False)
-                    svm.fit(xt1, y1)
-                    for tt in range(newnts2):
-                        xt2 = x2[:, :, tt]
-                        subacc[i, t, tt] = svm.score(scaler.transform(xt2), y2)
-
-                    if sub == (nsubs - 1) and i == (iter - 1) and t == (newnts1 - 1):
-                        print("\nDecoding finished!\n")
+    if isinstance(subacc, str):
+        return "Invalid input!"
 
-            acc[sub] = np.average(subacc, axis=0)
+    acc = np.average(subacc, axis=1)
 
     if smooth is True:
+        acc = decoding_smooth_2d(acc)
 
-        smooth_acc = np.zeros([nsubs, newnts1, newnts2])
-
-        for t1 in range(newnts1):
-            for t2 in range(newnts2):
-
-                if t1 < 2 and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= 2 and t2 < (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 < 2 and t2 >= (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, :t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts1 - 2) and t2 < 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, :t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts1 - 2) and t2 >= 2 and t2 < (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= 2 and t1 < (newnts1 - 2) and t2 >= (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:t1 + 3, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts1 - 2) and t2 >= (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:], axis=(1, 2))
-                elif t1 >= (newnts1 - 2) and t2 >= 2 and t2 < (newnts2 - 2):
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, t2 - 2:t2 + 3], axis=(1, 2))
-                elif t1 >= (newnts1 - 2) and t2 <= 2:
-                    smooth_acc[:, t1, t2] = np.average(acc[:, t1 - 2:, :t2 + 3], axis=(1, 2))
-
-        return smooth_acc
+    if bidirectional is True:
+        return acc[:, 0], np.transpose(acc[:, 1], (0, 2, 1))
 
-    else:
-
-        return acc
+    return acc
 
 
 ' a function for bidirectional transfer decoding for EEG-like data '
 
 def bidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5, time_opt="average", time_win=5,
-                                    time_step=5, iter=10, normalization=False, smooth=True):
+                                    time_step=5, iter=10, normalization=False, smooth=True, classifier="svm",
+                                    seed=None, n_jobs=1):
 
     """
     Conduct bidirectional transfer decoding for EEG-like data
@@ -1607,9 +1395,17 @@ def bidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5,
     iter : int. Default is 10.
         The times for iteration.
     normalization : boolean True or False. Default is False.
-        Normalize the data or not.
+        Normalize the data or not. The data are always standardized by the training data in transfer decoding.
     smooth : boolean True or False. Default is True.
         Smooth the decoding result or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see linear_classifiers_fit()). The classifier of each time-point is fitted once and
+        scores all the time-points of the other condition by one batched matrix product.
+    seed : int or None. Default is None.
+        The master seed. Each (subject, repeat) unit gets its own seed derived from it, so that the results are
+        reproducible and don't depend on n_jobs. If seed=None, it is drawn from the global numpy random state.
+    n_jobs : int. Default is 1.
+        The number of processes over which the (subject, repeat) units are spread. If n_jobs=-1, all the CPUs are used.
 
     Returns
     -------
@@ -1621,11 +1417,14 @@ def bidirectional_transfer_decoding(data1, labels1, data2, labels2, n=2, navg=5,
         The shape of accuracies is [n_subs, int((n_ts2-time_win)/time_step)+1, int((n_ts1-time_win)/time_step)+1].
     """
 
-    Con1toCon2_accuracies, Con2toCon1_accuracies = unidirectional_transfer_decoding(data1, labels1, data2,
-                                    labels2, n=n, navg=navg, time_opt=time_opt, time_win=time_win, time_step=time_step,
-                                    iter=iter, normalization=normalization, smooth=smooth), \
-                                    unidirectional_transfer_decoding(data1, labels1, data2, labels2, n=n, navg=navg,
-                                    time_opt=time_opt, time_win=time_win, time_step=time_step, iter=iter,
-                                    normalization=normalization, smooth=smooth)
+    # fit the classifiers of both conditions once & score both directions
+    output = transfer_decoding(data1, labels1, data2, labels2, n=n, navg=navg, time_opt=time_opt, time_win=time_win,
+                               time_step=time_step, iter=iter, smooth=smooth, classifier=classifier, seed=seed,
+                               n_jobs=n_jobs, bidirectional=True)
+
+    if isinstance(output, str):
+        return "Invalid input!"
+
+    Con1toCon2_accuracies, Con2toCon1_accuracies = output
 
     return Con1toCon2_accuracies, Con2toCon1_accuracies
\ No newline at end of file
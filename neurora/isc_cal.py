@@ -7,7 +7,7 @@ __author__ = 'Zitong Lu'
 import numpy as np
 import math
 from scipy.stats import pearsonr
-from neurora.stuff import show_progressbar
+from neurora.stuff import show_progressbar, sliding_time_windows, searchlight_patches, searchlight_centers
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -64,8 +64,12 @@ def isc(data, time_win=5, time_step=5):
     if subs == 2:
         n = 1
 
+    # extract the time-windows
+    # shape of windows: [n_subs, n_chls, ts, time_win]
+    windows = sliding_time_windows(data, time_win, time_step)
+
     # initialize the corrs
-    isc = np.zeros([n, chls, ts, 2], dtype=np.float)
+    isc = np.zeros([n, chls, ts, 2], dtype=np.float64)
 
     total = n * chls * ts
 
@@ -83,8 +87,7 @@ def isc(data, time_win=5, time_step=5):
                         percent = (nindex * chls * ts + k * ts + l + 1) / total * 100
                         show_progressbar("Calculating", percent)
 
-                        rp = pearsonr(data[i, k, l*time_step:l*time_step+time_win],
-                                      data[j, k, l*time_step:l*time_step+time_win])
+                        rp = pearsonr(windows[i, k, l], windows[j, k, l])
                         isc[nindex, k, l] = rp
 
                 nindex = nindex + 1
@@ -96,7 +99,7 @@ def isc(data, time_win=5, time_step=5):
 
 ' a function for calculating the inter subject correlation (ISC) for fMRI (searchlight) '
 
-def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
+def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], mask=None, searchlight=None):
 
     """
     Calculate the inter subject correlation (ISC) for fMRI (searchlight)
@@ -113,6 +116,14 @@ def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
         kx, ky, kz should be odd.
     strides : array or list [sx, sy, sz]. Default is [1, 1, 1].
         The strides for calculating along the x, y, z axis.
+    mask : array or string. Default is None.
+        The brain mask. It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+        If mask is not None, only the calculation units whose centres are inside the mask (voxels with values > 0)
+        will be calculated, and the results of the other calculation units are NaN.
+    searchlight : SphereSearchlight. Default is None.
+        A spherical searchlight (see neurora.stuff.SphereSearchlight) built for the size of the fMRI-img.
+        If searchlight is not None, the spheres are used as the calculation units instead of the cubes, and ksize,
+        strides & mask don't work.
 
     Returns
     -------
@@ -121,6 +132,8 @@ def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
         The shape of isc is [n_ts, n_subs!/(2!*(n_subs-2)!), n_x, n_y, n_z, 2]. n_ts, n_subs, n_x, n_y, n_z represent
         the number of time-points, the number of subjects, the number of calculation units for searchlight along the x,
         y, z axis. 2 represent a r-value and a p-value.
+        If searchlight is not None, n_x, n_y, n_z are nx, ny, nz, and the results of the voxels which are not centres
+        of the searchlight are NaN.
 
     Notes
     -----
@@ -137,6 +150,57 @@ def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
     # get the number of time-points, subjects and the size of the fMRI-img
     nts, nsubs, nx, ny, nz = np.shape(fmri_data)
 
+    # spherical searchlight
+    if searchlight is not None:
+
+        if tuple(searchlight.size) != (nx, ny, nz):
+
+            print("\nThe size of the searchlight doesn't match the size of the fMRI-img.\n")
+
+            return "Invalid input!"
+
+        print("\nISC starts")
+
+        # shape of data: [nts, nsubs, nx*ny*nz]
+        data = np.reshape(fmri_data, [nts, nsubs, nx*ny*nz])
+
+        # the number of pairs among n_subs
+        n = int(nsubs * (nsubs - 1) / 2)
+
+        # initialize the ISC of the centres
+        subisc = np.full([nts, n, len(searchlight), 2], np.nan)
+
+        total = nts * n * len(searchlight)
+
+        for t in range(nts):
+
+            nindex = 0
+            for i in range(nsubs):
+                for j in range(nsubs):
+
+                    if i < j:
+
+                        for c in range(len(searchlight)):
+
+                            # show the progressbar
+                            percent = (t * n * len(searchlight) + nindex * len(searchlight) + c + 1) / total * 100
+                            show_progressbar("Calculating", percent)
+
+                            voxels = searchlight.neighbors(c)
+
+                            # no NaN
+                            if (np.isnan(data[t, i, voxels]).any() == False) and \
+                                    (np.isnan(data[t, j, voxels]).any() == False):
+                                # calculate the Pearson Coefficient
+                                subisc[t, nindex, c] = pearsonr(data[t, i, voxels], data[t, j, voxels])
+
+                        nindex = nindex + 1
+
+        print("\nComputing finished!")
+
+        # shape of subisc: [nts, n, n_centers, 2] -> [nts, n, nx, ny, nz, 2]
+        return searchlight.to_volume(subisc, axis=2)
+
     # the size of the calculation units for searchlight
     kx = ksize[0]
     ky = ksize[1]
@@ -158,26 +222,21 @@ def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
     n_y = int((ny - ky) / sy) + 1
     n_z = int((nz - kz) / sz) + 1
 
-    print("\nISC starts")
+    # the calculation units to be calculated
+    if mask is None:
+        centers = np.ones([n_x, n_y, n_z], dtype=bool)
+    else:
+        centers = searchlight_centers(mask, [nx, ny, nz], ksize, strides)
 
-    # initialize the data for calculating the ISC
-    data = np.full([nts, nsubs, n_x, n_y, n_z, kx * ky * kz], np.nan)
+        if isinstance(centers, str):
 
-    # assignment
-    for t in range(nts):
-        for sub in range(nsubs):
-            for x in range(n_x):
-                for y in range(n_y):
-                    for z in range(n_z):
+            return "Invalid input!"
 
-                        # record the index in a calculation unit
-                        index = 0
-                        for k1 in range(kx):
-                            for k2 in range(ky):
-                                for k3 in range(kz):
-                                    data[t, sub, x, y, z, index] = fmri_data[t, sub, x + k1, y + k2, z + k3]
+    print("\nISC starts")
 
-                                    index = index + 1
+    # the calculation units for searchlight (a view, not a copy)
+    # shape of patches: [nts, nsubs, n_x, n_y, n_z, kx, ky, kz]
+    patches = searchlight_patches(fmri_data, ksize, strides)
 
     # the number of pairs among n_subs
     if nsubs > 2:
@@ -207,11 +266,16 @@ def isc_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
                                 percent = (t * n * n_x * n_y * n_z + nindex * n_x * n_y * n_z + x * n_y * n_z + y * n_z + z + 1) / total * 100
                                 show_progressbar("Calculating", percent)
 
+                                # only the calculation units inside the mask
+                                if centers[x, y, z] == False:
+                                    continue
+
                                 # no NaN
-                                if (np.isnan(data[t, i, x, y, z]).any() == False) and \
-                                        (np.isnan(data[t, j, x, y, z]).any() == False):
+                                if (np.isnan(patches[t, i, x, y, z]).any() == False) and \
+                                        (np.isnan(patches[t, j, x, y, z]).any() == False):
                                     # calculate the Pearson Coefficient and absolute the result
-                                    subisc[t, nindex, x, y, z] = pearsonr(data[t, i, x, y, z], data[t, j, x, y, z])
+                                    subisc[t, nindex, x, y, z] = pearsonr(patches[t, i, x, y, z].flatten(),
+                                                                          patches[t, j, x, y, z].flatten())
 
                     nindex = nindex + 1
 
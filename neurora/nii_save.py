@@ -9,7 +9,7 @@ import nibabel as nib
 from nilearn.image import smooth_img
 import math
 from neurora.stuff import fwe_correct, fdr_correct, cluster_fwe_correct, cluster_fdr_correct, get_HOcort, get_bg_ch2bet,\
-    mask_to
+    mask_to, tfce_permutation_signflip
 from neurora.rsa_plot import plot_brainrsa_rlts
 
 ' a function for saving the searchlight correlation coefficients as a NIfTI file for fMRI '
@@ -240,7 +240,7 @@ def corr_save_nii(corrs, affine, filename=None, corr_mask=get_HOcort(), size=[60
 
 def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[60, 60, 60], ksize=[3, 3, 3],
                    strides=[1, 1, 1], p=0.05, correct_method=None, clusterp=0.05, smooth=False, plotrlt=True,
-                   img_background=None):
+                   img_background=None, results=None):
 
     """
     Save the searchlight RSA statistical results as a NIfTI file for fMRI
@@ -270,13 +270,16 @@ def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[6
     p : float. Default is 0.05.
         The threshold of p-values.
         Only the results those p-values are lower than this value will be visible.
-    correct_method : None or string 'FWE' or 'FDR' or 'Cluster-FWE' or 'Cluster-FDR'. Default is None.
+    correct_method : None or string 'FWE' or 'FDR' or 'Cluster-FWE' or 'Cluster-FDR' or 'TFCE'. Default is None.
         The method for correcting the RSA results.
         If correct_method='FWE', here the FWE-correction will be used. If correct_methd='FDR', here the FDR-correction
         will be used. If correct_method='Cluster-FWE', here the Cluster-wise FWE-correction will be used. If
-        correct_methd='Cluster-FDR', here the Cluster-wise FDR-correction will be used. If correct_method=None, no
-        correction.
+        correct_methd='Cluster-FDR', here the Cluster-wise FDR-correction will be used. If correct_method='TFCE', here
+        the threshold-free cluster enhancement with a sign-flip permutation test of the results will be used and the
+        voxels with FWE-corrected p-values lower than p are visible. If correct_method=None, no correction.
         Only when p<1, correct_method works.
+        If the p-values in stats are already FWE-corrected (stats_cal.stats_fmri() & the other fMRI stats functions with
+        permutation=True), use correct_method=None; FWE or FDR would correct them a second time.
     clusterp : float. Default is 0.05.
         The threshold of p-value for cluster-wise correction.
         Only when correct_method='Cluster-FDR' or 'Cluster-FWE', clusterp works.
@@ -288,6 +291,10 @@ def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[6
         The filename of a background image that the RSA results will be plotted on the top of it.
         If img_background=None, the background will be ch2.nii.gz.
         Only when plotrlt=True, img_background works.
+    results : array. Default is None.
+        The results of all the subjects tested against 0 (such as the Fisher-Z transformed r-values).
+        The shape of results must be [n_subs, n_x, n_y, n_z].
+        Only when correct_method='TFCE', results works (and is required).
 
     Returns
     -------
@@ -305,6 +312,12 @@ def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[6
 
         return "Invalid input!"
 
+    if correct_method == "TFCE" and (results is None or np.shape(results)[1:] != np.shape(stats)[:3]):
+
+        print("The results of all the subjects are required for TFCE.")
+
+        return "Invalid input!"
+
     # get the size of the fMRI-img
     nx = size[0]
     ny = size[1]
@@ -332,14 +345,14 @@ def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[6
     img_nii = np.zeros([nx, ny, nz], dtype=np.float64)
 
     # initialize a mask in order to record valid voxels (have qualified results)
-    mask = np.zeros([nx, ny, nz], dtype=np.int)
+    mask = np.zeros([nx, ny, nz], dtype=int)
 
     # get the p-values
     statsp = stats[:, :, :, 1]
     statst = stats[:, :, :, 0]
 
     # calculate the number of voxels for correction
-    fadeimg = np.zeros([nx, ny, nz], dtype=np.int)
+    fadeimg = np.zeros([nx, ny, nz], dtype=int)
 
     # iterate through all the calculation units
 
@@ -385,6 +398,10 @@ def stats_save_nii(stats, affine, filename=None, corr_mask=get_HOcort(), size=[6
         if correct_method == "Cluster-FWE":
             statsp = cluster_fwe_correct(statsp, p_threshold1=p, p_threshold2=clusterp)
 
+        # TFCE with a sign-flip permutation test
+        if correct_method == "TFCE":
+            statsp = tfce_permutation_signflip(results, iter=1000)[1]
+
     # iterate through all the calculation units again
 
     print("Record the valid voxels.")
@@ -7,7 +7,7 @@ __author__ = 'Zitong Lu'
 import numpy as np
 from scipy.stats import pearsonr
 import math
-from neurora.stuff import show_progressbar
+from neurora.stuff import show_progressbar, sliding_time_windows, searchlight_patches, searchlight_centers
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -59,6 +59,10 @@ def nps(data, time_win=5, time_step=5, sub_opt=1):
     # the time-points for calculating NPS
     ts = int((nts - time_win) / time_step) + 1
 
+    # extract the time-windows
+    # shape of windows: [2, n_subs, n_trials, n_chls, ts, time_win]
+    windows = sliding_time_windows(data, time_win, time_step)
+
     # initialize the NPS
     nps = np.zeros([nsubs, nchls, ts, 2])
 
@@ -74,8 +78,8 @@ def nps(data, time_win=5, time_step=5, sub_opt=1):
                 percent = (sub * nchls * ts + i * ts + j + 1) / total * 100
                 show_progressbar("Calculating", percent)
 
-                data1 = data[0, sub, :, i, j * time_step:j * time_step + time_win]
-                data2 = data[1, sub, :, i, j * time_step:j * time_step + time_win]
+                data1 = windows[0, sub, :, i, j]
+                data2 = windows[1, sub, :, i, j]
                 data1 = np.reshape(data1, [ntrials * time_win])
                 data2 = np.reshape(data2, [ntrials * time_win])
                 # calculate the Pearson Coefficient
@@ -99,7 +103,7 @@ def nps(data, time_win=5, time_step=5, sub_opt=1):
 
 ' a function for calculating the neural pattern similarity for fMRI data (searchlight) '
 
-def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
+def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], mask=None, searchlight=None):
 
     """
     Calculate the Neural Representational Similarity (NPS) for fMRI data (searchlight)
@@ -116,6 +120,14 @@ def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
         kx, ky, kz should be odd.
     strides : array or list [sx, sy, sz]. Default is [1, 1, 1].
         The strides for calculating along the x, y, z axis.
+    mask : array or string. Default is None.
+        The brain mask. It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+        If mask is not None, only the calculation units whose centres are inside the mask (voxels with values > 0)
+        will be calculated, and the results of the other calculation units are NaN.
+    searchlight : SphereSearchlight. Default is None.
+        A spherical searchlight (see neurora.stuff.SphereSearchlight) built for the size of the fMRI-img.
+        If searchlight is not None, the spheres are used as the calculation units instead of the cubes, and ksize,
+        strides & mask don't work.
 
     Returns
     -------
@@ -123,6 +135,8 @@ def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
         The fMRI NPS for searchlight.
         The shape of NPS is [n_subs, n_x, n_y, n_z, 2]. n_subs, n_x, n_y, n_z represent the number of subjects, the
         number of calculation units for searchlight along the x, y, z axis. 2 represent a r-value and a p-value.
+        If searchlight is not None, n_x, n_y, n_z are nx, ny, nz, and the results of the voxels which are not centres
+        of the searchlight are NaN.
 
     Notes
     -----
@@ -138,6 +152,47 @@ def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
     # get the number of subjects and the size of the fMRI-img
     nsubs, nx, ny, nz = np.shape(fmri_data)[1:]
 
+    # spherical searchlight
+    if searchlight is not None:
+
+        if tuple(searchlight.size) != (nx, ny, nz):
+
+            print("\nThe size of the searchlight doesn't match the size of the fMRI-img.\n")
+
+            return "Invalid input!"
+
+        print("\nComputing NPS")
+
+        # shape of data: [2, nsubs, nx*ny*nz]
+        data = np.reshape(fmri_data, [2, nsubs, nx*ny*nz])
+
+        # mark the voxels including NaN for any subject
+        nanvoxels = np.isnan(data).any(axis=(0, 1))
+
+        # initialize the NPS of the centres
+        subnps = np.full([nsubs, len(searchlight), 2], np.nan)
+
+        total = nsubs * len(searchlight)
+
+        for sub in range(nsubs):
+            for i in range(len(searchlight)):
+
+                # show the progressbar
+                percent = (sub * len(searchlight) + i + 1) / total * 100
+                show_progressbar("Calculating", percent)
+
+                voxels = searchlight.neighbors(i)
+
+                # no NaN
+                if nanvoxels[voxels].any() == False:
+                    # calculate the Pearson Coefficient
+                    subnps[sub, i] = pearsonr(data[0, sub, voxels], data[1, sub, voxels])
+
+        print("\nComputing finished!")
+
+        # shape of subnps: [nsubs, n_centers, 2] -> [nsubs, nx, ny, nz, 2]
+        return searchlight.to_volume(subnps, axis=1)
+
     # the size of the calculation units for searchlight
     kx = ksize[0]
     ky = ksize[1]
@@ -161,32 +216,19 @@ def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
     n_y = int((ny - ky) / sy) + 1
     n_z = int((nz - kz) / sz) + 1
 
-    # initialize the data for calculating the NPS
-    data = np.full([n_x, n_y, n_z, 2, kx*ky*kz, nsubs], np.nan)
-
-    # assignment
-    for x in range(n_x):
-        for y in range(n_y):
-            for z in range(n_z):
-                for i in range(2):
+    # the calculation units for searchlight (a view, not a copy)
+    # shape of patches: [2, nsubs, n_x, n_y, n_z, kx, ky, kz]
+    patches = searchlight_patches(fmri_data, ksize, strides)
 
-                    # record the index in a calculation unit
-                    index = 0
+    # the calculation units to be calculated
+    if mask is None:
+        centers = np.ones([n_x, n_y, n_z], dtype=bool)
+    else:
+        centers = searchlight_centers(mask, [nx, ny, nz], ksize, strides)
 
-                    for k1 in range(kx):
-                        for k2 in range(ky):
-                            for k3 in range(kz):
-                                for j in range(nsubs):
-                                    data[x, y, z, i, index, j] = fmri_data[i, j, x+k1, y+k2, z+k3]
+        if isinstance(centers, str):
 
-                                index = index + 1
-
-    # shape of data: [n_x, n_y, n_z, cons, kx*ky*kz, subs]
-    #              ->[subs, n_x, n_y, n_z, cons, kx*ky*kz]
-    data = np.transpose(data, (5, 0, 1, 2, 3, 4))
-
-    # flatten the data for different calculating conditions
-    data = np.reshape(data, [nsubs, n_x, n_y, n_z, 2, kx * ky * kz])
+            return "Invalid input!"
 
     # initialize the NPS
     subnps = np.full([nsubs, n_x, n_y, n_z, 2], np.nan)
@@ -203,10 +245,15 @@ def nps_fmri(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1]):
                     percent = (sub * n_x * n_y * n_z + x * n_y * n_z + y * n_z + z + 1) / total * 100
                     show_progressbar("Calculating", percent)
 
+                    # only the calculation units inside the mask
+                    if centers[x, y, z] == False:
+                        continue
+
                     # no NaN
-                    if (np.isnan(data[:, x, y, z, 0]).any() == False) and (np.isnan(data[:, x, y, z, 1]).any() == False):
+                    if np.isnan(patches[:, :, x, y, z]).any() == False:
                         # calculate the Pearson Coefficient and absolute the result
-                        subnps[sub, x, y, z] = pearsonr(data[sub, x, y, z, 0], data[sub, x, y, z, 1])
+                        subnps[sub, x, y, z] = pearsonr(patches[0, sub, x, y, z].flatten(),
+                                                        patches[1, sub, x, y, z].flatten())
 
     print("\nComputing finished!")
 
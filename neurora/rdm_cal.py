@@ -5,18 +5,179 @@
 __author__ = 'Zitong Lu'
 
 import numpy as np
-from neurora.stuff import limtozero
+from neurora.stuff import CondensedRDM, mahalanobis_gram
 import math
-from scipy.stats import pearsonr
-from neurora.stuff import show_progressbar
-from neurora.decoding import tbyt_decoding_kfold
+from neurora.stuff import show_progressbar, sliding_time_windows, window_average, searchlight_patches, \
+    searchlight_centers, to_shared_memory, from_shared_memory, pool_imap
+from neurora.decoding import linear_classifiers_fit, linear_classifiers_predict, decoding_pseudo_trials, \
+    decoding_smooth_1d
 
 np.seterr(divide='ignore', invalid='ignore')
 
 
+' a function for calculating the RDMs for a batch of condition patterns '
+
+def batchRDM(data, method="correlation", abs=False, noise=None):
+
+    """
+    Calculate the Representational Dissimilarity Matrices (RDMs) for a batch of condition patterns
+
+    Parameters
+    ----------
+    data : array
+        The condition patterns.
+        The shape of data must be [..., n_cons, n_features]. n_cons & n_features represent the number of conditions &
+        the number of features of each pattern (channels, time-points, voxels...), respectively. The leading
+        dimensions are regarded as a batch and an RDM will be calculated for each of them.
+    method : string 'correlation' or 'euclidean' or 'mahalanobis'. Default is 'correlation'.
+        The method to calculate the dissimilarities.
+        If method='correlation', the dissimilarity is calculated by Pearson Correlation.
+        If method='euclidean', the dissimilarity is calculated by Euclidean Distance, the results will be normalized.
+        If method='mahalanobis', the dissimilarity is calculated by Mahalanobis Distance, the results will be
+        normalized.
+    abs : boolean True or False. Default is False.
+        Calculate the absolute value of Pearson r or not. Only works when method='correlation'.
+    noise : array. Default is None.
+        The noise samples for estimating the noise covariances. Only works when method='mahalanobis'.
+        The shape of noise must be [..., n_samples, n_features], such as the residuals of the trials after subtracting
+        the condition means. If noise=None, the condition patterns centered across conditions are used.
+
+    Returns
+    -------
+    RDMs : array
+        The RDMs.
+        The shape of RDMs is [..., n_cons, n_cons].
+
+    Notes
+    -----
+    All the patterns in the batch are processed at once and the dissimilarities of all the pairs of conditions are
+    obtained from a single matrix product. For method='mahalanobis', one shrinkage noise covariance is estimated for
+    each RDM in the batch and the patterns are whitened by it (see neurora.stuff.mahalanobis_gram()).
+    """
+
+    data = np.asarray(data, dtype=np.float64)
+
+    # get the number of conditions
+    cons = np.shape(data)[-2]
+
+    if method == 'correlation':
+
+        # z-score all the patterns at once
+        data = data - np.average(data, axis=-1, keepdims=True)
+        data = data / np.linalg.norm(data, axis=-1, keepdims=True)
+
+        # calculate the Pearson Coefficients of all pairs of conditions
+        r = np.clip(np.matmul(data, np.swapaxes(data, -1, -2)), -1, 1)
+
+        # calculate the dissimilarities
+        if abs == True:
+            rdms = 1 - np.abs(r)
+        else:
+            rdms = 1 - r
+
+        # zero the values close to zero
+        rdms[rdms < 1e-15] = 0
+
+        return rdms
+
+    if method == 'euclidean' or method == 'mahalanobis':
+
+        # center the patterns across conditions to reduce the rounding errors
+        data = data - np.average(data, axis=-2, keepdims=True)
+
+        # the Gram matrices of the (whitened) patterns
+        if method == 'euclidean':
+            gram = np.matmul(data, np.swapaxes(data, -1, -2))
+        elif noise is None:
+            gram = mahalanobis_gram(data, data)
+        else:
+            gram = mahalanobis_gram(data, noise)
+
+        # squared distances from the Gram matrices
+        sq = np.diagonal(gram, axis1=-2, axis2=-1)
+        rdms = np.sqrt(np.maximum(sq[..., :, None] + sq[..., None, :] - 2 * gram, 0))
+
+        # zero the diagonal
+        rdms[..., np.arange(cons), np.arange(cons)] = 0
+
+    else:
+
+        print("\nThe method should be 'correlation' or 'euclidean' or 'mahalanobis'.\n")
+
+        return "Invalid input!"
+
+    # normalize each RDM
+    max = np.max(rdms, axis=(-2, -1), keepdims=True)
+    min = np.min(rdms, axis=(-2, -1), keepdims=True)
+    rdms = (rdms - min) / (max - min)
+
+    return rdms
+
+
+' a function for calculating the cross-validated Mahalanobis (crossnobis) RDMs for a batch of fold patterns '
+
+def crossnobisRDM(folds, noise):
+
+    """
+    Calculate the cross-validated Mahalanobis (crossnobis) RDMs for a batch of condition patterns split into folds
+
+    Parameters
+    ----------
+    folds : array
+        The condition patterns averaged within each fold of trials.
+        The shape of folds must be [..., n_folds, n_cons, n_features]. n_folds should be at least 2.
+    noise : array
+        The noise samples for estimating the noise covariances, such as the residuals of the trials after subtracting
+        the condition means. The shape of noise must be [..., n_samples, n_features].
+
+    Returns
+    -------
+    RDMs : array
+        The crossnobis RDMs.
+        The shape of RDMs is [..., n_cons, n_cons].
+
+    Notes
+    -----
+    The dissimilarity between condition i & j is the average over all pairs of different folds (k, l) of
+    (m_ik - m_jk) * inv(cov) * (m_il - m_jl).T / n_features. As the noises of different folds are independent, the
+    estimate is unbiased: it is 0 on average when the patterns do not differ and it can be negative. Thus, the results
+    are not normalized.
+    All the fold pairs are obtained from two whitened Gram matrices (see neurora.stuff.mahalanobis_gram()): the sum
+    over k != l of M_k * inv(cov) * M_l.T equals S * inv(cov) * S.T - sum_k M_k * inv(cov) * M_k.T, where S is the sum
+    of the fold patterns. One shrinkage noise covariance is estimated for each RDM in the batch and shared by all the
+    folds.
+    """
+
+    folds = np.asarray(folds, dtype=np.float64)
+
+    nfolds, cons, nfeatures = np.shape(folds)[-3:]
+
+    # stack the summed patterns & the fold patterns and whiten them together
+    # shape of patterns: [..., (n_folds+1)*n_cons, n_features]
+    patterns = np.concatenate((np.sum(folds, axis=-3, keepdims=True), folds), axis=-3)
+    patterns = np.reshape(patterns, np.shape(folds)[:-3] + ((nfolds + 1) * cons, nfeatures))
+    gram = mahalanobis_gram(patterns, noise)
+
+    # the Gram matrix of the summed patterns minus the Gram matrices within the folds
+    gram = np.reshape(gram, np.shape(gram)[:-2] + (nfolds + 1, cons, nfolds + 1, cons))
+    cross = gram[..., 0, :, 0, :]
+    for k in range(1, nfolds + 1):
+        cross = cross - gram[..., k, :, k, :]
+    cross = cross / (nfolds * (nfolds - 1))
+
+    # the distances from the cross-validated Gram matrices
+    sq = np.diagonal(cross, axis1=-2, axis2=-1)
+    rdms = (sq[..., :, None] + sq[..., None, :] - cross - np.swapaxes(cross, -1, -2)) / nfeatures
+
+    # zero the diagonal
+    rdms[..., np.arange(cons), np.arange(cons)] = 0
+
+    return rdms
+
+
 ' a function for calculating the RDM(s) based on behavioral data '
 
-def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
+def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False, condensed=False, dtype=np.float64):
 
     """
     Calculate the Representational Dissimilarity Matrix(Matrices) - RDM(s) for behavioral data
@@ -37,15 +198,23 @@ def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
         If method='correlation', the dissimilarity is calculated by Pearson Correlation.
         If method='euclidean', the dissimilarity is calculated by Euclidean Distance, the results will be normalized.
         If method='mahalanobis', the dissimilarity is calculated by Mahalanobis Distance, the results will be normalized.
+            The noise covariance is estimated from the residuals of the trials with the Ledoit-Wolf shrinkage.
     abs : boolean True or False. Default is True.
         Calculate the absolute value of Pearson r or not. Only works when method='correlation'.
+    condensed : boolean True or False. Default is False.
+        Return the RDM(s) as a CondensedRDM (see neurora.stuff.CondensedRDM) or not.
+        If condensed=True, only the upper triangles (without the diagonal) of the RDMs are saved.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the CondensedRDM. Only works when condensed=True.
 
     Returns
     -------
-    RDM(s) : array
+    RDM(s) : array or CondensedRDM
         The behavioral RDM.
         If sub_opt=1, return n_subs RDMs. The shape is [n_subs, n_cons, n_cons].
         If sub_opt=0, return only one RDM. The shape is [n_cons, n_cons].
+        If condensed=True, return a CondensedRDM and the last two dimensions [n_cons, n_cons] are replaced by
+        [n_cons*(n_cons-1)/2].
 
     Notes
     -----
@@ -61,6 +230,12 @@ def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
 
         return "Invalid input!"
 
+    if condensed == True and np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
+
+        print("\nThe dtype should be numpy.float32 or numpy.float64.\n")
+
+        return "Invalid input!"
+
     # get the number of conditions & the number of subjects
     cons = len(bhv_data)
 
@@ -95,7 +270,7 @@ def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
 
         # calculate the values in RDMs
         for sub in range(subs):
-            rdm = np.zeros([cons, cons], dtype=np.float)
+            rdm = np.zeros([cons, cons], dtype=np.float64)
             for i in range(cons):
                 for j in range(cons):
                     # calculate the difference
@@ -128,15 +303,15 @@ def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
 
         print("\nRDMs computing finished!")
 
+        if condensed == True:
+            return CondensedRDM.from_rdm(rdms, dtype=dtype)
+
         return rdms
 
     # & sub_opt=0
 
     print("\nComputing RDM")
 
-    # initialize the RDM
-    rdm = np.zeros([cons, cons], dtype=np.float64)
-
     # judge whether numbers of trials of different conditions are same
     if len(set(n_subs)) != 1:
         return None
@@ -145,36 +320,97 @@ def bhvRDM(bhv_data, sub_opt=1, method="correlation", abs=False):
     # save the data for each subject under each condition, average the trials
     data = np.average(bhv_data, axis=2)
 
+    # the residuals of the trials for estimating the noise covariance
+    # shape of noise: [cons, subs, trials] -> [cons*trials, subs]
+    if method == 'mahalanobis' and n_trials[0] > 1:
+        noise = np.reshape(np.transpose(bhv_data - np.average(bhv_data, axis=2, keepdims=True), (0, 2, 1)),
+                           [cons * n_trials[0], subs])
+    else:
+        noise = None
+
     # calculate the values in RDM
-    for i in range(cons):
-        for j in range(cons):
-            if method is 'correlation':
-                # calculate the Pearson Coefficient
-                r = pearsonr(data[i], data[j])[0]
-                # calculate the dissimilarity
-                if abs == True:
-                    rdm[i, j] = limtozero(1 - np.abs(r))
-                else:
-                    rdm[i, j] = limtozero(1 - r)
-            elif method is 'euclidean':
-                rdm[i, j] = np.linalg.norm(data[i]-data[j])
-            elif method is 'mahalanobis':
-                X = np.transpose(np.vstack((data[i], data[j])), (1, 0))
-                X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                rdm[i, j] = np.linalg.norm(X[:, 0]-X[:, 1])
-    if method is 'euclidean' or method is 'mahalanobis':
-        max = np.max(rdm)
-        min = np.min(rdm)
-        rdm = (rdm-min)/(max-min)
+    rdm = batchRDM(data, method=method, abs=abs, noise=noise)
+
+    if isinstance(rdm, str):
+
+        return "Invalid input!"
 
     print("\nRDM computing finished!")
 
+    if condensed == True:
+        return CondensedRDM.from_rdm(rdm, dtype=dtype)
+
     return rdm
 
 
+' a function for arranging the EEG-like data as the condition patterns for eegRDM() '
+
+def eegRDM_patterns(data, chl_opt=0, time_opt=0, time_win=5, time_step=5):
+
+    """
+    Arrange the EEG-like data as the condition patterns for calculating the RDMs
+
+    Parameters
+    ----------
+    data : array
+        The EEG-like data averaged over trials (or the residuals of the trials).
+        The shape of data must be [n, n_subs, n_chls, n_ts].
+    chl_opt : int 0 or 1. Default is 0.
+        Calculate the RDM for each channel or not.
+    time_opt : int 0 or 1. Default is 0.
+        Calculate the RDM for each time-window or not.
+    time_win : int. Default is 5.
+        The time-window. Only works when time_opt=1.
+    time_step : int. Default is 5.
+        The time step size. Only works when time_opt=1.
+
+    Returns
+    -------
+    patterns : array
+        The patterns.
+        If chl_opt=0 & time_opt=0, the shape is [n_subs, n, n_chls*n_ts].
+        If chl_opt=0 & time_opt=1, the shape is [n_subs, n_tws, n, time_win*n_chls].
+        If chl_opt=1 & time_opt=0, the shape is [n_subs, n_chls, n, n_ts].
+        If chl_opt=1 & time_opt=1, the shape is [n_subs, n_chls, n_tws, n, time_win].
+        n_tws = int((n_ts-time_win)/time_step)+1.
+    """
+
+    n, subs, chls, ts = np.shape(data)
+
+    if time_opt == 1:
+
+        # the time-points for calculating RDM
+        ts = int((ts - time_win) / time_step) + 1
+
+        # extract the time-windows
+        # shape of data: [n, subs, chls, ts, time_win] -> [subs, chls, ts, n, time_win]
+        data = sliding_time_windows(data, time_win, time_step)
+        data = np.transpose(data, (1, 2, 3, 0, 4))
+
+        if chl_opt == 0:
+
+            # shape of data: [subs, chls, ts, n, time_win] -> [subs, ts, n, time_win*chls]
+            data = np.transpose(data, (0, 2, 3, 4, 1))
+            data = np.reshape(data, [subs, ts, n, time_win*chls])
+
+    elif chl_opt == 1:
+
+        # shape of data: [n, subs, chls, ts] -> [subs, chls, n, ts]
+        data = np.transpose(data, (1, 2, 0, 3))
+
+    else:
+
+        # flatten the data for different calculating conditions
+        # shape of data: [n, subs, chls*ts] -> [subs, n, chls*ts]
+        data = np.transpose(np.reshape(data, [n, subs, chls * ts]), (1, 0, 2))
+
+    return data
+
+
 ' a function for calculating the RDM(s) based on EEG/MEG/fNIRS & other EEG-like data '
 
-def eegRDM(EEG_data, sub_opt=1, chl_opt=0, time_opt=0, time_win=5, time_step=5, method="correlation", abs=False):
+def eegRDM(EEG_data, sub_opt=1, chl_opt=0, time_opt=0, time_win=5, time_step=5, method="correlation", abs=False,
+           condensed=False, dtype=np.float64, nfolds=2):
 
     """
     Calculate the Representational Dissimilarity Matrix(Matrices) - RDM(s) based on EEG-like data
@@ -205,17 +441,30 @@ def eegRDM(EEG_data, sub_opt=1, chl_opt=0, time_opt=0, time_win=5, time_step=5,
     time_step : int. Default is 5.
         The time step size for each time of calculating.
         Only when time_opt=1, time_step works.
-    method : string 'correlation' or 'euclidean' or 'mahalanobis'. Default is 'correlation'.
+    method : string 'correlation' or 'euclidean' or 'mahalanobis' or 'crossnobis'. Default is 'correlation'.
         The method to calculate the dissimilarities.
         If method='correlation', the dissimilarity is calculated by Pearson Correlation.
         If method='euclidean', the dissimilarity is calculated by Euclidean Distance, the results will be normalized.
         If method='mahalanobis', the dissimilarity is calculated by Mahalanobis Distance, the results will be normalized.
+            The noise covariances are estimated from the residuals of the trials with the Ledoit-Wolf shrinkage. If
+            n_trials=1, they are estimated from the condition patterns.
+        If method='crossnobis', the dissimilarity is calculated by the cross-validated Mahalanobis Distance across the
+            folds of trials (see crossnobisRDM()). The results are unbiased and not normalized. n_trials should be at
+            least nfolds.
     abs : boolean True or False. Default is True.
         Calculate the absolute value of Pearson r or not.
+    condensed : boolean True or False. Default is False.
+        Return the RDM(s) as a CondensedRDM (see neurora.stuff.CondensedRDM) or not.
+        If condensed=True, only the upper triangles (without the diagonal) of the RDMs are saved.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the CondensedRDM. Only works when condensed=True.
+    nfolds : int. Default is 2.
+        The number of folds of trials. Only works when method='crossnobis'.
+        The trials are split into nfolds consecutive folds and nfolds should be at least 2.
 
     Returns
     -------
-    RDM(s) : array
+    RDM(s) : array or CondensedRDM
         The EEG/MEG/fNIR/other EEG-like RDM.
         If sub_opt=0 & chl_opt=0 & time_opt=0, return only one RDM.
             The shape is [n_cons, n_cons].
@@ -233,6 +482,8 @@ def eegRDM(EEG_data, sub_opt=1, chl_opt=0, time_opt=0, time_win=5, time_step=5,
             The shape is [n_subs, n_chls, n_cons, n_cons].
         If sub_opt=1 & chl_opt=1 & time_opt=1, return n_subs*n_chls*(int((n_ts-time_win)/time_step)+1) RDM.
             The shape is [n_subs, n_chls, int((n_ts-time_win)/time_step)+1, n_cons, n_cons].
+        If condensed=True, return a CondensedRDM and the last two dimensions [n_cons, n_cons] are replaced by
+        [n_cons*(n_cons-1)/2].
 
     Notes
     -----
@@ -247,256 +498,176 @@ def eegRDM(EEG_data, sub_opt=1, chl_opt=0, time_opt=0, time_win=5, time_step=5,
 
         return "Invalid input!"
 
-    # get the number of conditions, subjects, trials, channels and time points
-    cons, subs, trials, chls, ts = np.shape(EEG_data)
-
-    if time_opt == 1:
-
-        print("\nComputing RDMs")
-
-        # the time-points for calculating RDM
-        ts = int((ts - time_win) / time_step) + 1
-
-        # initialize the data for calculating the RDM
-        data = np.zeros([subs, chls, ts, cons, time_win], dtype=np.float64)
-
-        # assignment
-        for i in range(subs):
-            for j in range(chls):
-                for k in range(ts):
-                    for l in range(cons):
-                        for m in range(time_win):
-                            # average the trials
-                            data[i, j, k, l, m] = np.average(EEG_data[l, i, :, j, k * time_step + m])
+    if condensed == True and np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
 
-        if chl_opt == 1:
+        print("\nThe dtype should be numpy.float32 or numpy.float64.\n")
 
-            total = subs*chls*ts
-
-            # initialize the RDMs
-            rdms = np.zeros([subs, chls, ts, cons, cons], dtype=np.float64)
+        return "Invalid input!"
 
-            # calculate the values in RDMs
-            for i in range(subs):
-                for j in range(chls):
-                    for k in range(ts):
+    # get the number of conditions, subjects, trials, channels and time points
+    cons, subs, trials, chls, ts = np.shape(EEG_data)
 
-                        # show the progressbar
-                        percent = (i * chls * ts + j * ts + k + 1) / total * 100
-                        show_progressbar("Calculating", percent)
+    if method == 'crossnobis' and (nfolds < 2 or trials < nfolds):
 
-                        for l in range(cons):
-                            for m in range(cons):
-                                if method is 'correlation':
-                                    # calculate the Pearson Coefficient
-                                    r = pearsonr(data[i, j, k, l], data[i, j, k, m])[0]
-                                    # calculate the dissimilarity
-                                    if abs == True:
-                                        rdms[i, j, k, l, m] = limtozero(1 - np.abs(r))
-                                    else:
-                                        rdms[i, j, k, l, m] = limtozero(1 - r)
-                                elif method is 'euclidean':
-                                    rdms[i, j, k, l, m] = np.linalg.norm(data[i, j, k, l] - data[i, j, k, m])
-                                elif method is 'mahalanobis':
-                                    X = np.transpose(np.vstack((data[i, j, k, l], data[i, j, k, m])), (1, 0))
-                                    X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                                    rdms[i, j, k, l, m] = np.linalg.norm(X[:, 0] - X[:, 1])
-                        if method is 'euclidean' or method is 'mahalanobis':
-                            max = np.max(rdms[i, j, k])
-                            min = np.min(rdms[i, j, k])
-                            rdms[i, j, k] = (rdms[i, j, k] - min) / (max - min)
+        print("\nThe number of folds should be at least 2 and no more than the number of trials.\n")
 
-            # time_opt=1 & chl_opt=1 & sub_opt=1
-            if sub_opt == 1:
+        return "Invalid input!"
 
-                print("\nRDMs computing finished!")
+    if time_opt == 1 or sub_opt == 1 or chl_opt == 1:
+        print("\nComputing RDMs")
+    else:
+        print("\nComputing RDM")
 
-                return rdms
+    # average the trials
+    data = eegRDM_patterns(np.average(EEG_data, axis=2), chl_opt, time_opt, time_win, time_step)
 
-            # time_opt=1 & chl_opt=1 & sub_opt=0
-            if sub_opt == 0:
+    # average the trials within each fold
+    if method == 'crossnobis':
+        folds = np.array_split(np.arange(trials), nfolds)
+        folds = np.concatenate([np.average(EEG_data[:, :, fold], axis=2) for fold in folds])
+        # shape of folds: [subs, ..., nfolds, cons, n_features]
+        folds = eegRDM_patterns(folds, chl_opt, time_opt, time_win, time_step)
+        folds = np.reshape(folds, np.shape(folds)[:-2] + (nfolds, cons, np.shape(folds)[-1]))
 
-                rdms = np.average(rdms, axis=0)
+    # the residuals of the trials for estimating the noise covariances
+    if (method == 'mahalanobis' or method == 'crossnobis') and trials > 1:
+        residuals = EEG_data - np.average(EEG_data, axis=2, keepdims=True)
+        residuals = np.reshape(np.transpose(residuals, (0, 2, 1, 3, 4)), [cons * trials, subs, chls, ts])
 
-                print("\nRDMs computing finished!")
+    # the indices of the upper triangle of an RDM
+    iu = np.triu_indices(cons, 1)
 
-                return rdms
+    # initialize the RDMs
+    if condensed == True:
+        # only save the upper triangles of the RDMs
+        rdms = np.zeros(np.shape(data)[:-2] + (len(iu[0]), ), dtype=dtype)
+    else:
+        rdms = np.zeros(np.shape(data)[:-1] + (cons, ), dtype=np.float64)
 
-        # if chl_opt = 0
+    # calculate the RDMs of all the channels & time-windows of a subject at once
+    for i in range(subs):
 
-        data = np.transpose(data, (0, 2, 3, 4, 1))
-        data = np.reshape(data, [subs, ts, cons, time_win*chls])
+        # show the progressbar
+        percent = (i + 1) / subs * 100
+        show_progressbar("Calculating", percent)
 
-        rdms = np.zeros([subs, ts, cons, cons], dtype=np.float64)
+        # the noise samples of the subject in the same shape as the patterns
+        if (method == 'mahalanobis' or method == 'crossnobis') and trials > 1:
+            noise = eegRDM_patterns(residuals[:, i:i+1], chl_opt, time_opt, time_win, time_step)[0]
+        else:
+            noise = None
 
-        total = subs * ts
+        if method == 'crossnobis':
+            subrdms = crossnobisRDM(folds[i], noise)
+        else:
+            subrdms = batchRDM(data[i], method=method, abs=abs, noise=noise)
 
-        # calculate the values in RDMs
-        for i in range(subs):
-            for k in range(ts):
-
-                # show the progressbar
-                percent = (i * ts + k + 1) / total * 100
-                show_progressbar("Calculating", percent)
-
-                for l in range(cons):
-                    for m in range(cons):
-                        if method is 'correlation':
-                            # calculate the Pearson Coefficient
-                            r = pearsonr(data[i, k, l], data[i, k, m])[0]
-                            # calculate the dissimilarity
-                            if abs == True:
-                                rdms[i, k, l, m] = limtozero(1 - np.abs(r))
-                            else:
-                                rdms[i, k, l, m] = limtozero(1 - r)
-                        elif method is 'euclidean':
-                            rdms[i, k, l, m] = np.linalg.norm(data[i, k, l] - data[i, k, m])
-                        elif method is 'mahalanobis':
-                            X = np.transpose(np.vstack((data[i, k, l], data[i, k, m])), (1, 0))
-                            X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                            rdms[i, k, l, m] = np.linalg.norm(X[:, 0] - X[:, 1])
-                if method is 'euclidean' or method is 'mahalanobis':
-                    max = np.max(rdms[i, k])
-                    min = np.min(rdms[i, k])
-                    rdms[i, k] = (rdms[i, k] - min) / (max - min)
-
-        # time_opt=1 & chl_opt=0 & sub_opt=1
-        if sub_opt == 1:
+        if isinstance(subrdms, str):
+            return "Invalid input!"
 
-            print("\nRDMs computing finished!")
+        if condensed == True:
+            rdms[i] = subrdms[..., iu[0], iu[1]]
+        else:
+            rdms[i] = subrdms
 
-            return rdms
+    if sub_opt == 0:
 
-        # time_opt=1 & chl_opt=0 & sub_opt=0
-        if sub_opt == 0:
+        rdms = np.average(rdms, axis=0)
 
-            rdms = np.average(rdms, axis=0)
+        print("\nRDM computing finished!")
 
-            print("\nRDM computing finished!")
+    else:
 
-            return rdms
+        print("\nRDMs computing finished!")
 
+    if condensed == True:
+        return CondensedRDM(rdms, dtype=dtype)
 
-    # if time_opt = 0
+    return rdms
 
-    if chl_opt == 1:
 
-        print("\nComputing RDMs")
+' a function for decoding the pairs of conditions of a subject for eegRDM_bydecoding() '
 
-        # average the trials
-        data = np.average(EEG_data, axis=2)
+def eegRDM_bydecoding_pair(pseudo, folds, task, normalization=False, classifier="svm"):
 
-        # initialize the RDMs
-        rdms = np.zeros([subs, chls, cons, cons], dtype=np.float64)
-
-        total = subs * chls
-
-        # calculate the values in RDMs
-        for i in range(subs):
-            for j in range(chls):
-
-                # show the progressbar
-                percent = (i * chls + j + 1) / total * 100
-                show_progressbar("Calculating", percent)
-
-                for k in range(cons):
-                    for l in range(cons):
-                        if method is 'correlation':
-                            # calculate the Pearson Coefficient
-                            r = pearsonr(data[k, i, j], data[l, i, j])[0]
-                            # calculate the dissimilarity
-                            if abs == True:
-                                rdms[i, j, k, l] = limtozero(1 - np.abs(r))
-                            else:
-                                rdms[i, j, k, l] = limtozero(1 - r)
-                        elif method is 'euclidean':
-                            rdms[i, j, k, l] = np.linalg.norm(data[k, i, j] - data[k, i, j])
-                        elif method is 'mahalanobis':
-                            X = np.transpose(np.vstack((data[k, i, j], data[l, i, j])), (1, 0))
-                            X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                            rdms[i, j, k, l] = np.linalg.norm(X[:, 0] - X[:, 1])
-                if method is 'euclidean' or method is 'mahalanobis':
-                    max = np.max(rdms[i, j])
-                    min = np.min(rdms[i, j])
-                    rdms[i, j] = (rdms[i, j] - min) / (max - min)
-
-        # time_opt=0 & chl_opt=1 & sub_opt=1
-        if sub_opt == 1:
+    """
+    Decode a pair of conditions time-by-time with the shared pseudo-trials & splits of the folds
 
-            print("\nRDM computing finished!")
+    Parameters
+    ----------
+    pseudo : array
+        The pseudo-trials of all the subjects & repeats.
+        The shape of pseudo must be [n_subs, n_repeats, n_cons, n_pseudo, n_features, n_tws].
+    folds : array
+        The fold of each pseudo-trial. The shape of folds must be [n_subs, n_repeats, n_pseudo].
+    task : tuple
+        (sub, con1, con2): the subject & the pair of conditions.
+    normalization : boolean True or False. Default is False.
+        Normalize the data or not.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see neurora.decoding.linear_classifiers_fit()).
 
-            return rdms
+    Returns
+    -------
+    accuracies : array
+        The smoothed decoding accuracies averaged over the repeats & folds. The shape of accuracies is [n_tws].
+    """
 
-        # time_opt=0 & chl_opt=1 & sub_opt=0
-        if sub_opt == 0:
+    sub, con1, con2 = task
 
-            rdms = np.average(rdms, axis=0)
+    nrepeats, cons, npseudo, nfeatures, ts = np.shape(pseudo)[1:]
+    nfolds = np.max(folds) + 1
 
-            print("\nRDM computing finished!")
+    acc = np.zeros([nrepeats, ts, nfolds])
 
-            return rdms
+    y = np.repeat([0, 1], npseudo)
 
-    # if chl_opt = 0
+    for i in range(nrepeats):
 
-    if sub_opt == 1:
+        # shape of x: [2*npseudo, nfeatures, ts]
+        x = np.concatenate((pseudo[sub, i, con1], pseudo[sub, i, con2]))
+        fold = np.tile(folds[sub, i], 2)
 
-        print("\nComputing RDMs")
+        for k in range(nfolds):
 
-    else:
+            train_index = fold != k
+            test_index = fold == k
 
-        print("\nComputing RDM")
+            # fit the classifiers of all the time-windows & score them at once
+            weights, biases = linear_classifiers_fit(x[train_index], y[train_index], 2, classifier, normalization)
+            predictions = linear_classifiers_predict(weights, biases, x[test_index], 2, classifier)
+            acc[i, :, k] = np.average(predictions == y[test_index], axis=1)
 
-    # average the trials
-    data = np.average(EEG_data, axis=2)
+    # smooth the accuracies over 5 time-windows
+    return decoding_smooth_1d(np.average(acc, axis=(0, 2)))
 
-    # flatten the data for different calculating conditions
-    data = np.reshape(data, [cons, subs, chls * ts])
 
-    # initialize the RDMs
-    rdms = np.zeros([subs, cons, cons], dtype=np.float64)
+# the data shared by the worker processes of eegRDM_bydecoding()
+eegRDM_bydecoding_context = {}
 
-    # calculate the values in RDMs
-    for i in range(subs):
-        for j in range(cons):
-            for k in range(cons):
-                if method is 'correlation':
-                    # calculate the Pearson Coefficient
-                    r = pearsonr(data[j, i], data[k, i])[0]
-                    # calculate the dissimilarity
-                    if abs is True:
-                        rdms[i, j, k] = limtozero(1 - np.abs(r))
-                    else:
-                        rdms[i, j, k] = limtozero(1 - r)
-                elif method is 'euclidean':
-                    rdms[i, j, k] = np.linalg.norm(data[j, i] - data[k, i])
-                elif method is 'mahalanobis':
-                    X = np.transpose(np.vstack((data[j, i], data[k, i])), (1, 0))
-                    X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                    rdms[i, j, k] = np.linalg.norm(X[:, 0] - X[:, 1])
-        if method is 'euclidean' or method is 'mahalanobis':
-            max = np.max(rdms[i])
-            min = np.min(rdms[i])
-            rdms[i] = (rdms[i] - min) / (max - min)
 
-    if sub_opt == 1:
+' a function for initializing the worker processes of eegRDM_bydecoding() '
 
-        print("\nRDMs computing finished!")
+def eegRDM_bydecoding_init(name, shape, dtype, folds, normalization, classifier):
 
-        return rdms
+    eegRDM_bydecoding_context["shm"], eegRDM_bydecoding_context["pseudo"] = from_shared_memory(name, shape, dtype)
+    eegRDM_bydecoding_context["folds"] = folds
+    eegRDM_bydecoding_context["normalization"] = normalization
+    eegRDM_bydecoding_context["classifier"] = classifier
 
-    if sub_opt == 0:
 
-        rdms = np.average(rdms, axis=0)
+' a function for decoding a pair of conditions in the worker processes of eegRDM_bydecoding() '
 
-        print("\nRDM computing finished!")
+def eegRDM_bydecoding_worker(task):
 
-        return rdms
+    return eegRDM_bydecoding_pair(eegRDM_bydecoding_context["pseudo"], eegRDM_bydecoding_context["folds"], task,
+                                  eegRDM_bydecoding_context["normalization"], eegRDM_bydecoding_context["classifier"])
 
 
 ' a function for calculating the RDM(s) using classification-based neural decoding based on EEG/MEG/fNIRS & other EEG-like data '
 
 def eegRDM_bydecoding(EEG_data, sub_opt=1, time_win=5, time_step=5, navg=5, time_opt="average", nfolds=5, nrepeats=2,
-                      normalization=False):
+                      normalization=False, n_jobs=1, condensed=False, dtype=np.float64, classifier="svm"):
 
     """
     Calculate the Representational Dissimilarity Matrix(Matrices) - RDM(s) based on EEG-like data
@@ -532,18 +703,33 @@ def eegRDM_bydecoding(EEG_data, sub_opt=1, time_win=5, time_step=5, navg=5, time
         The times for iteration.
     normalization : boolean True or False. Default is False.
         Normalize the data or not.
+    n_jobs : int. Default is 1.
+        The number of processes used for decoding the pairs of conditions. If n_jobs=-1, all the CPUs are used.
+    condensed : boolean True or False. Default is False.
+        Return the RDM(s) as a CondensedRDM (see neurora.stuff.CondensedRDM) or not.
+        If condensed=True, only the upper triangles (without the diagonal) of the RDMs are saved.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the CondensedRDM. Only works when condensed=True.
+    classifier : string 'svm' or 'lda' or 'ridge'. Default is 'svm'.
+        The linear classifier (see neurora.decoding.linear_classifiers_fit()).
+        If classifier='lda' or 'ridge', the classifiers of all the time-windows are fitted at once in closed form.
 
     Returns
     -------
-    RDM(s) : array
+    RDM(s) : array or CondensedRDM
         The EEG/MEG/fNIR/other EEG-like RDM.
         If sub_opt=0, return int((n_ts-time_win)/time_step)+1 RDMs.
             The shape is [int((n_ts-time_win)/time_step)+1, n_cons, n_cons].
         If sub_opt=1, return n_subs*int((n_ts-time_win)/time_step)+1 RDM.
             The shape is [n_subs, int((n_ts-time_win)/time_step)+1, n_cons, n_cons].
+        If condensed=True, return a CondensedRDM and the last two dimensions [n_cons, n_cons] are replaced by
+        [n_cons*(n_cons-1)/2].
 
     Notes
     -----
+    Only the upper triangle of each RDM is decoded and the RDMs are filled symmetrically. For each subject & each
+    repeat, the pseudo-trials (averages of navg trials) of all the conditions and the splits of the folds are built
+    once and shared by all the pairs of conditions. The accuracies of each pair are smoothed over time.
     Sometimes, the numbers of trials under different conditions are not same. In NeuroRA, we recommend users to sample
     randomly from the trials under each conditions to keep the numbers of trials under different conditions same, and
     you can iterate multiple times.
@@ -555,40 +741,187 @@ def eegRDM_bydecoding(EEG_data, sub_opt=1, time_win=5, time_step=5, navg=5, time
 
         return "Invalid input!"
 
+    if condensed == True and np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
+
+        print("\nThe dtype should be numpy.float32 or numpy.float64.\n")
+
+        return "Invalid input!"
+
     # get the number of conditions, subjects, trials, channels and time points
     cons, subs, trials, chls, ts = np.shape(EEG_data)
 
+    # the number of pseudo-trials of each condition
+    npseudo = int(trials / navg)
+
+    if classifier not in ("svm", "lda", "ridge"):
+
+        print("\nThe classifier should be 'svm' or 'lda' or 'ridge'.\n")
+
+        return "Invalid input!"
+
+    if nfolds < 2 or npseudo < nfolds:
+
+        print("\nThe number of folds should be at least 2 and no more than the number of pseudo-trials.\n")
+
+        return "Invalid input!"
+
     ts = int((ts - time_win) / time_step) + 1
 
+    # shape of data: [cons, subs, trials, nfeatures, ts]
+    if time_opt == "features":
+        data = np.transpose(sliding_time_windows(EEG_data, time_win, time_step), (0, 1, 2, 3, 5, 4))
+        data = np.reshape(data, [cons, subs, trials, chls * time_win, ts])
+    else:
+        data = window_average(EEG_data, time_win, time_step)
+
+    nfeatures = np.shape(data)[3]
+
+    # build the pseudo-trials of all the conditions & repeats at once and the splits of the folds
+    pseudo = np.zeros([subs, nrepeats, cons, npseudo, nfeatures, ts])
+    folds = np.zeros([subs, nrepeats, npseudo], dtype=int)
+
+    rng = np.random.default_rng(np.random.randint(0, 2 ** 31 - 1))
+
+    for sub in range(subs):
+
+        # shape of subdata: [cons*trials, nfeatures, ts]
+        subdata = np.reshape(data[:, sub], [cons * trials, nfeatures, ts])
+        pseudo[sub] = decoding_pseudo_trials(subdata, np.repeat(np.arange(cons), trials), cons, navg, nrepeats, rng)
+
+        # the same pseudo-trials are left out for all the conditions
+        for i in range(nrepeats):
+            folds[sub, i, rng.permutation(npseudo)] = np.arange(npseudo) % nfolds
+
+    # only the upper triangles
+    iu = np.triu_indices(cons, 1)
+    tasks = [(sub, con1, con2) for sub in range(subs) for con1, con2 in zip(iu[0], iu[1])]
+
     rdms = np.zeros([subs, ts, cons, cons])
 
-    for con1 in range(cons):
-        for con2 in range(cons):
+    shm = None
+
+    if n_jobs == 1:
+        results = (eegRDM_bydecoding_pair(pseudo, folds, task, normalization, classifier) for task in tasks)
+    else:
+        # share the pseudo-trials with the worker processes instead of pickling them
+        shm, shared = to_shared_memory(pseudo)
+        results = pool_imap(eegRDM_bydecoding_worker, tasks, n_jobs, eegRDM_bydecoding_init,
+                            (shm.name, shared.shape, shared.dtype, folds, normalization, classifier))
+
+    try:
+        for k, acc in enumerate(results):
+
+            # show the progressbar
+            percent = (k + 1) / len(tasks) * 100
+            show_progressbar("Calculating", percent)
 
-            if con1 != con2:
+            sub, con1, con2 = tasks[k]
+            rdms[sub, :, con1, con2] = acc
+            rdms[sub, :, con2, con1] = acc
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
 
-                data = np.concatenate((EEG_data[con1], EEG_data[con2]), axis=1)
-                print(data.shape)
-                labels = np.zeros([subs, 2*trials])
-                labels[:, trials:] = 1
-                print(labels.shape)
-                rdms[:, :, con1, con2] = tbyt_decoding_kfold(data, labels, n=2, navg=navg, time_opt=time_opt,
-                                                             time_win=time_win, time_step=time_step, nfolds=nfolds,
-                                                             nrepeats=nrepeats, normalization=normalization,
-                                                             smooth=True)
+    print("\nDecoding finished!\n")
 
     if sub_opt == 0:
 
-        return np.average(rdms, axis=0)
+        rdms = np.average(rdms, axis=0)
+
+    if condensed == True:
+        return CondensedRDM.from_rdm(rdms, dtype=dtype)
+
+    return rdms
+
+
+# the data shared by the worker processes of fmriRDM()
+fmriRDM_context = {}
+
+
+' a function for calculating the searchlight RDMs of a slab of calculation units '
+
+def fmriRDM_slab(fmri_data, task, context):
+
+    """
+    Calculate the searchlight RDMs of a slab of calculation units of one subject
+
+    Parameters
+    ----------
+    fmri_data : array
+        The fmri data. The shape of fmri_data must be [n_cons, n_subs, nx, ny, nz].
+    task : tuple
+        The slab of calculation units.
+        For the cubes, task is (sub, x): the calculation units along the y & z axis at x of the subject sub.
+        For the spheres, task is (sub, voxels): voxels is an array with a shape of [n_units, n_neighbors] including the
+        flat indices of the neighbour voxels of the calculation units.
+    context : dict
+        The settings shared by all the slabs, prepared by fmriRDM().
+
+    Returns
+    -------
+    RDMs : array
+        The RDMs of the calculation units in the slab. The shape of RDMs is [n_units, n_cons, n_cons].
+    """
+
+    cons, subs = np.shape(fmri_data)[:2]
+
+    if context["searchlight"] == True:
+
+        sub, voxels = task
+
+        # shape of data: [cons, n_units, n_neighbors] -> [n_units, cons, n_neighbors]
+        data = np.reshape(fmri_data, [cons, subs, -1])
+        data = np.transpose(data[:, sub][:, voxels], (1, 0, 2))
+
+        nans = context["nanvoxels"][:, voxels].any(axis=2).T
 
     else:
 
-        return rdms
+        sub, x = task
+
+        kx, ky, kz = context["ksize"]
+
+        # only the calculation units inside the mask
+        ys, zs = np.nonzero(context["centers"][x])
+
+        # shape of data: [cons, n_units, kx, ky, kz] -> [n_units, cons, kx*ky*kz]
+        patches = searchlight_patches(fmri_data, context["ksize"], context["strides"])
+        data = np.reshape(patches[:, sub, x, ys, zs], [cons, len(ys), kx*ky*kz])
+        data = np.transpose(data, (1, 0, 2))
+
+        nans = context["nanunits"][x, ys, zs]
+
+    rdms = batchRDM(data, context["method"], context["abs"])
+
+    # no NaN
+    if context["method"] == 'correlation':
+        rdms[nans[:, :, None] | nans[:, None, :]] = np.nan
+    else:
+        rdms[nans.any(axis=1)] = np.nan
+
+    return rdms
+
+
+' a function for initializing the worker processes of fmriRDM() '
+
+def fmriRDM_init(name, shape, dtype, context):
+
+    fmriRDM_context["shm"], fmriRDM_context["fmri_data"] = from_shared_memory(name, shape, dtype)
+    fmriRDM_context["context"] = context
+
+
+' a function for calculating a slab of calculation units in the worker processes of fmriRDM() '
+
+def fmriRDM_worker(task):
+
+    return fmriRDM_slab(fmriRDM_context["fmri_data"], task, fmriRDM_context["context"])
 
 
 ' a function for calculating the RDMs based on fMRI data (searchlight) '
 
-def fmriRDM(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], sub_opt=1, method="correlation", abs=False):
+def fmriRDM(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], sub_opt=1, method="correlation", abs=False, mask=None,
+            searchlight=None, n_jobs=1, out=None, condensed=False, dtype=np.float64):
 
     """
     Calculate the Representational Dissimilarity Matrices (RDMs) based on fMRI data (searchlight)
@@ -614,17 +947,46 @@ def fmriRDM(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], sub_opt=1, method="co
         If method='correlation', the dissimilarity is calculated by Pearson Correlation.
         If method='euclidean', the dissimilarity is calculated by Euclidean Distance, the results will be normalized.
         If method='mahalanobis', the dissimilarity is calculated by Mahalanobis Distance, the results will be normalized.
+            The noise covariance of each calculation unit is estimated from the condition patterns with the
+            Ledoit-Wolf shrinkage.
     abs : boolean True or False. Default is True.
         Calculate the absolute value of Pearson r or not.
+    mask : array or string. Default is None.
+        The brain mask. It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+        If mask is not None, only the calculation units whose centres are inside the mask (voxels with values > 0)
+        will be calculated, and the RDMs of the other calculation units are NaN.
+    searchlight : SphereSearchlight. Default is None.
+        A spherical searchlight (see neurora.stuff.SphereSearchlight) built for the size of the fMRI-img.
+        If searchlight is not None, the spheres are used as the calculation units instead of the cubes, and ksize,
+        strides & mask don't work.
+    n_jobs : int. Default is 1.
+        The number of processes used for calculating. If n_jobs=-1, all the CPUs are used.
+        The fMRI data is shared by the processes through shared memory and the results are the same as n_jobs=1.
+    out : string. Default is None.
+        The filename of a .npy file to save the RDMs on disk instead of in memory.
+        If out is not None, the RDMs are written into the file during calculating and only the upper triangles
+        (without the diagonal) of the RDMs are saved.
+    condensed : boolean True or False. Default is False.
+        Return the RDM(s) as a CondensedRDM (see neurora.stuff.CondensedRDM) or not.
+        If condensed=True, only the upper triangles (without the diagonal) of the RDMs are saved.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the CondensedRDM or the .npy file. Only works when condensed=True or out is not None.
 
     Returns
     -------
-    RDM : array
+    RDM : array or CondensedRDM
         The fMRI-Searchlight RDM.
         If sub_opt=0, the shape of RDMs is [n_x, n_y, n_z, n_cons, n_cons].
         If sub_opt=1, the shape of RDMs is [n_subs, n_x, n_y, n_cons, n_cons]
         n_subs, n_x, n_y, n_z represent the number of subjects & the number of calculation units for searchlight along
         the x, y, z axis.
+        If searchlight is not None, n_x, n_y, n_z are nx, ny, nz, and the RDMs of the voxels which are not centres of
+        the searchlight are NaN.
+        If out is not None, return the read-only memory-mapped upper triangles of the RDMs in the .npy file. The last
+        two dimensions [n_cons, n_cons] are replaced by [n_cons*(n_cons-1)/2], and the full RDMs can be obtained by
+        neurora.stuff.condensed_to_rdm().
+        If condensed=True, return a CondensedRDM (memory-mapped if out is not None) and the last two dimensions
+        [n_cons, n_cons] are replaced by [n_cons*(n_cons-1)/2].
     """
 
     if len(np.shape(fmri_data)) != 5:
@@ -633,90 +995,147 @@ def fmriRDM(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], sub_opt=1, method="co
 
         return "Invalid input!"
 
+    if (condensed == True or out is not None) and np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
+
+        print("\nThe dtype should be numpy.float32 or numpy.float64.\n")
+
+        return "Invalid input!"
+
     # get the number of conditions, subjects and the size of the fMRI-img
     cons, subs, nx, ny, nz = np.shape(fmri_data)
 
-    # the size of the calculation units for searchlight
-    kx = ksize[0]
-    ky = ksize[1]
-    kz = ksize[2]
+    context = {"method": method, "abs": abs, "searchlight": searchlight is not None}
 
-    # strides for calculating along the x, y, z axis
-    sx = strides[0]
-    sy = strides[1]
-    sz = strides[2]
+    # spherical searchlight
+    if searchlight is not None:
 
-    # calculate the number of the calculation units in the x, y, z directions
-    n_x = int((nx - kx) / sx)+1
-    n_y = int((ny - ky) / sy)+1
-    n_z = int((nz - kz) / sz)+1
+        if tuple(searchlight.size) != (nx, ny, nz):
 
-    # initialize the data for calculating the RDM
-    data = np.full([n_x, n_y, n_z, cons, kx*ky*kz, subs], np.nan)
+            print("\nThe size of the searchlight doesn't match the size of the fMRI-img.\n")
 
-    print("\nComputing RDMs")
+            return "Invalid input!"
 
-    # assignment
-    for x in range(n_x):
-        for y in range(n_y):
-            for z in range(n_z):
-                for i in range(cons):
+        print("\nComputing RDMs")
 
-                    index = 0
+        # mark the voxels including NaN for any subject
+        context["nanvoxels"] = np.isnan(np.reshape(fmri_data, [cons, subs, nx*ny*nz])).any(axis=1)
 
-                    for k1 in range(kx):
-                        for k2 in range(ky):
-                            for k3 in range(kz):
-                                for j in range(subs):
-                                    data[x, y, z, i, index, j] = fmri_data[i, j, x+k1, y+k2, z+k3]
+        groups = list(searchlight.groups())
 
-                                index = index + 1
+        # the slabs: the batches of centres with the same number of neighbours
+        units = [(sub,) + np.unravel_index(searchlight.centers[ids], (nx, ny, nz)) for sub in range(subs)
+                 for ids, voxels in groups]
+        tasks = ((sub, voxels) for sub in range(subs) for ids, voxels in groups)
 
-    # shape of data: [n_x, n_y, n_z, cons, kx*ky*kz, subs]
-    #              ->[subs, n_x, n_y, n_z, cons, kx*ky*kz]
-    data = np.transpose(data, (5, 0, 1, 2, 3, 4))
+        n_x, n_y, n_z = nx, ny, nz
 
-    # flatten the data for different calculating conditions
-    data = np.reshape(data, [subs, n_x, n_y, n_z, cons, kx*ky*kz])
+    else:
 
-    # initialize the RDMs
-    subrdms = np.full([subs, n_x, n_y, n_z, cons, cons], np.nan)
+        # the size of the calculation units for searchlight
+        kx = ksize[0]
+        ky = ksize[1]
+        kz = ksize[2]
 
-    total = subs * n_x * n_y * n_z
+        # strides for calculating along the x, y, z axis
+        sx = strides[0]
+        sy = strides[1]
+        sz = strides[2]
 
-    for sub in range(subs):
+        # calculate the number of the calculation units in the x, y, z directions
+        n_x = int((nx - kx) / sx)+1
+        n_y = int((ny - ky) / sy)+1
+        n_z = int((nz - kz) / sz)+1
+
+        # the calculation units for searchlight (a view, not a copy)
+        # shape of patches: [cons, subs, n_x, n_y, n_z, kx, ky, kz]
+        patches = searchlight_patches(fmri_data, ksize, strides)
+
+        # the calculation units to be calculated
+        if mask is None:
+            centers = np.ones([n_x, n_y, n_z], dtype=bool)
+        else:
+            centers = searchlight_centers(mask, [nx, ny, nz], ksize, strides)
+
+            if isinstance(centers, str):
+
+                return "Invalid input!"
+
+        print("\nComputing RDMs")
+
+        # mark the calculation units including NaN for any subject
+        # shape of nanunits: [n_x, n_y, n_z, cons]
+        nanunits = np.zeros([n_x, n_y, n_z, cons], dtype=bool)
         for x in range(n_x):
-            for y in range(n_y):
-                for z in range(n_z):
-
-                    # show the progressbar
-                    percent = (sub * n_x * n_y * n_z + x * n_y * n_z + y * n_z + z + 1) / total * 100
-                    show_progressbar("Calculating", percent)
-
-                    for i in range(cons):
-                        for j in range(cons):
-
-                            # no NaN
-                            if (np.isnan(data[:, x, y, z, i]).any() == False) and \
-                                    (np.isnan(data[:, x, y, z, j]).any() == False):
-                                if method is 'correlation':
-                                    # calculate the Pearson Coefficient
-                                    r = pearsonr(data[sub, x, y, z, i], data[sub, x, y, z, j])[0]
-                                    # calculate the dissimilarity
-                                    if abs == True:
-                                        subrdms[sub, x, y, z, i, j] = limtozero(1 - np.abs(r))
-                                    else:
-                                        subrdms[sub, x, y, z, i, j] = limtozero(1 - r)
-                                elif method is 'euclidean':
-                                    subrdms[sub, x, y, z, i, j] = np.linalg.norm(data[sub, x, y, z, i] - data[sub, x, y, z, j])
-                                elif method is 'mahalanobis':
-                                    X = np.transpose(np.vstack((data[sub, x, y, z, i], data[sub, x, y, z, j])), (1, 0))
-                                    X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                                    subrdms[sub, x, y, z, i, j] = np.linalg.norm(X[:, 0] - X[:, 1])
-                    if method is 'euclidean' or method is 'mahalanobis':
-                        max = np.max(subrdms[sub, x, y, z])
-                        min = np.min(subrdms[sub, x, y, z])
-                        subrdms[sub, x, y, z] = (subrdms[sub, x, y, z] - min) / (max - min)
+            ys, zs = np.nonzero(centers[x])
+            nanunits[x, ys, zs] = np.isnan(patches[:, :, x, ys, zs]).any(axis=(1, 3, 4, 5)).T
+
+        context.update({"ksize": ksize, "strides": strides, "centers": centers, "nanunits": nanunits})
+
+        # the slabs: the calculation units along the y & z axis at each x
+        units = [(sub, x) + np.nonzero(centers[x]) for sub in range(subs) for x in range(n_x) if centers[x].any()]
+        tasks = ((sub, x) for sub in range(subs) for x in range(n_x) if centers[x].any())
+
+    # the indices of the upper triangle of an RDM
+    iu = np.triu_indices(cons, 1)
+
+    # initialize the RDMs
+    if out is None and condensed == False:
+        subrdms = np.full([subs, n_x, n_y, n_z, cons, cons], np.nan)
+    elif out is None:
+        # only save the upper triangles of the RDMs
+        subrdms = np.full([subs, n_x, n_y, n_z, len(iu[0])], np.nan, dtype=dtype)
+    else:
+        # only save the upper triangles in a memory-mapped .npy file
+        if sub_opt == 1:
+            shape = (subs, n_x, n_y, n_z, len(iu[0]))
+        else:
+            shape = (n_x, n_y, n_z, len(iu[0]))
+        subrdms = np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=shape)
+        for i in range(shape[0]):
+            subrdms[i] = np.nan
+
+    shm = None
+
+    if n_jobs == 1:
+        results = (fmriRDM_slab(fmri_data, task, context) for task in tasks)
+    else:
+        # share the fMRI data with the worker processes instead of pickling it
+        shm, shared = to_shared_memory(fmri_data)
+        results = pool_imap(fmriRDM_worker, tasks, n_jobs, fmriRDM_init, (shm.name, shared.shape, shared.dtype,
+                                                                          context))
+
+    try:
+        for k, rdms in enumerate(results):
+
+            # show the progressbar
+            percent = (k + 1) / len(units) * 100
+            show_progressbar("Calculating", percent)
+
+            if out is None and condensed == False:
+                subrdms[units[k]] = rdms
+            elif out is None or sub_opt == 1:
+                subrdms[units[k]] = rdms[:, iu[0], iu[1]]
+            elif units[k][0] == 0:
+                subrdms[units[k][1:]] = rdms[:, iu[0], iu[1]] / subs
+            else:
+                # accumulate the average over subjects
+                subrdms[units[k][1:]] += rdms[:, iu[0], iu[1]] / subs
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    if out is not None:
+
+        subrdms.flush()
+        del subrdms
+
+        print("\nRDMs computing finished!")
+
+        if condensed == True:
+            return CondensedRDM(np.load(out, mmap_mode="r"), dtype=dtype)
+
+        return np.load(out, mmap_mode="r")
 
     # average the RDMs
     rdms = np.average(subrdms, axis=0)
@@ -725,16 +1144,22 @@ def fmriRDM(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], sub_opt=1, method="co
 
     if sub_opt == 0:
 
+        if condensed == True:
+            return CondensedRDM(rdms, dtype=dtype)
+
         return rdms
 
     if sub_opt == 1:
 
+        if condensed == True:
+            return CondensedRDM(subrdms, dtype=dtype)
+
         return subrdms
 
 
 ' a function for calculating the RDM based on fMRI data of an ROI '
 
-def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False):
+def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False, condensed=False, dtype=np.float64):
 
     """
     Calculate the Representational Dissimilarity Matrix - RDM(s) based on fMRI data (for ROI)
@@ -757,15 +1182,23 @@ def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False
         If method='correlation', the dissimilarity is calculated by Pearson Correlation.
         If method='euclidean', the dissimilarity is calculated by Euclidean Distance, the results will be normalized.
         If method='mahalanobis', the dissimilarity is calculated by Mahalanobis Distance, the results will be normalized.
+            The noise covariance is estimated from the condition patterns with the Ledoit-Wolf shrinkage.
     abs : boolean True or False. Default is True.
         Calculate the absolute value of Pearson r or not.
+    condensed : boolean True or False. Default is False.
+        Return the RDM(s) as a CondensedRDM (see neurora.stuff.CondensedRDM) or not.
+        If condensed=True, only the upper triangles (without the diagonal) of the RDMs are saved.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the CondensedRDM. Only works when condensed=True.
 
     Returns
     -------
-    RDM : array
+    RDM : array or CondensedRDM
         The fMRI-ROI RDM.
         If sub_opt=0, the shape of RDM is [n_cons, n_cons].
         If sub_opt=1, the shape of RDM is [n_subs, n_cons, n_cons].
+        If condensed=True, return a CondensedRDM and the last two dimensions [n_cons, n_cons] are replaced by
+        [n_cons*(n_cons-1)/2].
 
     Notes
     -----
@@ -779,6 +1212,12 @@ def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False
 
         return "Invalid input!"
 
+    if condensed == True and np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
+
+        print("\nThe dtype should be numpy.float32 or numpy.float64.\n")
+
+        return "Invalid input!"
+
     # get the number of conditions, subjects, the size of the fMRI-img
     ncons, nsubs, nx, ny, nz = fmri_data.shape
 
@@ -795,7 +1234,7 @@ def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False
                     n = n + 1
 
     # initialize the data for calculating the RDM
-    data = np.zeros([ncons, nsubs, n], dtype=np.float)
+    data = np.zeros([ncons, nsubs, n], dtype=np.float64)
 
     print("\nComputing RDMs")
 
@@ -815,36 +1254,15 @@ def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False
                             data[p, q, n] = fmri_data[p, q, i, j, k]
                             n = n + 1
 
-    # initialize the RDMs
-    subrdms = np.zeros([nsubs, ncons, ncons], dtype=np.float)
-
     # shape of data: [ncons, nsubs, n] -> [nsubs, ncons, n]
     data = np.transpose(data, (1, 0, 2))
 
-    # calculate the values in RDM
-    for sub in range(nsubs):
-        for i in range(ncons):
-            for j in range(ncons):
-
-                if (np.isnan(data[:, i]).any() == False) and (np.isnan(data[:, j]).any() == False):
-                    if method is 'correlation':
-                        # calculate the Pearson Coefficient
-                        r = pearsonr(data[sub, i], data[sub, j])[0]
-                        # calculate the dissimilarity
-                        if abs == True:
-                            subrdms[sub, i, j] = limtozero(1 - np.abs(r))
-                        else:
-                            subrdms[sub, i, j] = limtozero(1 - r)
-                    elif method is 'euclidean':
-                        subrdms[sub, i, j] = np.linalg.norm(data[sub, i] - data[sub, j])
-                    elif method is 'mahalanobis':
-                        X = np.transpose(np.vstack((data[sub, i], data[sub, j])), (1, 0))
-                        X = np.dot(X, np.linalg.inv(np.cov(X, rowvar=False)))
-                        subrdms[sub, i, j] = np.linalg.norm(X[:, 0] - X[:, 1])
-        if method is 'euclidean' or method is 'mahalanobis':
-            max = np.max(subrdms[sub])
-            min = np.min(subrdms[sub])
-            subrdms[sub] = (subrdms[sub] - min) / (max - min)
+    # calculate the RDMs of all the subjects at once
+    subrdms = batchRDM(data, method=method, abs=abs)
+
+    if isinstance(subrdms, str):
+
+        return "Invalid input!"
 
     # average the RDMs
     rdm = np.average(subrdms, axis=0)
@@ -853,10 +1271,16 @@ def fmriRDM_roi(fmri_data, mask_data, sub_opt=1, method="correlation", abs=False
 
         print("\nRDM computing finished!")
 
+        if condensed == True:
+            return CondensedRDM.from_rdm(rdm, dtype=dtype)
+
         return rdm
 
     if sub_opt == 1:
 
         print("\nRDMs computing finished!")
 
+        if condensed == True:
+            return CondensedRDM.from_rdm(subrdms, dtype=dtype)
+
         return subrdms
\ No newline at end of file
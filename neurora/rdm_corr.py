@@ -8,25 +8,28 @@ import numpy as np
 from scipy.stats import spearmanr
 from scipy.stats import pearsonr
 from scipy.stats import kendalltau
-from neurora.stuff import permutation_corr
+from scipy.stats import rankdata
+from scipy.stats import t as tdist
+from neurora.stuff import permutation_corr, permutation_corr_batch, mantel_indices, kendall_tau_batch, rdm_vector, \
+    CondensedRDM
 
 
 ' a function for calculating the Spearman correlation coefficient between two RDMs '
 
-def rdm_correlation_spearman(RDM1, RDM2, rescale=False, permutation=False, iter=1000):
+def rdm_correlation_spearman(RDM1, RDM2, rescale=False, permutation=False, iter=1000, seed=None, mantel=False):
 
     """
     Calculate the Spearman Correlation between two RDMs
 
     Parameters
     ----------
-    RDM1 : array [ncons, ncons]
+    RDM1 : array [ncons, ncons] or CondensedRDM
         The RDM 1.
-        The shape of RDM1 must be [n_cons, n_cons].
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
-    RDM2 : array [ncons, ncons].
+    RDM2 : array [ncons, ncons] or CondensedRDM.
         The RDM 2.
-        The shape of RDM2 must be [n_cons, n_cons].
+        The shape of RDM2 must be [n_cons, n_cons], or RDM2 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
     rescale : bool True or False. Default is False.
         Rescale the values in RDM or not.
@@ -35,6 +38,12 @@ def rdm_correlation_spearman(RDM1, RDM2, rescale=False, permutation=False, iter=
         Conduct permutation test or not.
     iter : int. Default is 1000.
         The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutation test.
+    mantel : bool True or False. Default is False.
+        Permute the condition labels (the rows & columns together) of the RDM or not (Mantel test). Only works when
+        permutation=True.
+        If mantel=False, the values above the diagonal are permuted independently.
 
     Returns
     -------
@@ -43,101 +52,143 @@ def rdm_correlation_spearman(RDM1, RDM2, rescale=False, permutation=False, iter=
         The shape of corr is [2], including a r-value and a p-value.
     """
 
-    if len(np.shape(RDM1)) != 2 or len(np.shape(RDM2)) != 2 or np.shape(RDM1)[0] != np.shape(RDM1)[1] or \
-            np.shape(RDM2)[0] != np.shape(RDM2)[1]:
+    # get the values above the diagonal of two RDMs
+    v1 = rdm_vector(RDM1, rescale)
+    v2 = rdm_vector(RDM2, rescale)
+
+    if isinstance(v1, str) or isinstance(v2, str) or len(v1) != len(v2):
 
         print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
 
         return "Invalid input!"
 
-    # get number of conditions
-    cons = np.shape(RDM1)[0]
+    # calculate the Spearman Correlation
+    rp = np.array(spearmanr(v1, v2))
 
-    # calculate the number of value above the diagonal in RDM
-    n = int(cons*(cons-1)/2)
+    if permutation == True and mantel == True:
 
-    if rescale == True:
+        # permute the condition labels of the RDM 1
+        cons = int(round((1 + np.sqrt(1 + 8 * len(v1))) / 2))
+        rp[1] = permutation_corr_batch(v1, v2, method="spearman", perms=mantel_indices(cons, iter=iter, seed=seed))
 
-        # flatten the RDM1
-        vrdm = np.reshape(RDM1, [cons*cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
+    elif permutation == True:
 
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
+        rp[1] = permutation_corr(v1, v2, method="spearman", iter=iter, seed=seed)
 
-        # rescale
-        if maxvalue != minvalue:
+    return rp
 
-            for i in range(cons):
-                for j in range(cons):
 
-                    # not on the diagnal
-                    if i != j:
-                        RDM1[i, j] = float((RDM1[i, j] - minvalue) / (maxvalue - minvalue))
+' a function for calculating the Spearman correlation coefficients between an RDM and a batch of RDMs '
 
-        # flatten the RDM2
-        vrdm = np.reshape(RDM2, [cons * cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
+def rdm_correlation_spearman_batch(RDM1, RDMs2):
 
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
+    """
+    Calculate the Spearman Correlations between an RDM and a batch of RDMs
 
-        # rescale
-        if maxvalue != minvalue:
+    Parameters
+    ----------
+    RDM1 : array [ncons, ncons] or CondensedRDM
+        The RDM 1.
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
+        n_cons represent the number of conidtions.
+    RDMs2 : array or CondensedRDM
+        The RDMs 2.
+        The shape of RDMs2 must be [..., n_cons, n_cons] with any number of leading dimensions, or RDMs2 is a
+        CondensedRDM.
 
-            for i in range(cons):
-                for j in range(cons):
+    Returns
+    -------
+    corrs : array [..., 2].
+        The Spearman Correlation results.
+        The shape of corrs is the leading dimensions of RDMs2 plus [2], including a r-value and a p-value for each RDM.
+        The results are the same as rdm_correlation_spearman(RDM1, RDM2) for each RDM2 in RDMs2.
+
+    Notes
+    -----
+    The RDM 1 is ranked only once and all the correlations are obtained by one matrix-vector product of the ranks.
+    Rescaling doesn't change the ranks, so there is no rescale option here.
+    """
 
-                    # not on the diagnal
-                    if i != j:
-                        RDM2[i, j] = float((RDM2[i, j] - minvalue) / (maxvalue - minvalue))
+    # get the values above the diagonal of the RDM 1
+    v1 = rdm_vector(RDM1)
 
-    # initialize two vectors to store the values above the diagnal of two RDMs
-    v1 = np.zeros([n], dtype=np.float64)
-    v2 = np.zeros([n], dtype=np.float64)
+    if isinstance(v1, str):
 
-    # assignment
-    nn = 0
-    for i in range(cons-1):
-        for j in range(cons-1-i):
-            v1[nn] = RDM1[i, i+j+1]
-            v2[nn] = RDM2[i, i+j+1]
-            nn = nn + 1
+        print("\nThe shape of RDM1 should be [ncons, ncons]!\n")
 
-    # calculate the Spearman Correlation
-    rp = np.array(spearmanr(v1, v2))
+        return "Invalid input!"
 
-    if permutation == True:
+    npairs = len(v1)
 
-        rp[1] = permutation_corr(v1, v2, method="spearman", iter=iter)
+    # get the values above the diagonal of the RDMs 2
+    # shape of v2: [n, npairs]
+    if isinstance(RDMs2, CondensedRDM):
 
-    return rp
+        shape = RDMs2.shape
+        v2 = np.reshape(RDMs2.vectors, [-1, RDMs2.vectors.shape[-1]])
+
+    else:
+
+        if len(np.shape(RDMs2)) < 2 or np.shape(RDMs2)[-1] != np.shape(RDMs2)[-2]:
+
+            print("\nThe shape of RDMs2 should be [..., ncons, ncons]!\n")
+
+            return "Invalid input!"
+
+        shape = np.shape(RDMs2)[:-2]
+        iu = np.triu_indices(np.shape(RDMs2)[-1], 1)
+        v2 = np.reshape(np.asarray(RDMs2)[..., iu[0], iu[1]], [-1, len(iu[0])])
+
+    if np.shape(v2)[1] != npairs:
+
+        print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
+
+        return "Invalid input!"
+
+    # rank the RDM 1 once and the RDMs 2 along the values
+    r1 = rankdata(v1)
+    r2 = rankdata(v2, axis=1)
+
+    # the RDMs including NaN get NaN
+    r2[np.isnan(v2).any(axis=1)] = np.nan
+
+    # standardize the ranks
+    r1 = r1 - np.average(r1)
+    r1 = r1 / np.linalg.norm(r1)
+    r2 = r2 - np.average(r2, axis=1)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        # calculate all the Spearman Correlations at once
+        r = np.dot(r2, r1) / np.linalg.norm(r2, axis=1)
+        r = np.clip(r, -1, 1)
+
+        # two-sided p-values by the t-distribution (the same as scipy.stats.spearmanr)
+        dof = npairs - 2
+        t = r * np.sqrt(dof / ((1 - r) * (1 + r)))
+        p = 2 * tdist.sf(np.abs(t), dof)
+
+    corrs = np.stack((r, p), axis=-1)
+
+    return np.reshape(corrs, tuple(shape) + (2,))
 
 
 ' a function for calculating the Pearson correlation coefficient between two RDMs '
 
-def rdm_correlation_pearson(RDM1, RDM2, rescale=False, permutation=False, iter=1000):
+def rdm_correlation_pearson(RDM1, RDM2, rescale=False, permutation=False, iter=1000, seed=None, mantel=False):
 
     """
     Calculate the Pearson Correlation between two RDMs
 
     Parameters
     ----------
-    RDM1 : array [ncons, ncons]
+    RDM1 : array [ncons, ncons] or CondensedRDM
         The RDM 1.
-        The shape of RDM1 must be [n_cons, n_cons].
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
-    RDM2 : array [ncons, ncons].
+    RDM2 : array [ncons, ncons] or CondensedRDM.
         The RDM 2.
-        The shape of RDM2 must be [n_cons, n_cons].
+        The shape of RDM2 must be [n_cons, n_cons], or RDM2 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
     rescale : bool True or False. Default is False.
         Rescale the values in RDM or not.
@@ -146,6 +197,12 @@ def rdm_correlation_pearson(RDM1, RDM2, rescale=False, permutation=False, iter=1
         Conduct permutation test or not.
     iter : int. Default is 1000.
         The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutation test.
+    mantel : bool True or False. Default is False.
+        Permute the condition labels (the rows & columns together) of the RDM or not (Mantel test). Only works when
+        permutation=True.
+        If mantel=False, the values above the diagonal are permuted independently.
 
     Returns
     -------
@@ -154,100 +211,49 @@ def rdm_correlation_pearson(RDM1, RDM2, rescale=False, permutation=False, iter=1
         The shape of corr is [2], including a r-value and a p-value.
     """
 
-    if len(np.shape(RDM1)) != 2 or len(np.shape(RDM2)) != 2 or np.shape(RDM1)[0] != np.shape(RDM1)[1] or \
-            np.shape(RDM2)[0] != np.shape(RDM2)[1]:
+    # get the values above the diagonal of two RDMs
+    v1 = rdm_vector(RDM1, rescale)
+    v2 = rdm_vector(RDM2, rescale)
+
+    if isinstance(v1, str) or isinstance(v2, str) or len(v1) != len(v2):
 
         print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
 
         return "Invalid input!"
 
-    # get number of conditions
-    cons = np.shape(RDM1)[0]
-
-    # calculate the number of value above the diagonal in RDM
-    n = int(cons*(cons-1)/2)
-
-    if rescale == True:
-
-        # flatten the RDM1
-        vrdm = np.reshape(RDM1, [cons*cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM1[i, j] = float((RDM1[i, j] - minvalue) / (maxvalue - minvalue))
-
-        # flatten the RDM2
-        vrdm = np.reshape(RDM2, [cons * cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM2[i, j] = float((RDM2[i, j] - minvalue) / (maxvalue - minvalue))
-
-    # initialize two vectors to store the values above the diagnal of two RDMs
-    v1 = np.zeros([n], dtype=np.float64)
-    v2 = np.zeros([n], dtype=np.float64)
-
-    # assignment
-    nn = 0
-    for i in range(cons - 1):
-        for j in range(cons - 1 - i):
-            v1[nn] = RDM1[i, i + j + 1]
-            v2[nn] = RDM2[i, i + j + 1]
-            nn = nn + 1
-
     # calculate the Spearman Correlation
     rp = np.array(pearsonr(v1, v2))
 
-    if permutation == True:
+    if permutation == True and mantel == True:
 
-        rp[1] = permutation_corr(v1, v2, method="pearson", iter=iter)
+        # permute the condition labels of the RDM 1
+        cons = int(round((1 + np.sqrt(1 + 8 * len(v1))) / 2))
+        rp[1] = permutation_corr_batch(v1, v2, method="pearson", perms=mantel_indices(cons, iter=iter, seed=seed))
+
+    elif permutation == True:
+
+        rp[1] = permutation_corr(v1, v2, method="pearson", iter=iter, seed=seed)
 
     return rp
 
 
 ' a function for calculating the Kendalls tau correlation coefficient between two RDMs '
 
-def rdm_correlation_kendall(RDM1, RDM2, rescale=False, permutation=False, iter=1000):
+def rdm_correlation_kendall(RDM1, RDM2, rescale=False, permutation=False, iter=1000, seed=None, mantel=False,
+                            variant="b"):
 
     """
     Calculate the Kendalls tau Correlation between two RDMs
 
     Parameters
     ----------
-    RDM1 : array [ncons, ncons]
+    RDM1 : array [ncons, ncons] or CondensedRDM
         The RDM 1.
-        The shape of RDM1 must be [n_cons, n_cons].
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
-    RDM2 : array [ncons, ncons].
+    RDM2 : array [ncons, ncons] or CondensedRDM.
         The RDM 2.
-        The shape of RDM2 must be [n_cons, n_cons].
+        The shape of RDM2 must be [n_cons, n_cons], or RDM2 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
     rescale : bool True or False. Default is False.
         Rescale the values in RDM or not.
@@ -256,89 +262,62 @@ def rdm_correlation_kendall(RDM1, RDM2, rescale=False, permutation=False, iter=1
         Conduct permutation test or not.
     iter : int. Default is 5000.
         The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutation test.
+    mantel : bool True or False. Default is False.
+        Permute the condition labels (the rows & columns together) of the RDM or not (Mantel test). Only works when
+        permutation=True.
+        If mantel=False, the values above the diagonal are permuted independently.
+    variant : string 'a' or 'b'. Default is 'b'.
+        The variant of Kendalls tau.
+        If variant='b', calculate tau-b, which adjusts for ties.
+        If variant='a', calculate tau-a, which is recommended for comparing with a model RDM including ties in RSA.
+        The p-values of tau-a and tau-b are the same.
 
     Returns
     -------
     corr : array [r, p].
         The Kendalls tau Correlation result.
         The shape of corr is [2], including a r-value and a p-value.
+
+    Notes
+    -----
+    The permutation test sorts the RDM 1 only once and counts the discordant pairs of all the permutations by merge
+    sort (see neurora.stuff.kendall_tau_batch).
     """
 
-    if len(np.shape(RDM1)) != 2 or len(np.shape(RDM2)) != 2 or np.shape(RDM1)[0] != np.shape(RDM1)[1] or \
-            np.shape(RDM2)[0] != np.shape(RDM2)[1]:
+    # get the values above the diagonal of two RDMs
+    v1 = rdm_vector(RDM1, rescale)
+    v2 = rdm_vector(RDM2, rescale)
+
+    if isinstance(v1, str) or isinstance(v2, str) or len(v1) != len(v2):
 
         print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
 
         return "Invalid input!"
 
-    # get number of conditions
-    cons = np.shape(RDM1)[0]
-
-    # calculate the number of value above the diagonal in RDM
-    n = int(cons*(cons-1)/2)
-
-    if rescale == True:
-
-        # flatten the RDM1
-        vrdm = np.reshape(RDM1, [cons*cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM1[i, j] = float((RDM1[i, j] - minvalue) / (maxvalue - minvalue))
-
-        # flatten the RDM2
-        vrdm = np.reshape(RDM2, [cons * cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
+    if variant != "a" and variant != "b":
 
-        # rescale
-        if maxvalue != minvalue:
+        print("\nThe variant should be 'a' or 'b'!\n")
 
-            for i in range(cons):
-                for j in range(cons):
+        return "Invalid input!"
 
-                    # not on the diagnal
-                    if i != j:
-                        RDM2[i, j] = float((RDM2[i, j] - minvalue) / (maxvalue - minvalue))
+    # calculate the Kendalltau Correlation
+    rp = np.array(kendalltau(v1, v2))
 
-    # initialize two vectors to store the values above the diagnal of two RDMs
-    v1 = np.zeros([n], dtype=np.float64)
-    v2 = np.zeros([n], dtype=np.float64)
+    # the p-value only depends on the difference between the concordant & discordant pairs
+    if variant == "a":
+        rp[0] = kendall_tau_batch(v1, v2, variant="a")
 
-    # assignment
-    nn = 0
-    for i in range(cons - 1):
-        for j in range(cons - 1 - i):
-            v1[nn] = RDM1[i, i + j + 1]
-            v2[nn] = RDM2[i, i + j + 1]
-            nn = nn + 1
+    if permutation == True and mantel == True:
 
-    # calculate the Kendalltau Correlation
-    rp = np.array(kendalltau(v1, v2))
+        # permute the condition labels of the RDM 1
+        cons = int(round((1 + np.sqrt(1 + 8 * len(v1))) / 2))
+        rp[1] = permutation_corr_batch(v1, v2, method="kendalltau", perms=mantel_indices(cons, iter=iter, seed=seed))
 
-    if permutation == True:
+    elif permutation == True:
 
-        rp[1] = permutation_corr(v1, v2, method="kendalltau", iter=iter)
+        rp[1] = permutation_corr(v1, v2, method="kendalltau", iter=iter, seed=seed)
 
     return rp
 
@@ -352,13 +331,13 @@ def rdm_similarity(RDM1, RDM2, rescale=False):
 
     Parameters
     ----------
-    RDM1 : array [ncons, ncons]
+    RDM1 : array [ncons, ncons] or CondensedRDM
         The RDM 1.
-        The shape of RDM1 must be [n_cons, n_cons].
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
-    RDM2 : array [ncons, ncons].
+    RDM2 : array [ncons, ncons] or CondensedRDM.
         The RDM 2.
-        The shape of RDM2 must be [n_cons, n_cons].
+        The shape of RDM2 must be [n_cons, n_cons], or RDM2 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
     rescale : bool True or False. Default is False.
         Rescale the values in RDM or not.
@@ -371,80 +350,19 @@ def rdm_similarity(RDM1, RDM2, rescale=False):
         The shape of corr is [2], corr[0] is the Cosine Similarity result and corr[1] is 0.
     """
 
-    if len(np.shape(RDM1)) != 2 or len(np.shape(RDM2)) != 2 or np.shape(RDM1)[0] != np.shape(RDM1)[1] or \
-            np.shape(RDM2)[0] != np.shape(RDM2)[1]:
+    # get the values above the diagonal of two RDMs
+    v1 = rdm_vector(RDM1, rescale)
+    v2 = rdm_vector(RDM2, rescale)
+
+    if isinstance(v1, str) or isinstance(v2, str) or len(v1) != len(v2):
 
         print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
 
         return "Invalid input!"
 
-    # get number of conditions
-    cons = np.shape(RDM1)[0]
-
-    # calculate the number of value above the diagonal in RDM
-    n = int(cons*(cons-1)/2)
-
-    if rescale == True:
-
-        # flatten the RDM1
-        vrdm = np.reshape(RDM1, [cons*cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM1[i, j] = float((RDM1[i, j] - minvalue) / (maxvalue - minvalue))
-
-        # flatten the RDM2
-        vrdm = np.reshape(RDM2, [cons * cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM2[i, j] = float((RDM2[i, j] - minvalue) / (maxvalue - minvalue))
-
-    # initialize two vectors to store the values above the diagnal of two RDMs
-    v1 = np.zeros([n], dtype=np.float64)
-    v2 = np.zeros([n], dtype=np.float64)
-
-    # assignment
-    nn = 0
-    for i in range(cons - 1):
-        for j in range(cons - 1 - i):
-            v1[nn] = RDM1[i, i + j + 1]
-            v2[nn] = RDM2[i, i + j + 1]
-            nn = nn + 1
-
     # calculate the Cosine Similarity
-    V1 = np.mat(v1)
-    V2 = np.mat(v2)
-    num = float(V1 * V2.T)
-    denom = np.linalg.norm(V1) * np.linalg.norm(V2)
+    num = np.dot(v1, v2)
+    denom = np.linalg.norm(v1) * np.linalg.norm(v2)
     cos = num / denom
     similarity = 0.5 + 0.5 * cos
 
@@ -460,13 +378,13 @@ def rdm_distance(RDM1, RDM2, rescale=False):
 
     Parameters
     ----------
-    RDM1 : array [ncons, ncons]
+    RDM1 : array [ncons, ncons] or CondensedRDM
         The RDM 1.
-        The shape of RDM1 must be [n_cons, n_cons].
+        The shape of RDM1 must be [n_cons, n_cons], or RDM1 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
-    RDM2 : array [ncons, ncons].
+    RDM2 : array [ncons, ncons] or CondensedRDM.
         The RDM 2.
-        The shape of RDM2 must be [n_cons, n_cons].
+        The shape of RDM2 must be [n_cons, n_cons], or RDM2 is a CondensedRDM of one RDM.
         n_cons represent the number of conidtions.
     rescale : bool True or False. Default is False.
         Rescale the values in RDM or not.
@@ -479,71 +397,15 @@ def rdm_distance(RDM1, RDM2, rescale=False):
         The shape of corr is [2], corr[0] is the Euclidean Distance result and corr[1] is 0.
     """
 
-    if len(np.shape(RDM1)) != 2 or len(np.shape(RDM2)) != 2 or np.shape(RDM1)[0] != np.shape(RDM1)[1] or np.shape(RDM2)[0] != np.shape(RDM2)[1]:
-
-        return "Invalid input!"
-
-    # get number of conditions
-    cons = np.shape(RDM1)[0]
-
-    # calculate the number of value above the diagonal in RDM
-    n = int(cons*(cons-1)/2)
+    # get the values above the diagonal of two RDMs
+    v1 = rdm_vector(RDM1, rescale)
+    v2 = rdm_vector(RDM2, rescale)
 
-    if rescale == True:
+    if isinstance(v1, str) or isinstance(v2, str) or len(v1) != len(v2):
 
-        # flatten the RDM1
-        vrdm = np.reshape(RDM1, [cons*cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM1[i, j] = float((RDM1[i, j] - minvalue) / (maxvalue - minvalue))
-
-        # flatten the RDM2
-        vrdm = np.reshape(RDM2, [cons * cons])
-        # array -> set -> list
-        svrdm = set(vrdm)
-        lvrdm = list(svrdm)
-        lvrdm.sort()
-
-        # get max & min
-        maxvalue = lvrdm[-1]
-        minvalue = lvrdm[1]
-
-        # rescale
-        if maxvalue != minvalue:
-
-            for i in range(cons):
-                for j in range(cons):
-
-                    # not on the diagnal
-                    if i != j:
-                        RDM2[i, j] = float((RDM2[i, j] - minvalue) / (maxvalue - minvalue))
-
-    # initialize two vectors to store the values above the diagnal of two RDMs
-    v1 = np.zeros([n], dtype=np.float64)
-    v2 = np.zeros([n], dtype=np.float64)
+        print("\nThe shapes of two RDMs should be [ncons, ncons]!\n")
 
-    # assignment
-    nn = 0
-    for i in range(cons - 1):
-        for j in range(cons - 1 - i):
-            v1[nn] = RDM1[i, i + j + 1]
-            v2[nn] = RDM2[i, i + j + 1]
-            nn = nn + 1
+        return "Invalid input!"
 
     # calculate the Euclidean Distance
     dist = np.linalg.norm(v1 - v2)
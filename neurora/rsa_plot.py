@@ -13,7 +13,8 @@ from nilearn import plotting, datasets, surface
 import nibabel as nib
 from neurora.stuff import get_affine, get_bg_ch2, get_bg_ch2bet, correct_by_threshold, \
     clusterbased_permutation_1d_1samp_1sided, clusterbased_permutation_2d_1samp_1sided, \
-    clusterbased_permutation_1d_1samp_2sided, clusterbased_permutation_2d_2sided
+    clusterbased_permutation_1d_1samp_2sided, clusterbased_permutation_2d_2sided, CondensedRDM, \
+    tfce_permutation_signflip
 from decimal import Decimal
 
 
@@ -26,8 +27,9 @@ def plot_rdm(rdm, percentile=False, rescale=False, lim=[0, 1], conditions=None,
 
     Parameters
     ----------
-    rdm : array or list [n_cons, n_cons]
+    rdm : array or list [n_cons, n_cons] or CondensedRDM
         A representational dissimilarity matrix.
+        If rdm is a CondensedRDM, its conditions will be used as the labels when conditions=None.
     percentile : bool True or False. Default is False.
         Rescale the values in RDM or not by displaying the percentile.
     rescale : bool True or False. Default is False.
@@ -46,6 +48,17 @@ def plot_rdm(rdm, percentile=False, rescale=False, lim=[0, 1], conditions=None,
         If cmap=None, the ccolormap will be 'jet'.
     """
 
+    if isinstance(rdm, CondensedRDM):
+
+        if len(rdm.shape) != 0:
+
+            return "Invalid input!"
+
+        if conditions is None:
+            conditions = rdm.conditions
+
+        rdm = rdm.to_rdm()
+
     if len(np.shape(rdm)) != 2 or np.shape(rdm)[0] != np.shape(rdm)[1]:
 
         return "Invalid input!"
@@ -66,7 +79,7 @@ def plot_rdm(rdm, percentile=False, rescale=False, lim=[0, 1], conditions=None,
 
     if percentile == True:
 
-        v = np.zeros([cons * cons, 2], dtype=np.float)
+        v = np.zeros([cons * cons, 2], dtype=np.float64)
         for i in range(cons):
             for j in range(cons):
                 v[i * cons + j, 0] = rdm[i, j]
@@ -503,8 +516,10 @@ def plot_tbyt_decoding_acc(acc, start_time=0, end_time=1, time_interval=0.01, ch
         The chance level.
     p : float. Default is 0.05.
         The threshold of p-values.
-    cbpt : bool True or False. Default is True.
+    cbpt : bool True or False or string 'tfce'. Default is True.
         Conduct cluster-based permutation test or not.
+        If cbpt='tfce', the threshold-free cluster enhancement (TFCE) with a sign-flip permutation test is used instead
+        and the time-points with FWE-corrected p-values lower than p are significant.
     stats_time : array or list [stats_time1, stats_time2]. Default os [0, 1].
         Time period for statistical analysis.
     color : matplotlib color or None. Default is 'r'.
@@ -553,7 +568,13 @@ def plot_tbyt_decoding_acc(acc, start_time=0, end_time=1, time_interval=0.01, ch
     for t in range(nts):
         err[t] = np.std(acc[:, t], ddof=1) / np.sqrt(nsubs)
 
-    if cbpt == True:
+    if cbpt == "tfce":
+
+        ps_stats = tfce_permutation_signflip(acc[:, stats_time1:stats_time2] - chance, iter=1000)[1]
+        ps = np.zeros([nts])
+        ps[stats_time1:stats_time2] = ps_stats < p
+
+    elif cbpt == True:
 
         ps_stats = clusterbased_permutation_1d_1samp_1sided(acc[:, stats_time1:stats_time2], level=chance,
                                                             p_threshold=p, iter=1000)
@@ -786,8 +807,10 @@ def plot_ct_decoding_acc(acc, start_timex=0, end_timex=1, start_timey=0, end_tim
         The chance level.
     p : float. Default is 0.05.
         The threshold of p-values.
-    cbpt : bool True or False. Default is True.
+    cbpt : bool True or False or string 'tfce'. Default is True.
         Conduct cluster-based permutation test or not.
+        If cbpt='tfce', the threshold-free cluster enhancement (TFCE) with a sign-flip permutation test is used instead
+        and the points with FWE-corrected p-values lower than p are significant.
     stats_timex : array or list [stats_timex1, stats_timex2]. Default os [0, 1].
         Trainning time period for statistical analysis.
     stats_timey : array or list [stats_timey1, stats_timey2]. Default os [0, 1].
@@ -840,7 +863,14 @@ def plot_ct_decoding_acc(acc, start_timex=0, end_timex=1, start_timey=0, end_tim
     else:
         stats_timey2 = int((stats_timey[1] - start_timey) / tstepy) + 1
 
-    if cbpt is True:
+    if cbpt == "tfce":
+
+        ps_stats = tfce_permutation_signflip(acc[:, stats_timex1:stats_timex2, stats_timey1:stats_timey2] - chance,
+                                             iter=1000)[1]
+        ps = np.zeros([nx, ny])
+        ps[stats_timex1:stats_timex2, stats_timey1:stats_timey2] = ps_stats < p
+
+    elif cbpt is True:
 
         ps_stats = clusterbased_permutation_2d_1samp_1sided(
             acc[:, stats_timex1:stats_timex2, stats_timey1:stats_timey2], level=chance, p_threshold=p, iter=1000)
@@ -5,8 +5,154 @@
 __author__ = 'Zitong Lu'
 
 import numpy as np
-from scipy.stats import ttest_1samp, ttest_rel, ttest_ind
-from neurora.stuff import permutation_test
+from scipy.special import stdtr
+from neurora.stuff import permutation_indices, ttest_sums, permutation_signflip
+
+
+' a function for conducting the t tests of all the calculation units at once '
+
+def stats_ttest(rs1, rs2=None, method="1samp", alternative="greater"):
+
+    """
+    Conduct the t tests of all the calculation units at once (NaNs are skipped)
+
+    Parameters
+    ----------
+    rs1 : array
+        The values of group 1 (or condition 1). The shape of rs1 must be [n_subs, n_units].
+    rs2 : array. Default is None.
+        The values of group 2 (or condition 2). The shape of rs2 must be [n_subs2, n_units].
+    method : string '1samp' or 'rel' or 'ind'. Default is '1samp'.
+        If method='1samp', conduct the one-sample t tests of rs1 against 0. If method='rel', conduct the paired t tests
+        of rs1 & rs2. If method='ind', conduct the independent t tests of rs1 & rs2.
+    alternative : string 'greater' or 'two-sided'. Default is 'greater'.
+        The alternative hypothesis.
+
+    Returns
+    -------
+    stats : array
+        The statistical results. The shape of stats is [n_units, 2]. 2 represents a t-value and a p-value.
+
+    Notes
+    -----
+    The results are the same as ttest_1samp(), ttest_rel() & ttest_ind() along the first axis, but the NaNs are
+    skipped for each unit and the units with less than 2 values get NaNs.
+    """
+
+    rs1 = np.asarray(rs1, dtype=np.float64)
+
+    if method == "rel":
+        rs1 = rs1 - rs2
+
+    masks = ~np.isnan(rs1)
+    values = np.where(masks, rs1, 0)
+
+    if method == "ind":
+
+        rs2 = np.asarray(rs2, dtype=np.float64)
+        masks2 = ~np.isnan(rs2)
+        values2 = np.where(masks2, rs2, 0)
+        t, df = ttest_sums(np.sum(values, axis=0), np.sum(values**2, axis=0), np.sum(masks, axis=0),
+                              np.sum(values2, axis=0), np.sum(values2**2, axis=0), np.sum(masks2, axis=0))
+
+    else:
+
+        t, df = ttest_sums(np.sum(values, axis=0), np.sum(values**2, axis=0), np.sum(masks, axis=0))
+
+    if alternative == "two-sided":
+        p = 2 * stdtr(df, -np.abs(t))
+    else:
+        p = stdtr(df, -t)
+
+    return np.stack((t, p), axis=-1)
+
+
+' a function for max-statistic permutation test of all the calculation units at once '
+
+def stats_permutation_fwe(rs1, rs2=None, method="1samp", alternative="greater", iter=1000, seed=None):
+
+    """
+    Conduct the max-statistic permutation test of all the calculation units at once
+
+    Parameters
+    ----------
+    rs1 : array
+        The values of group 1 (or condition 1). The shape of rs1 must be [n_subs, n_units].
+    rs2 : array. Default is None.
+        The values of group 2 (or condition 2). The shape of rs2 must be [n_subs2, n_units].
+    method : string '1samp' or 'rel' or 'ind'. Default is '1samp'.
+        If method='1samp' or 'rel', the signs of the values (or of the paired differences) of each subject are flipped.
+        If method='ind', the subjects are shuffled between the two groups.
+    alternative : string 'greater' or 'two-sided'. Default is 'greater'.
+        The alternative hypothesis.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutations.
+
+    Returns
+    -------
+    p : array
+        The FWE-corrected p-values. The shape of p is [n_units].
+
+    Notes
+    -----
+    Each permutation is applied to all the units together and the maximum t-value over the units is recorded, so the
+    p-values are corrected for the family-wise error. The one-sample & paired tests are conducted by
+    permutation_signflip(). For the independent tests, the permuted sums of all the units are calculated by matrix
+    products of the [iter, n_subs] group matrix and the data. NaNs are skipped.
+    """
+
+    if method != "ind":
+
+        # one-sample or paired sign-flip permutation test
+        return permutation_signflip(rs1, rs2 if method == "rel" else None, iter=iter, alternative=alternative,
+                                    seed=seed)[1]
+
+    n1 = np.shape(rs1)[0]
+    rs1 = np.concatenate((np.asarray(rs1, dtype=np.float64), np.asarray(rs2, dtype=np.float64)), axis=0)
+
+    subs, nunits = np.shape(rs1)
+
+    masks = ~np.isnan(rs1)
+    values = np.where(masks, rs1, 0)
+    squares = values**2
+
+    # the [iter, n_subs] indicator matrix of the subjects permuted into group 1
+    groups = np.zeros([iter, subs])
+    groups[np.arange(iter)[:, None], permutation_indices(subs, iter=iter, seed=seed)[:, :n1]] = 1
+
+    totals = np.sum(values, axis=0), np.sum(squares, axis=0), np.sum(masks, axis=0)
+    tobs = ttest_sums(np.sum(values[:n1], axis=0), np.sum(squares[:n1], axis=0), np.sum(masks[:n1], axis=0),
+                      np.sum(values[n1:], axis=0), np.sum(squares[n1:], axis=0), np.sum(masks[n1:], axis=0))[0]
+
+    if alternative == "two-sided":
+        tobs = np.abs(tobs)
+
+    maxt = np.zeros([iter])
+
+    # a block of permutations at a time to limit the memory of the [block, n_units] permuted t-values
+    block = max(1, int(2**22 / nunits))
+
+    for i in range(0, iter, block):
+
+        g = groups[i:i+block]
+        sums, sqs, cnts = np.matmul(g, values), np.matmul(g, squares), np.matmul(g, masks.astype(np.float64))
+        tperms = ttest_sums(sums, sqs, cnts, totals[0] - sums, totals[1] - sqs, totals[2] - cnts)[0]
+
+        if alternative == "two-sided":
+            tperms = np.abs(tperms)
+
+        maxt[i:i+block] = np.max(np.where(np.isnan(tperms), -np.inf, tperms), axis=1)
+
+    # count the maximum permuted t-values not smaller than the real t-values
+    # a tiny tolerance keeps the rounding errors of the matrix products from counting as smaller
+    ni = iter - np.searchsorted(np.sort(maxt), tobs - 1e-12, side="left")
+
+    p = np.float64((ni + 1) / (iter + 1))
+    p[np.isnan(tobs)] = np.nan
+
+    return p
 
 
 ' a function for conducting the statistical analysis for results of EEG-like data '
@@ -24,8 +170,10 @@ def stats(corrs, fisherz=True, permutation=True, iter=1000):
         number of channels and the number of time-points. 2 represents a r-value and a p-value.
     fisherz : bool True or False. Default is True.
         Conduct Fisher-Z transform.
-    permutation : bool True or False. Default is False.
+    permutation : bool True or False. Default is True.
         Use permutation test or not.
+        If permutation=True, the p-values (uncorrected) are given by one sign-flip permutation test of all the
+        channels & time-points (see permutation_signflip()).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -53,28 +201,24 @@ def stats(corrs, fisherz=True, permutation=True, iter=1000):
     if subs < 6:
         return print("the number of subjects is too small!")
 
-    # initialize the corrs
-    stats = np.zeros([chls, ts, 2], dtype=np.float)
-
     # get r-map
     rs = corrs[:, :, :, 0]
 
     if fisherz == True:
         rs = 0.5 * np.log((1 + rs) / (1 - rs))
-    #print(zs)
 
-    # calculate the statistical results
-    for i in range(chls):
-        for j in range(ts):
+    # flatten the channels & time-points, shape of rs: [n_subs, n_chls*n_ts]
+    rs = np.reshape(rs, [subs, -1])
 
-            # t test
-            stats[i, j] = ttest_1samp(rs[:, i, j], 0, alternative="greater")
+    # the t tests of all the channels & time-points at once
+    stats = stats_ttest(rs, method="1samp", alternative="greater")
 
-            if permutation == True:
+    if permutation == True:
 
-                stats[i, j, 1] = permutation_test(rs[:, i, j], np.zeros([subs]), iter=iter)
+        # one sign-flip permutation test for all the channels & time-points
+        stats[:, 1] = permutation_signflip(rs, iter=iter, alternative="greater")[0]
 
-    return stats
+    return np.reshape(stats, [chls, ts, 2])
 
 
 ' a function for conducting the statistical analysis for results of fMRI data (searchlight) '
@@ -94,6 +238,10 @@ def stats_fmri(corrs, fisherz=True, permutation=False, iter=1000):
         Conduct Fisher-Z transform.
     permutation : bool True or False. Default is False.
         Use permutation test or not.
+        If permutation=True, the p-values are FWE-corrected by one max-statistic sign-flip permutation test over all the
+        calculation units.
+        These p-values are already corrected, so use correct_method=None when saving them by
+        nii_save.stats_save_nii() (FWE/FDR would correct them a second time).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -106,6 +254,7 @@ def stats_fmri(corrs, fisherz=True, permutation=False, iter=1000):
 
     Notes
     -----
+    The t tests are conducted for all the calculation units at once and the NaNs are skipped.
     n_subs must >= 6.
     This function can be used for the results of searchlight fMRI NPS and searchlight fMRI RDM-correlations.
     """
@@ -124,9 +273,6 @@ def stats_fmri(corrs, fisherz=True, permutation=False, iter=1000):
     # get the number of the calculation units in the x, y, z directions
     n_x, n_y, n_z = np.shape(corrs)[1:4]
 
-    # initialize the corrs
-    stats = np.zeros([n_x, n_y, n_z, 2], dtype=np.float)
-
     # get r-map
     rs = corrs[:, :, :, :, 0]
 
@@ -134,19 +280,17 @@ def stats_fmri(corrs, fisherz=True, permutation=False, iter=1000):
 
         rs = 0.5 * np.log((1+rs)/(1-rs))
 
-    # calculate the statistical results
-    for i in range(n_x):
-        for j in range(n_y):
-            for k in range(n_z):
+    # flatten the calculation units, shape of rs: [n_subs, n_x*n_y*n_z]
+    rs = np.reshape(rs, [subs, -1])
 
-                # t test
-                stats[i, j, k] = ttest_1samp(rs[:, i, j, k], 0, alternative="greater")
+    # the t tests of all the calculation units at once
+    stats = stats_ttest(rs, method="1samp", alternative="greater")
 
-                if permutation == True:
+    if permutation == True:
 
-                    stats[i, j, k, 1] = permutation_test(rs[:, i, j, k], np.zeros([subs]), iter=iter)
+        stats[:, 1] = stats_permutation_fwe(rs, method="1samp", alternative="greater", iter=iter)
 
-    return stats
+    return np.reshape(stats, [n_x, n_y, n_z, 2])
 
 
 ' a function for conducting the statistical analysis for results of fMRI data (searchlight) within group '
@@ -170,6 +314,10 @@ def stats_fmri_compare_withingroup(corrs1, corrs2, fisherz=True, permutation=Fal
         Conduct Fisher-Z transform.
     permutation : bool True or False. Default is False.
         Use permutation test or not.
+        If permutation=True, the p-values are FWE-corrected by one max-statistic sign-flip permutation test over all the
+        calculation units.
+        These p-values are already corrected, so use correct_method=None when saving them by
+        nii_save.stats_save_nii() (FWE/FDR would correct them a second time).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -182,6 +330,7 @@ def stats_fmri_compare_withingroup(corrs1, corrs2, fisherz=True, permutation=Fal
 
     Notes
     -----
+    The t tests are conducted for all the calculation units at once and the NaNs are skipped.
     n_subs must >= 6.
     This function can be used for the results of searchlight fMRI NPS and searchlight fMRI RDM-correlations.
     """
@@ -200,9 +349,6 @@ def stats_fmri_compare_withingroup(corrs1, corrs2, fisherz=True, permutation=Fal
     # get the number of the calculation units in the x, y, z directions
     n_x, n_y, n_z = np.shape(corrs1)[1:4]
 
-    # initialize the corrs
-    stats = np.zeros([n_x, n_y, n_z, 2], dtype=np.float)
-
     # get r-map
     rs1 = corrs1[:, :, :, :, 0]
     rs2 = corrs2[:, :, :, :, 0]
@@ -212,19 +358,18 @@ def stats_fmri_compare_withingroup(corrs1, corrs2, fisherz=True, permutation=Fal
         rs1 = 0.5 * np.log((1+rs1)/(1-rs1))
         rs2 = 0.5 * np.log((1+rs2)/(1-rs2))
 
-    # calculate the statistical results
-    for i in range(n_x):
-        for j in range(n_y):
-            for k in range(n_z):
+    # flatten the calculation units, shape of rs1 & rs2: [n_subs, n_x*n_y*n_z]
+    rs1 = np.reshape(rs1, [subs, -1])
+    rs2 = np.reshape(rs2, [subs, -1])
 
-                # t test
-                stats[i, j, k] = ttest_rel(rs1[:, i, j, k], rs2[:, i, j, k], alternative="greater")
+    # the t tests of all the calculation units at once
+    stats = stats_ttest(rs1, rs2, method="rel", alternative="greater")
 
-                if permutation == True:
+    if permutation == True:
 
-                    stats[i, j, k, 1] = permutation_test(rs1[:, i, j, k], rs2[:, i, j, k], iter=iter)
+        stats[:, 1] = stats_permutation_fwe(rs1, rs2, method="rel", alternative="greater", iter=iter)
 
-    return stats
+    return np.reshape(stats, [n_x, n_y, n_z, 2])
 
 
 ' a function for conducting the statistical analysis for results of fMRI data (searchlight) between two groups'
@@ -248,6 +393,10 @@ def stats_fmri_compare_betweengroups(corrs1, corrs2, fisherz=True, permutation=F
         Conduct Fisher-Z transform.
     permutation : bool True or False. Default is False.
         Use permutation test or not.
+        If permutation=True, the p-values are FWE-corrected by one max-statistic group-label permutation test over all
+        the calculation units.
+        These p-values are already corrected, so use correct_method=None when saving them by
+        nii_save.stats_save_nii() (FWE/FDR would correct them a second time).
     iter : int. Default is 5000.
         The times for iteration.
 
@@ -260,6 +409,7 @@ def stats_fmri_compare_betweengroups(corrs1, corrs2, fisherz=True, permutation=F
 
     Notes
     -----
+    The t tests are conducted for all the calculation units at once and the NaNs are skipped.
     n_subs must >= 6.
     This function can be used for the results of searchlight fMRI NPS and searchlight fMRI RDM-correlations.
     """
@@ -278,9 +428,6 @@ def stats_fmri_compare_betweengroups(corrs1, corrs2, fisherz=True, permutation=F
     # get the number of the calculation units in the x, y, z directions
     n_x, n_y, n_z = np.shape(corrs1)[1:4]
 
-    # initialize the corrs
-    stats = np.zeros([n_x, n_y, n_z, 2], dtype=np.float)
-
     # get r-map
     rs1 = corrs1[:, :, :, :, 0]
     rs2 = corrs2[:, :, :, :, 0]
@@ -289,18 +436,18 @@ def stats_fmri_compare_betweengroups(corrs1, corrs2, fisherz=True, permutation=F
         rs1 = 0.5 * np.log((1 + rs1) / (1 - rs1))
         rs2 = 0.5 * np.log((1 + rs2) / (1 - rs2))
 
-    # calculate the statistical results
-    for i in range(n_x):
-        for j in range(n_y):
-            for k in range(n_z):
+    # flatten the calculation units, shape of rs1 & rs2: [n_subs1 (n_subs2), n_x*n_y*n_z]
+    rs1 = np.reshape(rs1, [subs1, -1])
+    rs2 = np.reshape(rs2, [subs2, -1])
+
+    # the t tests of all the calculation units at once
+    stats = stats_ttest(rs1, rs2, method="ind", alternative="greater")
 
-                # t test
-                stats[i, j, k] = ttest_ind(rs1[:, i, j, k], rs2[:, i, j, k], alternative="greater")
+    if permutation == True:
 
-                if permutation == True:
-                    stats[i, j, k, 1] = permutation_test(rs1[:, i, j, k], rs2[:, i, j, k], iter = iter)
+        stats[:, 1] = stats_permutation_fwe(rs1, rs2, method="ind", alternative="greater", iter=iter)
 
-    return stats
+    return np.reshape(stats, [n_x, n_y, n_z, 2])
 
 
 ' a function for conducting the statistical analysis for results of fMRI data (ISC searchlight) '
@@ -321,6 +468,10 @@ def stats_iscfmri(corrs, fisherz=True, permutation=False, iter=1000):
         Conduct Fisher-Z transform.
     permutation : bool True or False. Default is False.
         Use permutation test or not.
+        If permutation=True, the p-values are FWE-corrected by one max-statistic sign-flip permutation test over all the
+        calculation units of each time-point.
+        These p-values are already corrected, so use correct_method=None when saving them by
+        nii_save.stats_save_nii() (FWE/FDR would correct them a second time).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -333,6 +484,7 @@ def stats_iscfmri(corrs, fisherz=True, permutation=False, iter=1000):
 
     Notes
     -----
+    The t tests are conducted for all the calculation units at once and the NaNs are skipped.
     n_subs must >= 4 (n_subs!/(2!*(n_subs-2)!) >= 6).
     """
 
@@ -350,9 +502,6 @@ def stats_iscfmri(corrs, fisherz=True, permutation=False, iter=1000):
     # get the number of the calculation units in the x, y, z directions
     n_x, n_y, n_z = np.shape(corrs)[2:5]
 
-    # initialize the corrs
-    stats = np.zeros([ts, n_x, n_y, n_z, 2], dtype=np.float)
-
     # get r-map
     rs = corrs[:, :, :, :, :, 0]
 
@@ -360,20 +509,22 @@ def stats_iscfmri(corrs, fisherz=True, permutation=False, iter=1000):
         # Fisher r to z
         rs = 0.5 * np.log((1 + rs) / (1 - rs))
 
+    # flatten the calculation units, shape of rs: [n_ts, n_pairs, n_x*n_y*n_z]
+    rs = np.reshape(rs, [ts, npairs, -1])
+
+    stats = np.zeros([ts, n_x*n_y*n_z, 2], dtype=np.float64)
+
     # calculate the statistical results
     for t in range(ts):
-        for i in range(n_x):
-            for j in range(n_y):
-                for k in range(n_z):
 
-                    # t test
-                    stats[t, i, j, k] = ttest_1samp(rs[t, :, i, j, k], 0, alternative="greater")
+        # the t tests of all the calculation units at once
+        stats[t] = stats_ttest(rs[t], method="1samp", alternative="greater")
 
-                    if permutation == True:
+        if permutation == True:
 
-                        stats[t, i, j, k, 1] = permutation_test(rs[t, :, i, j, k], np.zeros([npairs]), iter=iter)
+            stats[t, :, 1] = stats_permutation_fwe(rs[t], method="1samp", alternative="greater", iter=iter)
 
-    return stats
+    return np.reshape(stats, [ts, n_x, n_y, n_z, 2])
 
 
 ' a function for conducting the statistical analysis for results of EEG-like data (for STPS) '
@@ -395,8 +546,10 @@ def stats_stps(corrs1, corrs2, fisherz=True, permutation=True, iter=1000):
         number of channels and the number of time-points.
     fisherz : bool True or False. Default is True.
         Conduct Fisher-Z transform.
-    permutation : bool True or False. Default is False.
+    permutation : bool True or False. Default is True.
         Use permutation test or not.
+        If permutation=True, the p-values (uncorrected) are given by one sign-flip permutation test of all the
+        channels & time-points (see permutation_signflip()).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -424,9 +577,6 @@ def stats_stps(corrs1, corrs2, fisherz=True, permutation=True, iter=1000):
     if subs < 6:
         return print("the number of subjects is too small!")
 
-    # initialize the corrs
-    stats = np.zeros([chls, ts, 2], dtype=np.float)
-
     # get r-map
     rs1 = corrs1
     rs2 = corrs2
@@ -436,18 +586,19 @@ def stats_stps(corrs1, corrs2, fisherz=True, permutation=True, iter=1000):
         rs1 = 0.5 * np.log((1 + rs1) / (1 - rs1))
         rs2 = 0.5 * np.log((1 + rs2) / (1 - rs2))
 
-    # calculate the statistical results
-    for i in range(chls):
-        for j in range(ts):
+    # flatten the channels & time-points, shape of rs1 & rs2: [n_subs, n_chls*n_ts]
+    rs1 = np.reshape(rs1, [subs, -1])
+    rs2 = np.reshape(rs2, [subs, -1])
 
-            # t test
-            stats[i, j] = ttest_rel(rs1[:, i, j], rs2[:, i, j])
+    # the t tests of all the channels & time-points at once
+    stats = stats_ttest(rs1, rs2, method="rel", alternative="two-sided")
 
-            if permutation == True:
+    if permutation == True:
 
-                stats[i, j, 1] = permutation_test(rs1[:, i, j], rs2[:, i, j], iter=iter)
+        # one paired sign-flip permutation test for all the channels & time-points
+        stats[:, 1] = permutation_signflip(rs1, rs2, iter=iter, alternative="two-sided")[0]
 
-    return stats
+    return np.reshape(stats, [chls, ts, 2])
 
 
 ' a function for conducting the statistical analysis for results of fMRI data (STPS searchlight) '
@@ -471,6 +622,10 @@ def stats_stpsfmri(corrs1, corrs2, fisherz=True, permutation=False, iter=1000):
         Conduct Fisher-Z transform.
     permutation : bool True or False. Default is False.
         Use permutation test or not.
+        If permutation=True, the p-values are FWE-corrected by one max-statistic sign-flip permutation test over all the
+        calculation units.
+        These p-values are already corrected, so use correct_method=None when saving them by
+        nii_save.stats_save_nii() (FWE/FDR would correct them a second time).
     iter : int. Default is 1000.
         The times for iteration.
 
@@ -483,6 +638,7 @@ def stats_stpsfmri(corrs1, corrs2, fisherz=True, permutation=False, iter=1000):
 
     Notes
     -----
+    The t tests are conducted for all the calculation units at once and the NaNs are skipped.
     n_subs must >= 6.
     """
 
@@ -501,9 +657,6 @@ def stats_stpsfmri(corrs1, corrs2, fisherz=True, permutation=False, iter=1000):
     # get the number of the calculation units in the x, y, z directions
     n_x, n_y, n_z = np.shape(corrs1)[1:]
 
-    # initialize the corrs
-    stats = np.zeros([n_x, n_y, n_z, 2], dtype=np.float)
-
     # get r-map
     rs1 = corrs1
     rs2 = corrs2
@@ -513,15 +666,15 @@ def stats_stpsfmri(corrs1, corrs2, fisherz=True, permutation=False, iter=1000):
         rs1 = 0.5 * np.log((1 + rs1) / (1 - rs1))
         rs2 = 0.5 * np.log((1 + rs2) / (1 - rs2))
 
-    # calculate the statistical results
-    for i in range(n_x):
-        for j in range(n_y):
-            for k in range(n_z):
+    # flatten the calculation units, shape of rs1 & rs2: [n_subs, n_x*n_y*n_z]
+    rs1 = np.reshape(rs1, [subs, -1])
+    rs2 = np.reshape(rs2, [subs, -1])
+
+    # the t tests of all the calculation units at once
+    stats = stats_ttest(rs1, rs2, method="rel", alternative="two-sided")
 
-                # t test
-                stats[i, j, k] = ttest_rel(rs1[:, i, j, k], rs2[:, i, j, k])
+    if permutation == True:
 
-                if permutation == True:
-                    stats[i, j, k, 1] = permutation_test(rs1[:, i, j, k], rs2[:, i, j, k], iter=iter)
+        stats[:, 1] = stats_permutation_fwe(rs1, rs2, method="rel", alternative="two-sided", iter=iter)
 
-    return stats
\ No newline at end of file
+    return np.reshape(stats, [n_x, n_y, n_z, 2])
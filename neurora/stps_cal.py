@@ -7,7 +7,7 @@ __author__ = 'Zitong Lu'
 import numpy as np
 from scipy.stats import pearsonr
 import math
-from neurora.stuff import show_progressbar
+from neurora.stuff import show_progressbar, searchlight_patches, searchlight_centers
 
 np.seterr(divide='ignore', invalid='ignore')
 
@@ -177,7 +177,7 @@ def stps(data, label_item, label_rf, time_win=20, time_step=1):
 
 ' a function for calculating the spatiotemporal pattern similarities (STPS) for fMRI (searchlight) '
 
-def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1]):
+def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1], mask=None, searchlight=None):
 
     """
     Calculate the spatiotemporal pattern similarities (STPS) for fMRI (searchlight)
@@ -201,6 +201,14 @@ def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1
         kx, ky, kz should be odd.
     strides : array or list [sx, sy, sz]. Default is [1, 1, 1].
         The strides for calculating along the x, y, z axis.
+    mask : array or string. Default is None.
+        The brain mask. It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+        If mask is not None, only the calculation units whose centres are inside the mask (voxels with values > 0)
+        will be calculated, and the results of the other calculation units are NaN.
+    searchlight : SphereSearchlight. Default is None.
+        A spherical searchlight (see neurora.stuff.SphereSearchlight) built for the size of the fMRI-img.
+        If searchlight is not None, the spheres are used as the calculation units instead of the cubes, and ksize,
+        strides & mask don't work.
 
     Returns
     -------
@@ -210,6 +218,8 @@ def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1
         conditions: 0: Within-Item, 1: Between-Item, 2: Remembered, 3: Forgot, 4: Within-Item&Remembered,
         5: Within-Item&Forgot, 6: Between-Item&Remembered, 7: Between-Item&Forgot. n_x, n_y, n_z represent the number
         of calculation units for searchlight along the x, y, z axis.
+        If searchlight is not None, n_x, n_y, n_z are nx, ny, nz, and the STPS of the voxels which are not centres of
+        the searchlight are NaN.
 
     Notes
     -----
@@ -227,6 +237,51 @@ def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1
     # get the number of subjects, trials and the size of the fMRI-img
     subs, trials, nx, ny, nz = np.shape(fmri_data)
 
+    label_item = np.asarray(label_item)
+    label_rf = np.asarray(label_rf)
+
+    # the pairs of trials (k < l) belonging to the eight conditions
+    k, l = np.triu_indices(trials, 1)
+    within = label_item[k] == label_item[l]
+    remembered = (label_rf[k] == 0) & (label_rf[l] == 0)
+    forgot = (label_rf[k] == 1) & (label_rf[l] == 1)
+    pairs = [within, ~within, remembered, forgot, within & remembered, within & forgot, ~within & remembered,
+             ~within & forgot]
+
+    # spherical searchlight
+    if searchlight is not None:
+
+        if tuple(searchlight.size) != (nx, ny, nz):
+
+            print("\nThe size of the searchlight doesn't match the size of the fMRI-img.\n")
+
+            return "Invalid input!"
+
+        # shape of data: [subs, trials, nx*ny*nz]
+        data = np.reshape(fmri_data, [subs, trials, nx*ny*nz])
+
+        # initialize the STPS of the centres
+        stps = np.full([subs, 8, len(searchlight)], np.nan)
+
+        total = subs * len(searchlight)
+
+        for sub in range(subs):
+            for i in range(len(searchlight)):
+
+                # show the progressbar
+                percent = (sub * len(searchlight) + i + 1) / total * 100
+                show_progressbar("Calculating", percent)
+
+                r = np.corrcoef(data[sub][:, searchlight.neighbors(i)])[k, l]
+
+                for j in range(8):
+                    stps[sub, j, i] = np.average(r[pairs[j]])
+
+        print("\nComputing finished!")
+
+        # shape of stps: [subs, 8, n_centers] -> [subs, 8, nx, ny, nz]
+        return searchlight.to_volume(stps, axis=2)
+
     # the size of the calculation units for searchlight
     kx = ksize[0]
     ky = ksize[1]
@@ -248,15 +303,29 @@ def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1
     n_y = int((ny - ky) / sy) + 1
     n_z = int((nz - kz) / sz) + 1
 
+    # the calculation units to be calculated
+    if mask is None:
+        centers = np.ones([n_x, n_y, n_z], dtype=bool)
+    else:
+        centers = searchlight_centers(mask, [nx, ny, nz], ksize, strides)
+
+        if isinstance(centers, str):
+
+            return "Invalid input!"
+
+    # the calculation units for searchlight (a view, not a copy)
+    # shape of patches: [subs, trials, n_x, n_y, n_z, kx, ky, kz]
+    patches = searchlight_patches(fmri_data, ksize, strides)
+
     # initialize the STPS
-    stps = np.zeros([subs, 8, n_x, n_y, n_z], dtype=np.float)
+    stps = np.zeros([subs, 8, n_x, n_y, n_z], dtype=np.float64)
 
     total = subs * n_x * n_y * n_z
 
     for sub in range(subs):
 
         # initialize the STPS for each subject
-        sub_stps = np.zeros([8, n_x, n_y, n_z], dtype=np.float)
+        sub_stps = np.full([8, n_x, n_y, n_z], np.nan)
 
         for x in range(n_x):
             for y in range(n_y):
@@ -266,96 +335,18 @@ def stps_fmri(fmri_data, label_item, label_rf, ksize=[3, 3, 3], strides=[1, 1, 1
                     percent = (sub * n_x * n_y * n_z + x * n_y * n_z + y * n_z + z + 1) / total * 100
                     show_progressbar("Calculating", percent)
 
-                    trials_data = fmri_data[sub, :, x*sx:x*sx+kx, y*sy:y*sy+ky, z*sz:z*sz+kz]
-                    trials_data = np.reshape(trials_data, [trials, kx*ky*kz])
-
-                    corr_mat = np.zeros([trials, trials], dtype=np.float)
-
-                    index = np.zeros([8], dtype=np.int)
-
-                    for k in range(trials):
-                        for l in range(trials):
-
-                            corr_mat[k, l] = pearsonr(trials_data[k], trials_data[l])[0]
-
-                            if k < l:
-
-                                if label_item[k] == label_item[l]:
-                                    index[0] = index[0] + 1
+                    # only the calculation units inside the mask
+                    if centers[x, y, z] == False:
+                        continue
 
-                                    if label_rf[k] == 0 and label_rf[l] == 0:
-                                        index[4] = index[4] + 1
-                                    if label_rf[k] == 1 and label_rf[l] == 1:
-                                        index[5] = index[5] + 1
-
-                                if label_item[k] != label_item[l]:
-                                    index[1] = index[1] + 1
-
-                                    if label_rf[k] == 0 and label_rf[l] == 0:
-                                        index[6] = index[6] + 1
-                                    if label_rf[k] == 1 and label_rf[l] == 1:
-                                        index[7] = index[7] + 1
-
-                                if label_rf[k] == 0 and label_rf[l] == 0:
-                                    index[2] = index[2] + 1
-
-                                if label_rf[k] == 1 and label_rf[l] == 1:
-                                    index[3] = index[3] + 1
-
-                    r0 = np.zeros([index[0]], dtype=np.float)
-                    r1 = np.zeros([index[1]], dtype=np.float)
-                    r2 = np.zeros([index[2]], dtype=np.float)
-                    r3 = np.zeros([index[3]], dtype=np.float)
-                    r4 = np.zeros([index[4]], dtype=np.float)
-                    r5 = np.zeros([index[5]], dtype=np.float)
-                    r6 = np.zeros([index[6]], dtype=np.float)
-                    r7 = np.zeros([index[7]], dtype=np.float)
-
-                    index = np.zeros([8], dtype=np.int)
-
-                    for k in range(trials):
-                        for l in range(trials):
-
-                            if k < l:
-
-                                if label_item[k] == label_item[l]:
-                                    r0[index[0]] = corr_mat[k, l]
-                                    index[0] = index[0] + 1
-
-                                    if label_rf[k] == 0 and label_rf[l] == 0:
-                                        r4[index[4]] = corr_mat[k, l]
-                                        index[4] = index[4] + 1
-                                    if label_rf[k] == 1 and label_rf[l] == 1:
-                                        r5[index[5]] = corr_mat[k, l]
-                                        index[5] = index[5] + 1
-
-                                if label_item[k] != label_item[l]:
-                                    r1[index[1]] = corr_mat[k, l]
-                                    index[1] = index[1] + 1
-
-                                    if label_rf[k] == 0 and label_rf[l] == 0:
-                                        r6[index[6]] = corr_mat[k, l]
-                                        index[6] = index[6] + 1
-                                    if label_rf[k] == 1 and label_rf[l] == 1:
-                                        r7[index[7]] = corr_mat[k, l]
-                                        index[7] = index[7] + 1
+                    trials_data = patches[sub, :, x, y, z]
+                    trials_data = np.reshape(trials_data, [trials, kx*ky*kz])
 
-                                if label_rf[k] == 0 and label_rf[l] == 0:
-                                    r2[index[2]] = corr_mat[k, l]
-                                    index[2] = index[2] + 1
+                    # the correlation coefficients of all pairs of trials (k < l)
+                    r = np.corrcoef(trials_data)[k, l]
 
-                                if label_rf[k] == 1 and label_rf[l] == 1:
-                                    r3[index[3]] = corr_mat[k, l]
-                                    index[3] = index[3] + 1
-
-                    sub_stps[0, x, y, z] = np.average(r0)
-                    sub_stps[1, x, y, z] = np.average(r1)
-                    sub_stps[2, x, y, z] = np.average(r2)
-                    sub_stps[3, x, y, z] = np.average(r3)
-                    sub_stps[4, x, y, z] = np.average(r4)
-                    sub_stps[5, x, y, z] = np.average(r5)
-                    sub_stps[6, x, y, z] = np.average(r6)
-                    sub_stps[7, x, y, z] = np.average(r7)
+                    for j in range(8):
+                        sub_stps[j, x, y, z] = np.average(r[pairs[j]])
 
         stps[sub] = sub_stps
 
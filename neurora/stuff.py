@@ -8,9 +8,14 @@ import nibabel as nib
 import numpy as np
 import os
 import math
-from scipy.stats import spearmanr, pearsonr, kendalltau, ttest_1samp, ttest_rel
+from scipy.stats import rankdata
 from skimage.measure import label
+from scipy import ndimage
+from scipy.special import stdtrit
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 # get package abspath
 package_root = os.path.dirname(os.path.abspath(__file__))
@@ -38,6 +43,567 @@ def limtozero(x):
     return x
 
 
+' a function for getting the upper triangles of RDMs '
+
+def rdm_to_condensed(rdms):
+
+    """
+    Get the upper triangles (without the diagonal) of RDMs
+
+    Parameters
+    ----------
+    rdms : array
+        The RDMs. The shape of rdms must be [..., n_cons, n_cons].
+
+    Returns
+    -------
+    vectors : array
+        The values in the upper triangles of the RDMs, in row-major order.
+        The shape of vectors is [..., n_cons*(n_cons-1)/2].
+    """
+
+    cons = np.shape(rdms)[-1]
+
+    if np.shape(rdms)[-2] != cons:
+
+        print("\nThe shape of the RDMs should be [..., n_cons, n_cons].\n")
+
+        return "Invalid input!"
+
+    iu = np.triu_indices(cons, 1)
+
+    return np.asarray(rdms)[..., iu[0], iu[1]]
+
+
+' a function for rebuilding the RDMs from their upper triangles '
+
+def condensed_to_rdm(vectors, diagonal=0):
+
+    """
+    Rebuild the symmetric RDMs from the upper triangles (without the diagonal)
+
+    Parameters
+    ----------
+    vectors : array
+        The values in the upper triangles of the RDMs, in row-major order.
+        The shape of vectors must be [..., n_cons*(n_cons-1)/2].
+    diagonal : float. Default is 0.
+        The values on the diagonal.
+
+    Returns
+    -------
+    rdms : array
+        The RDMs. The shape of rdms is [..., n_cons, n_cons].
+    """
+
+    npairs = np.shape(vectors)[-1]
+    cons = int(round((1 + np.sqrt(1 + 8 * npairs)) / 2))
+
+    if cons * (cons - 1) / 2 != npairs:
+
+        print("\nThe length of the vectors should be n_cons*(n_cons-1)/2.\n")
+
+        return "Invalid input!"
+
+    vectors = np.asarray(vectors)
+    iu = np.triu_indices(cons, 1)
+
+    rdms = np.full(vectors.shape[:-1] + (cons, cons), diagonal, dtype=vectors.dtype)
+    rdms[..., iu[0], iu[1]] = vectors
+    rdms[..., iu[1], iu[0]] = vectors
+
+    return rdms
+
+
+' a class for the condensed RDMs '
+
+class CondensedRDM(object):
+
+    """
+    The condensed RDM(s), only saving the values in the upper triangle (without the diagonal) of each RDM
+
+    Parameters
+    ----------
+    vectors : array
+        The values in the upper triangles of the RDMs, in row-major order.
+        The shape of vectors must be [..., n_cons*(n_cons-1)/2]. The leading dimensions (if any) are regarded as a
+        batch of RDMs, such as [n_subs] or [n_subs, n_ts].
+    conditions : array or list. Default is None.
+        The labels of the conditions. The length must be n_cons.
+    dtype : numpy.float32 or numpy.float64. Default is numpy.float64.
+        The data type of the values.
+
+    Attributes
+    ----------
+    vectors : array
+        The values in the upper triangles of the RDMs.
+    conditions : list or None
+        The labels of the conditions.
+    n_cons : int
+        The number of conditions.
+    shape : tuple
+        The shape of the batch of RDMs (without the [n_cons, n_cons] dimensions).
+
+    Raises
+    ------
+    ValueError
+        If dtype is not numpy.float32 or numpy.float64, the length of the vectors is not n_cons*(n_cons-1)/2 or the
+        number of the conditions is not n_cons. Unlike the functions of NeuroRA, which print a message and return
+        "Invalid input!", the class raises the error, since it can't return a string. The functions in neurora.rdm_cal
+        check the dtype before building a CondensedRDM.
+
+    Notes
+    -----
+    A CondensedRDM can be obtained from square RDMs by CondensedRDM.from_rdm(rdms) or returned by the functions in
+    neurora.rdm_cal with condensed=True. It can be used as an RDM in neurora.rdm_corr, neurora.corr_cal_by_rdm and
+    neurora.rsa_plot.plot_rdm.
+    """
+
+    def __init__(self, vectors, conditions=None, dtype=np.float64):
+
+        if np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float64)):
+            raise ValueError("The dtype of a CondensedRDM should be numpy.float32 or numpy.float64.")
+
+        self.vectors = np.asarray(vectors, dtype=dtype)
+
+        npairs = self.vectors.shape[-1]
+        self.n_cons = int(round((1 + np.sqrt(1 + 8 * npairs)) / 2))
+
+        if self.n_cons * (self.n_cons - 1) / 2 != npairs:
+            raise ValueError("The length of the vectors should be n_cons*(n_cons-1)/2.")
+
+        if conditions is not None:
+            conditions = list(conditions)
+            if len(conditions) != self.n_cons:
+                raise ValueError("The number of the conditions should be " + str(self.n_cons) + ".")
+
+        self.conditions = conditions
+
+    @classmethod
+    def from_rdm(cls, rdms, conditions=None, dtype=np.float64):
+
+        """
+        Get the condensed RDM(s) from square RDM(s) with a shape of [..., n_cons, n_cons]
+
+        A ValueError is raised if the last two dimensions of rdms are not equal.
+        """
+
+        if np.shape(rdms)[-1] != np.shape(rdms)[-2]:
+            raise ValueError("The shape of the RDMs should be [..., n_cons, n_cons].")
+
+        return cls(rdm_to_condensed(rdms), conditions=conditions, dtype=dtype)
+
+    @property
+    def shape(self):
+
+        return self.vectors.shape[:-1]
+
+    @property
+    def dtype(self):
+
+        return self.vectors.dtype
+
+    def __len__(self):
+
+        return len(self.vectors)
+
+    def __getitem__(self, index):
+
+        vectors = self.vectors[index]
+
+        if np.ndim(vectors) == 0 or np.shape(vectors)[-1] != self.vectors.shape[-1]:
+            raise IndexError("Only the batch dimensions of a CondensedRDM can be indexed.")
+
+        return CondensedRDM(vectors, conditions=self.conditions, dtype=self.dtype)
+
+    def astype(self, dtype):
+
+        return CondensedRDM(self.vectors, conditions=self.conditions, dtype=dtype)
+
+    def to_rdm(self, diagonal=0):
+
+        """
+        Get the square RDM(s) with a shape of [..., n_cons, n_cons]
+        """
+
+        return condensed_to_rdm(self.vectors, diagonal=diagonal)
+
+    def __repr__(self):
+
+        return "CondensedRDM(n_cons=" + str(self.n_cons) + ", shape=" + str(self.shape) + ", dtype=" + \
+               str(self.dtype) + ")"
+
+
+' a function for getting the values in the upper triangle of an RDM '
+
+def rdm_vector(rdm, rescale=False):
+
+    """
+    Get the values in the upper triangle (without the diagonal) of an RDM
+
+    Parameters
+    ----------
+    rdm : array or CondensedRDM
+        The RDM. The shape of rdm must be [n_cons, n_cons], or a single CondensedRDM.
+    rescale : bool True or False. Default is False.
+        Rescale the values in RDM or not.
+        Here, the maximum-minimum method is used to rescale the values except for the values on the diagonal.
+
+    Returns
+    -------
+    vector : array
+        The values in the upper triangle of the RDM, in row-major order. The shape of vector is
+        [n_cons*(n_cons-1)/2].
+    """
+
+    if isinstance(rdm, CondensedRDM):
+
+        if len(rdm.shape) != 0:
+
+            return "Invalid input!"
+
+        vector = np.array(rdm.vectors, dtype=np.float64)
+        diagonal = np.zeros([1])
+
+    else:
+
+        if len(np.shape(rdm)) != 2 or np.shape(rdm)[0] != np.shape(rdm)[1]:
+
+            return "Invalid input!"
+
+        rdm = np.asarray(rdm, dtype=np.float64)
+        vector = rdm_to_condensed(rdm)
+        diagonal = np.diagonal(rdm)
+
+    if rescale == True:
+
+        # the distinct values in the RDM (including the diagonal)
+        values = np.unique(np.concatenate((vector, diagonal)))
+
+        if len(values) > 1:
+
+            # get max & min (the smallest value is regarded as the value on the diagonal)
+            maxvalue = values[-1]
+            minvalue = values[1]
+
+            if maxvalue != minvalue:
+                vector = (vector - minvalue) / (maxvalue - minvalue)
+
+    return vector
+
+
+' a function for extracting the sliding time-windows of the data '
+
+def sliding_time_windows(data, time_win=5, time_step=5):
+
+    """
+    Extract the sliding time-windows along the last (time) axis without copying the data
+
+    Parameters
+    ----------
+    data : array
+        The data. The shape of data must be [..., n_ts]. n_ts represents the number of time-points.
+    time_win : int. Default is 5.
+        Set a time-window for each window. If time_win=5, that means each window contains 5 time-points.
+    time_step : int. Default is 5.
+        The time step size for each time of sliding.
+
+    Returns
+    -------
+    windows : array
+        A read-only strided view of data.
+        The shape of windows is [..., int((n_ts-time_win)/time_step)+1, time_win].
+    """
+
+    nts = np.shape(data)[-1]
+
+    if time_win < 1 or time_step < 1 or time_win > nts:
+
+        print("\nThe time_win and time_step don't match the number of time-points.\n")
+
+        return "Invalid input!"
+
+    windows = np.lib.stride_tricks.sliding_window_view(data, time_win, axis=-1)
+
+    return windows[..., ::time_step, :]
+
+
+' a function for averaging the data within the sliding time-windows '
+
+def window_average(data, time_win=5, time_step=5):
+
+    """
+    Average the data within each sliding time-window along the last (time) axis by cumulative sum
+
+    Parameters
+    ----------
+    data : array
+        The data. The shape of data must be [..., n_ts]. n_ts represents the number of time-points.
+    time_win : int. Default is 5.
+        Set a time-window for each window. If time_win=5, that means each window contains 5 time-points.
+    time_step : int. Default is 5.
+        The time step size for each time of sliding.
+
+    Returns
+    -------
+    avgt_data : array
+        The time-window averaged data.
+        The shape of avgt_data is [..., int((n_ts-time_win)/time_step)+1].
+    """
+
+    data = np.asarray(data, dtype=np.float64)
+    nts = data.shape[-1]
+
+    if time_win < 1 or time_step < 1 or time_win > nts:
+
+        print("\nThe time_win and time_step don't match the number of time-points.\n")
+
+        return "Invalid input!"
+
+    starts = np.arange(0, nts - time_win + 1, time_step)
+
+    # cumulative sum with a leading zero, so that the sum of data[..., a:b] is csum[..., b] - csum[..., a]
+    csum = np.zeros(data.shape[:-1] + (nts + 1,), dtype=np.float64)
+    np.cumsum(data, axis=-1, out=csum[..., 1:])
+
+    return (csum[..., starts + time_win] - csum[..., starts]) / time_win
+
+
+' a function for extracting the searchlight calculation units of fMRI data '
+
+def searchlight_patches(fmri_data, ksize=[3, 3, 3], strides=[1, 1, 1], copy=False):
+
+    """
+    Extract the searchlight calculation units (cubes) of fMRI data without copying the data
+
+    Parameters
+    ----------
+    fmri_data : array
+        The fMRI data.
+        The shape of fmri_data must be [..., nx, ny, nz]. nx, ny, nz represent the size of the fMRI-img.
+    ksize : array or list [kx, ky, kz]. Default is [3, 3, 3].
+        The size of the calculation unit for searchlight.
+        kx, ky, kz represent the number of voxels along the x, y, z axis.
+    strides : array or list [sx, sy, sz]. Default is [1, 1, 1].
+        The strides for calculating along the x, y, z axis.
+    copy : bool True or False. Default is False.
+        Return a writable copy of the calculation units or not.
+        If copy=False, return a read-only strided view of fmri_data.
+
+    Returns
+    -------
+    patches : array
+        The calculation units for searchlight.
+        The shape of patches is [..., n_x, n_y, n_z, kx, ky, kz]. n_x, n_y, n_z represent the number of calculation
+        units for searchlight along the x, y, z axis.
+    """
+
+    kx, ky, kz = ksize
+    sx, sy, sz = strides
+
+    if len(np.shape(fmri_data)) < 3 or kx > np.shape(fmri_data)[-3] or ky > np.shape(fmri_data)[-2] \
+            or kz > np.shape(fmri_data)[-1]:
+
+        print("\nThe size of the calculation units doesn't match the size of the fMRI-img.\n")
+
+        return "Invalid input!"
+
+    patches = np.lib.stride_tricks.sliding_window_view(fmri_data, (kx, ky, kz), axis=(-3, -2, -1))
+    patches = patches[..., ::sx, ::sy, ::sz, :, :, :]
+
+    if copy == True:
+        patches = np.array(patches)
+
+    return patches
+
+
+' a function for getting the searchlight calculation units whose centres are inside a mask '
+
+def searchlight_centers(mask, size, ksize=[3, 3, 3], strides=[1, 1, 1]):
+
+    """
+    Get the searchlight calculation units whose centres are inside a brain mask
+
+    Parameters
+    ----------
+    mask : array or string
+        The brain mask. The voxels with values > 0 are regarded as inside the mask.
+        It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+    size : array or list [nx, ny, nz]
+        The size of the fMRI-img.
+    ksize : array or list [kx, ky, kz]. Default is [3, 3, 3].
+        The size of the calculation unit for searchlight.
+        kx, ky, kz represent the number of voxels along the x, y, z axis.
+    strides : array or list [sx, sy, sz]. Default is [1, 1, 1].
+        The strides for calculating along the x, y, z axis.
+
+    Returns
+    -------
+    centers : array
+        A boolean array, True for the calculation units whose centres are inside the mask.
+        The shape of centers is [n_x, n_y, n_z]. n_x, n_y, n_z represent the number of calculation units for
+        searchlight along the x, y, z axis.
+    """
+
+    if isinstance(mask, str):
+        mask = nib.load(mask).get_fdata()
+
+    mask = np.nan_to_num(np.asarray(mask, dtype=np.float64)) > 0
+
+    if list(np.shape(mask)) != list(size):
+
+        print("\nThe shape of the mask should be the same as the size of the fMRI-img " + str(list(size)) + ".\n")
+
+        return "Invalid input!"
+
+    kx, ky, kz = ksize
+    sx, sy, sz = strides
+
+    # calculate the number of the calculation units
+    n_x = int((size[0] - kx) / sx) + 1
+    n_y = int((size[1] - ky) / sy) + 1
+    n_z = int((size[2] - kz) / sz) + 1
+
+    # the centre voxels of the calculation units
+    cx = np.arange(n_x) * sx + int(kx / 2)
+    cy = np.arange(n_y) * sy + int(ky / 2)
+    cz = np.arange(n_z) * sz + int(kz / 2)
+
+    return mask[np.ix_(cx, cy, cz)]
+
+
+' a class for the spherical searchlight with a precomputed neighbourhood index '
+
+class SphereSearchlight(object):
+
+    """
+    The geometry of a spherical searchlight
+
+    The neighbour voxels of all the searchlight centres are computed once and saved as a compact CSR-style index,
+    so that they can be reused for all subjects, conditions and searchlight functions.
+
+    Parameters
+    ----------
+    size : array or list [nx, ny, nz]
+        The size of the fMRI-img.
+    radius : int or float. Default is 2.
+        The radius of the sphere (in voxels). The voxels whose distances to the centre are <= radius are included.
+    mask : array or string. Default is None.
+        The brain mask. The voxels with values > 0 are regarded as inside the mask.
+        It can be an array with a shape of [nx, ny, nz] or the filename of a NIfTI file.
+        If mask is not None, only the voxels inside the mask are regarded as centres and neighbours.
+        If mask=None, all the voxels are regarded as centres.
+
+    Attributes
+    ----------
+    centers : array
+        The flat indices (in a [nx, ny, nz] volume) of the searchlight centres. The shape is [n_centers].
+    indptr : array
+        The neighbour voxels of the i-th centre are indices[indptr[i]:indptr[i+1]]. The shape is [n_centers+1].
+    indices : array
+        The flat indices of the neighbour voxels of all the centres.
+    """
+
+    def __init__(self, size, radius=2, mask=None):
+
+        self.size = tuple(int(n) for n in size)
+        self.radius = radius
+
+        if mask is None:
+            mask = np.ones(self.size, dtype=bool)
+        else:
+            if isinstance(mask, str):
+                mask = nib.load(mask).get_fdata()
+            mask = np.nan_to_num(np.asarray(mask, dtype=np.float64)) > 0
+
+        if mask.shape != self.size:
+            raise ValueError("The shape of the mask should be the same as the size of the fMRI-img "
+                             + str(list(self.size)) + ".")
+
+        # the offsets of the voxels inside the sphere
+        r = int(radius)
+        grid = np.mgrid[-r:r+1, -r:r+1, -r:r+1].reshape(3, -1).T
+        offsets = grid[np.sum(grid ** 2, axis=1) <= radius ** 2]
+
+        self.centers = np.flatnonzero(mask)
+
+        indices = []
+        counts = np.zeros([len(self.centers)], dtype=np.int64)
+
+        # compute the neighbours for blocks of centres to limit the memory
+        block = 10000
+        for i in range(0, len(self.centers), block):
+            coords = np.transpose(np.unravel_index(self.centers[i:i+block], self.size))
+            neighbors = coords[:, None, :] + offsets[None, :, :]
+            valid = np.all((neighbors >= 0) & (neighbors < np.array(self.size)), axis=2)
+            neighbors = np.clip(neighbors, 0, np.array(self.size) - 1)
+            valid = valid & mask[neighbors[..., 0], neighbors[..., 1], neighbors[..., 2]]
+            counts[i:i+block] = np.sum(valid, axis=1)
+            indices.append(np.ravel_multi_index((neighbors[..., 0][valid], neighbors[..., 1][valid],
+                                                 neighbors[..., 2][valid]), self.size))
+
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.indices = np.concatenate(indices) if len(indices) > 0 else np.zeros([0], dtype=np.int64)
+
+    def __len__(self):
+
+        return len(self.centers)
+
+    def neighbors(self, i):
+
+        """
+        Get the flat indices of the neighbour voxels of the i-th centre
+        """
+
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def groups(self, batch=1000):
+
+        """
+        Iterate over the centres in batches of centres with the same number of neighbours
+
+        Returns
+        -------
+        (ids, voxels) for each batch. ids (shape: [n]) are the indices of the centres and voxels (shape:
+        [n, n_neighbors]) are the flat indices of their neighbour voxels.
+        """
+
+        counts = np.diff(self.indptr)
+
+        for count in np.unique(counts):
+            ids = np.flatnonzero(counts == count)
+            for i in range(0, len(ids), batch):
+                batch_ids = ids[i:i+batch]
+                yield batch_ids, self.indices[self.indptr[batch_ids][:, None] + np.arange(count)]
+
+    def to_volume(self, values, axis=0):
+
+        """
+        Put the results of the centres back into the fMRI-img space
+
+        Parameters
+        ----------
+        values : array
+            The results of the centres. The centres are along the given axis, which has a length of n_centers.
+        axis : int. Default is 0.
+            The axis of the centres.
+
+        Returns
+        -------
+        volume : array
+            The results in the fMRI-img space. The axis of the centres is replaced by the [nx, ny, nz] axes and the
+            values of the voxels which are not centres are NaN.
+        """
+
+        axis = axis % np.ndim(values)
+        values = np.moveaxis(np.asarray(values, dtype=np.float64), axis, 0)
+        volume = np.full((np.prod(self.size),) + values.shape[1:], np.nan)
+        volume[self.centers] = values
+        volume = np.reshape(volume, self.size + values.shape[1:])
+
+        return np.moveaxis(volume, (0, 1, 2), (axis, axis + 1, axis + 2))
+
+
 ' a function for getting the affine of the fMRI-img '
 
 def get_affine(file_name):
@@ -160,56 +726,52 @@ def correct_by_threshold(img, threshold):
 
 ' a function for FWE-correction for fMRI RSA results '
 
-def fwe_correct(p, p_threshold):
+def fwe_correct(p, p_threshold, stack=False):
 
     """
-    FWE correction for fMRI RSA results
+    FWE correction (Bonferroni) for fMRI RSA results
 
     Parameters
     ----------
     p : array
-        The p-value map (3-D).
+        The p-value map of any dimension, such as a 3-D fMRI map [n_x, n_y, n_z] or an EEG map [n_chls, n_ts].
     p_threshold: string
         The p threshold.
+    stack : bool True or False. Default is False.
+        If stack=True, p is a stack of maps [n_maps, ...] and each map is corrected separately.
 
     Returns
     -------
     fwep : array.
-        The FWE corrected p-value map.
-    """
+        The FWE corrected p-value map with the same shape as p.
+        The values which are not lower than p_threshold after correction are NaNs.
 
-    px = np.shape(p)[0]
-    py = np.shape(p)[1]
-    pz = np.shape(p)[2]
-
-    n = 0
-
-    for i in range(px):
-        for j in range(py):
-            for k in range(pz):
+    Notes
+    -----
+    The NaNs in p are ignored and don't count in the number of tests.
+    """
 
-                if (math.isnan(p[i, j, k]) == False):
-                    n = n + 1
+    p = np.asarray(p, dtype=np.float64)
 
-    p = p*n
+    # shape of maps: [n_maps, n_points]
+    maps = np.reshape(p, [np.shape(p)[0], -1]) if stack is True else np.reshape(p, [1, -1])
 
-    fwep = np.full([px, py, pz], np.nan)
+    # the number of tests of each map
+    n = np.sum(~np.isnan(maps), axis=1)
 
-    for i in range(px):
-        for j in range(py):
-            for k in range(pz):
+    fwep = maps * n[:, None]
 
-                if p[i, j, k] < p_threshold:
-                        fwep[i, j, k] = p[i, j, k]
+    with np.errstate(invalid="ignore"):
+        fwep = np.where(fwep < p_threshold, fwep, np.nan)
 
     print("finished FWE correct")
 
-    return fwep
+    return np.reshape(fwep, np.shape(p))
 
 
 ' a function for FDR-correction for fMRI RSA results '
 
-def fdr_correct(p, p_threshold):
+def fdr_correct(p, p_threshold, method="BH", stack=False):
 
     """
     FDR correction for fMRI RSA results
@@ -217,67 +779,63 @@ def fdr_correct(p, p_threshold):
     Parameters
     ----------
     p : array
-        The p-value map (3-D).
+        The p-value map of any dimension, such as a 3-D fMRI map [n_x, n_y, n_z] or an EEG map [n_chls, n_ts].
     p_threshold: string
         The p threshold.
+    method : string 'BH' or 'BY'. Default is 'BH'.
+        If method='BH', the Benjamini-Hochberg procedure. If method='BY', the Benjamini-Yekutieli procedure (for any
+        dependency between the tests).
+    stack : bool True or False. Default is False.
+        If stack=True, p is a stack of maps [n_maps, ...] and each map is corrected separately.
 
     Returns
     -------
     fdrp : array.
-        The FDR corrected p-value map.
+        The FDR corrected p-value map with the same shape as p.
+        The values whose uncorrected p-values are not lower than p_threshold are NaNs.
+
+    Notes
+    -----
+    The NaNs in p are ignored and don't count in the number of tests.
+    The corrected p-values are made monotonic (a smaller p-value never gets a larger corrected p-value) and are not
+    larger than 1.
     """
 
-    px = np.shape(p)[0]
-    py = np.shape(p)[1]
-    pz = np.shape(p)[2]
+    if method not in ["BH", "BY"]:
 
-    n = 0
+        return "Invalid input!"
 
-    for i in range(px):
-        for j in range(py):
-            for k in range(pz):
-
-                if (math.isnan(p[i, j, k]) == False):
-
-                    n = n + 1
-
-    fdrp = np.full([px, py, pz], np.nan)
-
-    pcluster = np.zeros([n], dtype=np.float)
+    p = np.asarray(p, dtype=np.float64)
 
-    m = 0
+    # shape of maps: [n_maps, n_points]
+    maps = np.reshape(p, [np.shape(p)[0], -1]) if stack is True else np.reshape(p, [1, -1])
+    nmaps, npoints = np.shape(maps)
 
-    for i in range(px):
-        for j in range(py):
-            for k in range(pz):
-
-                if (math.isnan(p[i, j, k]) == False):
-                    pcluster[m] = p[i, j, k]
-                    m = m + 1
+    # the number of tests of each map
+    n = np.sum(~np.isnan(maps), axis=1)
 
-    index = np.argsort(pcluster)
+    # sort the p-values of each map (the NaNs are sorted to the end)
+    index = np.argsort(maps, axis=1)
+    pcluster = np.take_along_axis(maps, index, axis=1)
 
-    for l in range(n):
-        pcluster[index[l]] = float(pcluster[index[l]]*n/(l+1))
+    pcluster = pcluster * n[:, None] / np.arange(1, npoints+1)
 
-    """for l in range(n - 1):
-        if pcluster[index[-l - 1]] < pcluster[index[-l - 2]]:
-            pcluster[index[-l - 2]] = pcluster[index[-l - 1]]"""
+    if method == "BY":
+        pcluster = pcluster * np.cumsum(1 / np.arange(1, npoints+1))[n - 1][:, None]
 
-    m = 0
+    # monotonicity: the corrected p-value of each rank is the minimum of those of the higher ranks
+    pcluster = np.where(np.isnan(pcluster), np.inf, pcluster)
+    pcluster = np.minimum(np.minimum.accumulate(pcluster[:, ::-1], axis=1)[:, ::-1], 1)
 
-    for i in range(px):
-        for j in range(py):
-            for k in range(pz):
+    fdrp = np.empty([nmaps, npoints])
+    np.put_along_axis(fdrp, index, pcluster, axis=1)
 
-                if math.isnan(p[i, j, k]) == False:
-                    if p[i, j, k] < p_threshold:
-                        fdrp[i, j, k] = pcluster[m]
-                    m = m + 1
+    with np.errstate(invalid="ignore"):
+        fdrp = np.where(maps < p_threshold, fdrp, np.nan)
 
     print("finished FDR correct")
 
-    return fdrp
+    return np.reshape(fdrp, np.shape(p))
 
 
 ' a function for Cluster-wise FWE-correction for fMRI RSA results '
@@ -661,149 +1219,973 @@ def mask_to(mask, size, affine, filename=None):
                     if x < size[0] and y < size[1] and z < size[2]:
                         newdata[x, y, z] = data[i, j, k]
 
-    file = nib.Nifti1Image(newdata, affine)
+    file = nib.Nifti1Image(newdata, affine)
+
+    if filename == None:
+        filename = "newmask.nii"
+    else:
+        q = ".nii" in filename
+
+        if q == True:
+            filename = filename
+        else:
+            filename = filename+".nii"
+
+    nib.save(file, filename)
+
+    return 0
+
+
+' a function for estimating the Ledoit-Wolf shrinkage of a batch of covariance matrices '
+
+def ledoit_wolf_shrinkage(X, gram=None):
+
+    """
+    Estimate the Ledoit-Wolf shrinkage of the covariance matrices of a batch of centered samples
+
+    Parameters
+    ----------
+    X : array
+        The centered samples. The shape of X must be [..., n_samples, n_features].
+    gram : array. Default is None.
+        The smaller of the Gram matrices X * X.T & X.T * X, if it has been calculated.
+
+    Returns
+    -------
+    shrinkage : array [...]
+        The shrinkage intensities (the same as sklearn.covariance.ledoit_wolf_shrinkage()).
+    mu : array [...]
+        The average variances. The shrunk covariance is (1 - shrinkage) * X.T * X / n_samples + shrinkage * mu * I.
+
+    Notes
+    -----
+    The estimates only need the trace & the Frobenius norm of the covariance, which are the same for both Gram
+    matrices, so the smaller one is used.
+    """
+
+    n, p = np.shape(X)[-2:]
+
+    if gram is None:
+        if p <= n:
+            gram = np.matmul(np.swapaxes(X, -1, -2), X)
+        else:
+            gram = np.matmul(X, np.swapaxes(X, -1, -2))
+
+    norms = np.sum(X ** 2, axis=-1)
+    mu = np.sum(norms, axis=-1) / n / p
+    s2 = np.sum(gram ** 2, axis=(-2, -1)) / n ** 2
+    delta = s2 - mu ** 2 * p
+    beta = (np.sum(norms ** 2, axis=-1) / n - s2) / n
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shrinkage = np.where(delta > 0, np.minimum(beta, delta) / delta, 1)
+
+    return shrinkage, mu
+
+
+' a function for calculating the Gram matrices of the patterns whitened by the shrinkage noise covariances '
+
+def mahalanobis_gram(data, noise, data2=None):
+
+    """
+    Calculate the Gram matrices of a batch of condition patterns whitened by the shrinkage noise covariances
+
+    Parameters
+    ----------
+    data : array
+        The condition patterns.
+        The shape of data must be [..., n_cons, n_features].
+    noise : array
+        The noise samples, such as the residuals of the trials after subtracting the condition means.
+        The shape of noise must be [..., n_samples, n_features]. One noise covariance is estimated for each pattern
+        matrix in the batch.
+    data2 : array. Default is None.
+        The second condition patterns with a shape of [..., n_cons2, n_features].
+        If data2=None, data2 is data.
+
+    Returns
+    -------
+    gram : array [..., n_cons, n_cons2]
+        The Gram matrices data * inv(cov) * data2.T, where cov is the noise covariance.
+
+    Notes
+    -----
+    The noise covariance is shrunk towards a scaled identity matrix by the Ledoit-Wolf shrinkage, which is estimated
+    from the smaller Gram matrix of the noise samples. If n_features > n_samples, the inverse of the covariance is never
+    built and the Woodbury identity is used instead.
+    """
+
+    data = np.asarray(data, dtype=np.float64)
+    noise = np.asarray(noise, dtype=np.float64)
+
+    if data2 is None:
+        data2 = data
+    else:
+        data2 = np.asarray(data2, dtype=np.float64)
+
+    # center the noise samples
+    X = noise - np.average(noise, axis=-2, keepdims=True)
+    n, p = np.shape(X)[-2:]
+
+    # the smaller of the [n_samples, n_samples] & [n_features, n_features] Gram matrices of the noise samples
+    if p <= n:
+        K = np.matmul(np.swapaxes(X, -1, -2), X)
+    else:
+        K = np.matmul(X, np.swapaxes(X, -1, -2))
+
+    # the Ledoit-Wolf shrinkage
+    shrinkage, mu = ledoit_wolf_shrinkage(X, K)
+
+    # cov = a * I + b * X.T * X
+    a = (shrinkage * mu)[..., None, None]
+    b = ((1 - shrinkage) / n)[..., None, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        if p <= n:
+
+            cov = b * K + a * np.eye(p)
+
+            return np.matmul(data, np.linalg.solve(cov, np.swapaxes(data2, -1, -2)))
+
+        # Woodbury identity: inv(cov) = (I - b * X.T * inv(a * I + b * X * X.T) * X) / a
+        dx = np.matmul(data, np.swapaxes(X, -1, -2))
+        xd2 = np.matmul(X, np.swapaxes(data2, -1, -2))
+        correction = b * np.matmul(dx, np.linalg.solve(a * np.eye(n) + b * K, xd2))
+
+        return (np.matmul(data, np.swapaxes(data2, -1, -2)) - correction) / a
+
+
+' a function for permutation test '
+
+def permutation_test(v1, v2, iter=1000):
+
+    """
+    Conduct Permutation test
+
+    Parameters
+    ----------
+    v1 : array
+        Vector 1.
+    v2 : array
+        Vector 2.
+    iter : int. Default is 1000.
+        The times for iteration.
+
+    Returns
+    -------
+    p : float
+        The permutation test result, p-value.
+
+    Notes
+    -----
+    For one-sample or paired tests of a batch of units (such as all the channels & time-points), use
+    permutation_signflip(), which tests all the units at once.
+    """
+
+    if len(v1) != len(v2):
+
+        return "Invalid input"
+
+    # permutation test
+
+    diff = abs(np.average(v1) - np.average(v2))
+    v = np.hstack((v1, v2))
+    nv = v.shape[0]
+
+    # all the shuffles at once, shape of vshuffle: [iter, nv]
+    vshuffle = v[np.argsort(np.random.random([iter, nv]), axis=1)]
+    diffs = np.average(vshuffle[:, :int(nv/2)], axis=1) - np.average(vshuffle[:, int(nv/2):], axis=1)
+
+    ni = np.sum(diffs >= diff)
+
+    # permunitation test p-value
+    p = np.float64(ni/iter)
+
+    return p
+
+
+' a function for generating the permutation indices '
+
+def permutation_indices(n, iter=1000, seed=None):
+
+    """
+    Generate the indices of random permutations
+
+    Parameters
+    ----------
+    n : int
+        The length of the permuted vectors.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator (numpy.random.default_rng).
+        Setting a seed makes the permutations reproducible.
+
+    Returns
+    -------
+    perms : array [iter, n]
+        The permutation indices. Each row is a permutation of range(n).
+    """
+
+    rng = np.random.default_rng(seed)
+
+    return np.argsort(rng.random([iter, n]), axis=1)
+
+
+' a function for generating the sign-flip matrix '
+
+def signflip_matrix(n, iter=1000, seed=None):
+
+    """
+    Generate the random sign-flips of the subjects
+
+    Parameters
+    ----------
+    n : int
+        The number of subjects.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator (numpy.random.default_rng).
+        Setting a seed makes the sign-flips reproducible.
+
+    Returns
+    -------
+    flips : array [iter, n]
+        The sign-flip matrix. The values in flips are 1 or -1.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    return rng.choice([-1.0, 1.0], size=[iter, n])
+
+
+' a function for calculating the t-values of a batch of t tests from the sums of the samples '
+
+def ttest_sums(sums, squares, counts, sums2=None, squares2=None, counts2=None):
+
+    """
+    Calculate the t-values of a batch of t tests from the sums & the sums of squares of the samples
+
+    Parameters
+    ----------
+    sums, squares, counts : array
+        The sums, the sums of squares and the numbers of the (non-NaN) samples.
+    sums2, squares2, counts2 : array. Default is None.
+        The sums, the sums of squares and the numbers of the (non-NaN) samples in group 2.
+        If sums2=None, one-sample t tests are conducted. Otherwise, independent t tests with the pooled variance.
+
+    Returns
+    -------
+    t : array
+        The t-values with the same shape as sums.
+    df : array
+        The degrees of freedom.
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        means = sums / counts
+
+        if sums2 is None:
+
+            df = counts - 1
+            var = (squares - sums * means) / df
+
+            return means / np.sqrt(var / counts), df
+
+        means2 = sums2 / counts2
+        df = counts + counts2 - 2
+        var = (squares - sums * means + squares2 - sums2 * means2) / df
+
+        return (means - means2) / np.sqrt(var * (1 / counts + 1 / counts2)), df
+
+
+' a function for calculating the one-sample t-values of the sign-flipped samples '
+
+def signflip_tvalues(x, flips):
+
+    """
+    Calculate the one-sample t-values (against 0) of the sign-flipped samples of all the units at once
+
+    Parameters
+    ----------
+    x : array
+        The samples. The shape of x must be [n_subs, n_units]. NaNs are skipped.
+    flips : array
+        The sign-flip matrix, such as the results of signflip_matrix(). The shape of flips must be [iter, n_subs].
+
+    Returns
+    -------
+    t : array
+        The t-values of the sign-flipped samples. The shape of t is [iter, n_units].
+
+    Notes
+    -----
+    The sums of squares don't change with the signs, so the t-maps of all the sign-flips are given by one matrix
+    product of the sign-flip matrix and the samples.
+    """
+
+    masks = ~np.isnan(x)
+    values = np.where(masks, x, 0)
+
+    return ttest_sums(np.matmul(flips, values), np.sum(values**2, axis=0), np.sum(masks, axis=0))[0]
+
+
+' a function for sign-flip permutation test '
+
+def permutation_signflip(v1, v2=None, iter=1000, alternative="greater", seed=None, flips=None):
+
+    """
+    Conduct one-sample or paired sign-flip permutation tests of a batch of units at once
+
+    Parameters
+    ----------
+    v1 : array
+        The samples under condition 1. The shape of v1 must be [n_subs, ...].
+    v2 : array. Default is None.
+        The samples under condition 2 with the same shape as v1.
+        If v2=None, v1 is tested against 0. Otherwise, the paired differences v1-v2 are tested against 0.
+    iter : int. Default is 1000.
+        The times for iteration.
+    alternative : string 'greater' or 'two-sided'. Default is 'greater'.
+        The alternative hypothesis.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the sign-flips.
+    flips : array [iter, n_subs]. Default is None.
+        The sign-flip matrix, such as the results of signflip_matrix().
+        If flips is not None, iter & seed don't work and the same sign-flips can be reused in different calls.
+
+    Returns
+    -------
+    p : array
+        The uncorrected p-values. The shape of p is [...].
+    p_fwe : array
+        The FWE-corrected p-values by the maximum statistic over all the units. The shape of p_fwe is [...].
+
+    Notes
+    -----
+    The statistic is the t-value. One [iter, n_subs] sign-flip matrix is drawn and applied to all the units by
+    matrix products, a block of sign-flips at a time. NaNs are skipped for each unit.
+    """
+
+    v1 = np.asarray(v1, dtype=np.float64)
+
+    if v2 is not None:
+
+        if np.shape(v1) != np.shape(v2):
+
+            return "Invalid input"
+
+        v1 = v1 - np.asarray(v2, dtype=np.float64)
+
+    subs = np.shape(v1)[0]
+    shape = np.shape(v1)[1:]
+    x = np.reshape(v1, [subs, -1])
+
+    if flips is None:
+        flips = signflip_matrix(subs, iter=iter, seed=seed)
+
+    iter = len(flips)
+
+    tobs = signflip_tvalues(x, np.ones([1, subs]))[0]
+
+    if alternative == "two-sided":
+        tobs = np.abs(tobs)
+
+    ni = np.zeros([np.shape(x)[1]], dtype=int)
+    maxt = np.zeros([iter])
+
+    # a block of sign-flips at a time to limit the memory of the [block, n_units] permuted t-values
+    block = max(1, int(2**22 / np.shape(x)[1]))
+
+    for i in range(0, iter, block):
+
+        tperms = signflip_tvalues(x, flips[i:i+block])
+
+        if alternative == "two-sided":
+            tperms = np.abs(tperms)
+
+        # a tiny tolerance keeps the rounding errors of the matrix products from counting as smaller
+        ni = ni + np.sum(tperms >= tobs - 1e-12, axis=0)
+        maxt[i:i+block] = np.max(np.where(np.isnan(tperms), -np.inf, tperms), axis=1)
+
+    # count the maximum permuted t-values not smaller than the real t-values
+    nmax = iter - np.searchsorted(np.sort(maxt), tobs - 1e-12, side="left")
+
+    p = np.float64((ni + 1) / (iter + 1))
+    p_fwe = np.float64((nmax + 1) / (iter + 1))
+    p[np.isnan(tobs)] = np.nan
+    p_fwe[np.isnan(tobs)] = np.nan
+
+    return np.reshape(p, shape), np.reshape(p_fwe, shape)
+
+
+' a function for converting a batch of vectors to dense ranks '
+
+def dense_ranks(v):
+
+    """
+    Convert each vector of a batch to the dense ranks (integers from 0, the tied values get the same rank)
+
+    Parameters
+    ----------
+    v : array [m, n]
+        A batch of m vectors.
+
+    Returns
+    -------
+    ranks : array [m, n]
+        The dense ranks, the same as scipy.stats.rankdata(v, method="dense", axis=1) - 1 (for the vectors without NaN).
+    """
+
+    v = np.asarray(v, dtype=np.float64)
+
+    # one sort of all the vectors, a new rank starts where the sorted value changes
+    order = np.argsort(v, axis=1)
+    sortedv = np.take_along_axis(v, order, axis=1)
+
+    steps = np.zeros(np.shape(v), dtype=np.int64)
+    steps[:, 1:] = sortedv[:, 1:] != sortedv[:, :-1]
+
+    ranks = np.empty(np.shape(v), dtype=np.int64)
+    np.put_along_axis(ranks, order, np.cumsum(steps, axis=1), axis=1)
+
+    return ranks
+
+
+' a function for counting the discordant pairs of a batch of sequences by merge sort '
+
+def count_inversions(y):
+
+    """
+    Count the inversions (the pairs i < j with y[i] > y[j]) of each sequence by a bottom-up merge sort
+
+    Parameters
+    ----------
+    y : array [m, n]
+        A batch of m sequences of integers in range(n), such as dense ranks.
+
+    Returns
+    -------
+    inversions : array [m]
+        The numbers of the inversions.
+    ys : array [m, n]
+        The sorted sequences.
+
+    Notes
+    -----
+    All the sequences are merged level by level at the same time. At each level, the block, the value and the half
+    of the block of each value are packed into one integer key, and the two sorted halves of all the blocks are merged
+    by sorting the keys. The number of the values in the left half greater than a value in the right half is its
+    position in the block before merging minus its position in the block after merging, so only the positions of the
+    values from the right halves after merging are summed.
+    """
+
+    m, n = np.shape(y)
+
+    # the bits of a value or a position
+    nbits = max(1, int(n - 1).bit_length())
+
+    # the keys take 2*nbits bits
+    if 2 * nbits <= 31:
+        dtype = np.int32
+    else:
+        dtype = np.int64
+
+    pos = np.arange(n, dtype=dtype)
+    vmask = dtype(((1 << nbits) - 1) << 1)
+
+    inversions = np.zeros([m], dtype=np.int64)
+
+    # C order keeps the sorts along the rows contiguous
+    keys = np.asarray(y).astype(dtype, order="C") << 1
+    level = 0
+
+    while (1 << level) < n:
+
+        # the positions in the blocks of 2^(level+1) values
+        q = pos & ((2 << level) - 1)
+
+        # the keys: [block, value, half], the values of the left half go first on ties
+        np.bitwise_and(keys, vmask, out=keys)
+        np.bitwise_or(keys, ((pos >> (level + 1)) << (nbits + 1)) | ((pos >> level) & 1), out=keys)
+
+        # merge the two sorted halves of each block
+        keys.sort(axis=1)
+
+        # the values from the right halves: sum of (position before merging - position after merging)
+        inversions += np.sum(q[(q >> level) & 1 == 1]) - np.einsum("ij,j->i", keys & 1, q)
+
+        level = level + 1
+
+    return inversions, (keys & vmask) >> 1
+
+
+' a function for counting the tied pairs in the runs of sorted sequences '
+
+def count_ties(equal):
+
+    # equal : array [m, n-1], whether each value equals the previous value
+    m, n = np.shape(equal)[0], np.shape(equal)[1] + 1
+
+    # no ties (such as continuous values)
+    if not equal.any():
+        return np.zeros([m], dtype=np.int64)
+
+    idx = np.arange(1, n)
+
+    # the start of the run of each value
+    starts = np.maximum.accumulate(np.where(equal, 0, idx), axis=1)
+
+    # sum(t*(t-1)/2) over the runs = sum of the positions in the runs
+    return np.sum(idx - starts, axis=1)
+
+
+' a function for calculating the Kendall tau between a presorted vector and a batch of vectors '
+
+def kendall_tau_presorted(x, y, variant="b"):
+
+    """
+    Calculate the Kendall tau Correlations between a presorted vector and a batch of vectors
+
+    Parameters
+    ----------
+    x : array [n]
+        The sorted dense ranks (integers from 0) of vector 1.
+    y : array [m, n]
+        The dense ranks (integers from 0) of the vectors 2, in the sorted order of vector 1.
+    variant : string 'a' or 'b'. Default is 'b'.
+        The variant of Kendall tau.
+
+    Returns
+    -------
+    taus : array [m]
+        The Kendall tau Correlations.
+
+    Notes
+    -----
+    If vector 1 has only a few distinct values, the discordant pairs are counted group by group of the tied values of
+    vector 1 by the cumulative histograms of the vectors 2, otherwise by count_inversions().
+    """
+
+    m, n = np.shape(y)
+    nbits = max(1, int(n - 1).bit_length())
+
+    xequal = x[1:] == x[:-1]
+
+    # the bounds of the groups of the tied values in the vector 1
+    bounds = np.concatenate(([0], np.nonzero(xequal == False)[0] + 1, [n]))
+
+    if len(bounds) - 1 <= nbits:
+
+        # only a few distinct values in the vector 1 (such as a categorical model RDM)
+        # count the discordant pairs group by group with the cumulative histograms of the vectors 2
+        hist = np.zeros([m * n], dtype=np.int64)
+        offsets = (np.arange(m) * n)[:, None]
+
+        dis = np.zeros([m], dtype=np.int64)
+        ntie = np.zeros([m], dtype=np.int64)
+
+        for i in range(len(bounds) - 1):
+
+            yi = y[:, bounds[i]:bounds[i+1]]
+
+            # the values in the previous groups greater than each value in this group
+            if i > 0:
+                cum = np.cumsum(np.reshape(hist, [m, n]), axis=1)
+                dis += np.sum(bounds[i] - np.take_along_axis(cum, yi, axis=1), axis=1)
+
+            hist += np.bincount((offsets + yi).ravel(), minlength=m * n)
+
+            # the tied pairs in both
+            yi = np.sort(yi, axis=1)
+            ntie += count_ties(yi[:, 1:] == yi[:, :-1])
+
+        ys = np.sort(y, axis=1)
+
+    else:
+
+        # sort the vectors 2 within the ties of the vector 1 by sorting the keys [x, y]
+        if xequal.any():
+            y = (np.sort((x.astype(np.int64) << nbits) | y, axis=1)) & ((1 << nbits) - 1)
+
+        # the discordant pairs
+        dis, ys = count_inversions(y)
+
+        # the tied pairs in both
+        ntie = count_ties(xequal[None, :] & (y[:, 1:] == y[:, :-1]))
+
+    # the tied pairs in the vector 1 & the vectors 2
+    xtie = count_ties(xequal[None, :])[0]
+    ytie = count_ties(ys[:, 1:] == ys[:, :-1])
+
+    tot = n * (n - 1) / 2
+
+    con_minus_dis = tot - xtie - ytie + ntie - 2 * dis
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+
+        if variant == "b":
+            taus = con_minus_dis / np.sqrt(tot - xtie) / np.sqrt(tot - ytie)
+            taus[(xtie == tot) | (ytie == tot)] = np.nan
+        else:
+            taus = con_minus_dis / tot
+
+    return np.clip(taus, -1, 1)
+
+
+' a function for calculating the Kendall tau between a vector and a batch of vectors '
+
+def kendall_tau_batch(v1, v2s, variant="b"):
+
+    """
+    Calculate the Kendall tau Correlations between a vector and a batch of vectors
+
+    Parameters
+    ----------
+    v1 : array [n]
+        Vector 1, such as the upper triangle of a model RDM.
+    v2s : array [..., n]
+        The batch of vectors 2, such as the upper triangles of the neural RDMs.
+    variant : string 'a' or 'b'. Default is 'b'.
+        The variant of Kendall tau.
+        If variant='b', calculate tau-b (the same as scipy.stats.kendalltau), which adjusts for ties.
+        If variant='a', calculate tau-a, (concordant - discordant pairs) / all pairs, which is recommended for
+        comparing RDMs with a model RDM including ties in RSA.
+
+    Returns
+    -------
+    taus : array [...]
+        The Kendall tau Correlations. The shape is the leading dimensions of v2s.
+
+    Notes
+    -----
+    Vector 1 is sorted only once, then the discordant pairs of all the vectors 2 are counted by a merge sort
+    (Knight's algorithm) in O(n*log(n)) for each vector instead of O(n^2).
+    """
+
+    v1 = np.asarray(v1, dtype=np.float64)
+    v2s = np.asarray(v2s, dtype=np.float64)
+
+    n = len(v1)
+
+    if np.shape(v2s)[-1] != n or (variant != "a" and variant != "b"):
+
+        return "Invalid input"
+
+    shape = np.shape(v2s)[:-1]
+    v2s = np.reshape(v2s, [-1, n])
+
+    # sort the vector 1 once and convert it to dense ranks
+    x = np.unique(v1, return_inverse=True)[1].ravel()
+    order = np.argsort(x, kind="stable")
+
+    # convert the vectors 2 to dense ranks in the order of the vector 1
+    y = dense_ranks(v2s)[:, order]
+
+    taus = kendall_tau_presorted(x[order], y, variant=variant)
+
+    # the vectors including NaN get NaN
+    taus[np.isnan(v2s).any(axis=1) | np.isnan(v1).any()] = np.nan
+
+    return np.reshape(taus, shape)
+
+
+' a function for generating the permutation indices of the condition labels of RDMs (Mantel test) '
+
+def mantel_indices(n_cons, iter=1000, seed=None):
+
+    """
+    Generate the indices of the upper triangles of RDMs whose condition labels are permuted
+
+    Parameters
+    ----------
+    n_cons : int
+        The number of conditions of the RDMs.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator (numpy.random.default_rng).
+        Setting a seed makes the permutations reproducible.
+
+    Returns
+    -------
+    perms : array [iter, n_cons*(n_cons-1)/2]
+        The permutation indices. v[perms[i]] is the upper triangle (without the diagonal) of an RDM whose rows &
+        columns are permuted together, where v is the upper triangle of the RDM.
+
+    Notes
+    -----
+    The permutation indices can be used as the perms of permutation_corr_batch() for the Mantel test.
+    """
+
+    # the position of each pair of conditions in the upper triangle
+    iu = np.triu_indices(n_cons, 1)
+    positions = np.zeros([n_cons, n_cons], dtype=int)
+    positions[iu] = np.arange(len(iu[0]))
+    positions = positions + positions.T
+
+    # permute the condition labels
+    labels = permutation_indices(n_cons, iter=iter, seed=seed)
+
+    return positions[labels[:, iu[0]], labels[:, iu[1]]]
+
+
+' a function for permutation test for correlation coefficients '
+
+def permutation_corr(v1, v2, method="spearman", iter=1000, seed=None):
+
+    """
+    Conduct Permutation test for correlation coefficients
+
+    Parameters
+    ----------
+    v1 : array
+        Vector 1.
+    v2 : array
+        Vector 2.
+    method : string 'spearman' or 'pearson' or 'kendall'. Default is 'spearman'.
+        The method to calculate the similarities.
+        If method='spearman', calculate the Spearman Correlations. If method='pearson', calculate the Pearson
+        Correlations. If methd='kendall', calculate the Kendall tau Correlations.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutations.
+
+    Returns
+    -------
+    p : float
+        The permutation test result, p-value.
+    """
+
+    if len(v1) != len(v2):
+
+        return "Invalid input"
+
+    return permutation_corr_batch(v1, v2, method=method, iter=iter, seed=seed)
+
+
+' a function for permutation test for correlation coefficients between a vector and a batch of vectors '
+
+def permutation_corr_batch(v1, v2s, method="spearman", iter=1000, seed=None, perms=None):
+
+    """
+    Conduct Permutation test for correlation coefficients between a vector and a batch of vectors
+
+    Parameters
+    ----------
+    v1 : array [n]
+        Vector 1.
+    v2s : array [..., n]
+        The batch of vectors 2.
+    method : string 'spearman' or 'pearson' or 'kendall'. Default is 'spearman'.
+        The method to calculate the similarities.
+        If method='spearman', calculate the Spearman Correlations. If method='pearson', calculate the Pearson
+        Correlations. If methd='kendall', calculate the Kendall tau Correlations.
+    iter : int. Default is 1000.
+        The times for iteration.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the permutations.
+    perms : array [iter, n]. Default is None.
+        The permutation indices, such as the results of permutation_indices().
+        If perms is not None, iter & seed don't work and the same permutations can be reused in different calls.
+
+    Returns
+    -------
+    p : array [...]
+        The permutation test results, p-values. The shape is the leading dimensions of v2s.
+        The p-values of the vectors including NaN (or whose correlations are NaN) are NaNs.
+
+    Notes
+    -----
+    The same permutations of vector 1 are used for all the vectors in the batch. All the permuted correlations
+    (Spearman & Pearson) are calculated by matrix products of the standardized (ranked) vectors.
+    """
+
+    v1 = np.asarray(v1, dtype=np.float64)
+    v2s = np.asarray(v2s, dtype=np.float64)
+
+    n = len(v1)
+
+    if np.shape(v2s)[-1] != n:
+
+        return "Invalid input"
+
+    shape = np.shape(v2s)[:-1]
+    v2s = np.reshape(v2s, [-1, n])
+
+    if perms is None:
+        perms = permutation_indices(n, iter=iter, seed=seed)
+
+    iter = len(perms)
+
+    # count the permuted correlations greater than the real correlations
+    ni = np.zeros([len(v2s)], dtype=int)
+
+    if method == "spearman" or method == "pearson":
+
+        if method == "spearman":
+            nanrows = np.isnan(v2s).any(axis=1)
+            v1 = rankdata(v1)
+            v2s = rankdata(v2s, axis=1)
+            v2s[nanrows] = np.nan
 
-    if filename == None:
-        filename = "newmask.nii"
-    else:
-        q = ".nii" in filename
+        # standardize the vectors, then the correlations are the dot products
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z1 = (v1 - np.average(v1)) / np.linalg.norm(v1 - np.average(v1))
+            z2s = v2s - np.average(v2s, axis=1)[:, None]
+            z2s = z2s / np.linalg.norm(z2s, axis=1)[:, None]
 
-        if q == True:
-            filename = filename
-        else:
-            filename = filename+".nii"
+        rtest = np.dot(z2s, z1)
 
-    nib.save(file, filename)
+        # shape of zperms: [iter, n]
+        zperms = z1[perms]
 
-    return 0
+        # a block of vectors at a time to limit the memory of the [iter, block] permuted correlations
+        block = max(1, int(1e7 / (iter * n)))
 
+        for i in range(0, len(v2s), block):
+            rperms = np.dot(zperms, z2s[i:i+block].T)
+            # a tiny tolerance keeps the rounding errors of the matrix products from counting as greater
+            ni[i:i+block] = np.sum(rperms > rtest[i:i+block] + 1e-12, axis=0)
 
-' a function for permutation test '
+    elif method == "kendall" or method == "kendalltau":
 
-def permutation_test(v1, v2, iter=1000):
+        rtest = kendall_tau_batch(v1, v2s)
 
-    """
-    Conduct Permutation test
+        # sort the vector 1 once and convert the vectors to dense ranks
+        x = np.unique(v1, return_inverse=True)[1].ravel()
+        order = np.argsort(x, kind="stable")
+        y = dense_ranks(v2s)
 
-    Parameters
-    ----------
-    v1 : array
-        Vector 1.
-    v2 : array
-        Vector 2.
-    iter : int. Default is 1000.
-        The times for iteration.
+        # tau(v1[perm], v2) = tau(v1, v2[inverse of perm]), so the sorted vector 1 is reused for all the permutations
+        # the indices of the permuted vectors 2 in the sorted order of the vector 1
+        invperms = np.empty(np.shape(perms), dtype=np.int64)
+        invperms[np.arange(iter)[:, None], perms] = np.arange(n)
+        invperms = invperms[:, order]
 
-    Returns
-    -------
-    p : float
-        The permutation test result, p-value.
-    """
+        # the (vector, permutation) pairs of the vectors with a correlation, all counted by the same merge sorts
+        valid = np.nonzero(np.isnan(rtest) == False)[0]
+        npairs = len(valid) * iter
 
-    if len(v1) != len(v2):
+        # a block of pairs at a time to limit the memory (and keep the merge sorts in the cache)
+        block = max(1, int(2**21 / n))
 
-        return "Invalid input"
+        for k in range(0, npairs, block):
+            pairs = np.arange(k, min(k + block, npairs))
+            rows = valid[pairs // iter]
+            rperms = kendall_tau_presorted(x[order], y[rows[:, None], invperms[pairs % iter]])
+            ni = ni + np.bincount(rows, weights=rperms > rtest[rows] + 1e-12, minlength=len(v2s)).astype(int)
 
-    # permutation test
+    else:
 
-    diff = abs(np.average(v1) - np.average(v2))
-    v = np.hstack((v1, v2))
-    nv = v.shape[0]
-    ni = 0
+        return "Invalid input"
 
-    for i in range(iter):
-        vshuffle = np.random.permutation(v)
-        vshuffle1 = vshuffle[:int(nv/2)]
-        vshuffle2 = vshuffle[int(nv/2):]
-        diff_i = np.average(vshuffle1) - np.average(vshuffle2)
+    p = np.float64((ni+1)/(iter+1))
 
-        if diff_i >= diff:
-            ni = ni + 1
+    # the vectors with NaN (or with a NaN correlation) aren't tested
+    p[np.isnan(rtest) | np.isnan(v2s).any(axis=1)] = np.nan
 
-    # permunitation test p-value
-    p = np.float64(ni/iter)
+    if len(shape) == 0:
+        return p[0]
 
-    return p
+    return np.reshape(p, shape)
 
 
-' a function for permutation test for correlation coefficients '
+' a function for labelling the clusters of a significant map '
 
-def permutation_corr(v1, v2, method="spearman", iter=1000):
+def get_cluster_labels(m):
 
     """
-    Conduct Permutation test for correlation coefficients
+    Label the clusters (connected significant points) of a significant map
 
     Parameters
     ----------
-    v1 : array
-        Vector 1.
-    v2 : array
-        Vector 2.
-    method : string 'spearman' or 'pearson' or 'kendall' or 'similarity' or 'distance'. Default is 'spearman'.
-        The method to calculate the similarities.
-        If method='spearman', calculate the Spearman Correlations. If method='pearson', calculate the Pearson
-        Correlations. If methd='kendall', calculate the Kendall tau Correlations. If method='similarity', calculate the
-        Cosine Similarities. If method='distance', calculate the Euclidean Distances.
-    iter : int. Default is 1000.
-        The times for iteration.
+    m : array
+        A significant map of any dimension.
+        The values in m should be 0 (False) or 1 (True), which represent not significant point or significant point,
+        respectively.
 
     Returns
     -------
-    p : float
-        The permutation test result, p-value.
+    labels : array
+        The cluster-index map with the same shape as m. The points of the i-th cluster are labelled i (1, 2, ...) and
+        the other points are labelled 0.
+    n : int
+        The number of clusters.
+
+    Notes
+    -----
+    The points are connected with their neighbours along each axis (4-connectivity for 2-D maps). A single
+    significant point without any significant neighbour isn't a cluster.
     """
 
-    if len(v1) != len(v2):
+    labels, n = ndimage.label(np.asarray(m) == 1)
 
-        return "Invalid input"
+    # the isolated points aren't clusters, renumber the others in order
+    sizes = np.bincount(labels.ravel(), minlength=n+1)
+    sizes[0] = 0
+    keep = sizes > 1
 
-    # permutation test
+    relabel = np.zeros([n+1], dtype=int)
+    relabel[keep] = np.arange(1, np.sum(keep)+1)
 
-    if method == "spearman":
+    return relabel[labels], int(np.sum(keep))
 
-        rtest = spearmanr(v1, v2)[0]
 
-        ni = 0
+' a function for getting the maximum cluster masses of a batch of maps '
 
-        for i in range(iter):
-            v1shuffle = np.random.permutation(v1)
-            v2shuffle = np.random.permutation(v2)
-            rperm = spearmanr(v1shuffle, v2shuffle)[0]
+def get_cluster_max_masses(ms, ts):
 
-            if rperm>rtest:
-                ni = ni + 1
+    """
+    Get the maximum cluster mass of each map in a batch of significant maps
 
-    if method == "pearson":
-        print(iter)
-        rtest = pearsonr(v1, v2)[0]
+    Parameters
+    ----------
+    ms : array
+        The significant maps. The shape of ms must be [n_maps, ...]. The values in ms should be 0 (False) or 1 (True).
+    ts : array
+        The statistical maps (such as t-values) with the same shape as ms.
 
-        ni = 0
+    Returns
+    -------
+    max_masses : array
+        The maximum cluster masses (sums of the statistics within the clusters) of the maps. The shape of max_masses is
+        [n_maps]. If a map has no cluster, its maximum cluster mass is 0.
 
-        for i in range(iter):
-            v1shuffle = np.random.permutation(v1)
-            v2shuffle = np.random.permutation(v2)
-            rperm = pearsonr(v1shuffle, v2shuffle)[0]
+    Notes
+    -----
+    All the maps are labelled by one call of scipy.ndimage.label with a structure that doesn't connect the points of
+    different maps, and the masses of all the clusters are summed by one np.bincount.
+    """
 
-            if rperm>rtest:
-                ni = ni + 1
+    nmaps = np.shape(ms)[0]
 
-    if method == "kendalltau":
+    # connect the neighbours along each axis within the maps only
+    structure = np.zeros([3] * np.ndim(ms), dtype=bool)
+    structure[1] = ndimage.generate_binary_structure(np.ndim(ms) - 1, 1)
 
-        rtest = kendalltau(v1, v2)[0]
+    labels, n = ndimage.label(np.asarray(ms) == 1, structure)
+    labels = labels.ravel()
 
-        ni = 0
+    sizes = np.bincount(labels, minlength=n+1)
+    masses = np.bincount(labels, weights=np.ravel(ts), minlength=n+1)
 
-        for i in range(iter):
-            v1shuffle = np.random.permutation(v1)
-            v2shuffle = np.random.permutation(v2)
-            rperm = kendalltau(v1shuffle, v2shuffle)[0]
+    # the map of each cluster
+    maps = np.zeros([n+1], dtype=int)
+    maps[labels] = np.repeat(np.arange(nmaps), int(np.size(ms) / nmaps))
 
-            if rperm>rtest:
-                ni = ni + 1
+    # the isolated points aren't clusters
+    valid = sizes > 1
+    valid[0] = False
 
-    p = np.float64((ni+1)/(iter+1))
+    max_masses = np.zeros([nmaps])
+    np.maximum.at(max_masses, maps[valid], masses[valid])
 
-    return p
+    return max_masses
 
 
 ' a function for getting the 1-D & 1-sided cluster-index information '
@@ -827,21 +2209,7 @@ def get_cluster_index_1d_1sided(m):
         The number of clusters.
     """
 
-    x = np.shape(m)[0]
-    b = np.zeros([x+2])
-    b[1:x+1] = m
-
-    index_v = np.zeros([x])
-
-    index_n = 0
-    for i in range(x):
-        if b[i+1] == 1 and b[i] == 0 and b[i+2] == 1:
-            index_n = index_n + 1
-        if b[i+1] == 1:
-            if b[i] != 0 or b[i+2] != 0:
-                index_v[i] = index_n
-
-    return index_v, index_n
+    return get_cluster_labels(m)
 
 
 ' a function for getting the 1-D & 2-sided cluster-index information '
@@ -870,29 +2238,8 @@ def get_cluster_index_1d_2sided(m):
         The number of "less" clusters.
     """
 
-    x = np.shape(m)[0]
-    b = np.zeros([x+2])
-    b[1:x+1] = m
-
-    index_v1 = np.zeros([x])
-
-    index_n1 = 0
-    for i in range(x):
-        if b[i+1] == 1 and b[i] != 1 and b[i+2] == 1:
-            index_n1 = index_n1 + 1
-        if b[i+1] == 1:
-            if b[i] == 1 or b[i+2] == 1:
-                index_v1[i] = index_n1
-
-    index_v2 = np.zeros([x])
-
-    index_n2 = 0
-    for i in range(x):
-        if b[i + 1] == -1 and b[i] != -1 and b[i + 2] == -1:
-            index_n2 = index_n2 + 1
-        if b[i + 1] == -1:
-            if b[i] == -1 or b[i + 2] == -1:
-                index_v2[i] = index_n2
+    index_v1, index_n1 = get_cluster_labels(np.asarray(m) == 1)
+    index_v2, index_n2 = get_cluster_labels(np.asarray(m) == -1)
 
     return index_v1, index_n1, index_v2, index_n2
 
@@ -918,51 +2265,7 @@ def get_cluster_index_2d_1sided(m):
         The number of clusters.
     """
 
-    x, y = np.shape(m)
-    b = np.zeros([x+2, y+2])
-    b[1:x+1, 1:y+1] = m
-
-    index_m = np.zeros([x, y])
-
-    index_n = 0
-    for i in range(x):
-        for j in range(y):
-            ii = i + 1
-            jj = j + 1
-            if b[ii, jj] == 1 and (b[ii-1, jj]+b[ii+1, jj]+b[ii, jj-1]+b[ii, jj+1]) != 0:
-                min_index = index_n + 1
-                if b[ii - 1, jj] == 1:
-                    min_index = np.min([min_index, index_m[i - 1, j]])
-                if b[ii, jj - 1] == 1:
-                    min_index = np.min([min_index, index_m[i, j - 1]])
-                k1 = 0
-                while b[ii, jj - k1] == 1:
-                    index_m[i, j - k1] = min_index
-                    k1 = k1 + 1
-                k2 = 0
-                while b[ii - k2, jj] == 1:
-                    index_m[i - k2, j] = min_index
-                    k2 = k2 + 1
-                k = 0
-                while b[ii, jj + k] == 1:
-                    index_m[i, j + k] = min_index
-                    k = k + 1
-                k = 0
-                while b[ii + k, jj] == 1:
-                    index_m[i + k, j] = min_index
-                    k = k + 1
-                if b[ii, jj - 1] != 1:
-                    index_n = index_n + 1
-                    k = 0
-                    m = 0
-                    while b[ii, jj + k] == 1:
-                        if b[ii - 1, jj + k] == 1:
-                            m = 1
-                        k = k + 1
-                    if m == 1:
-                        index_n = index_n - 1
-
-    return index_m, index_n
+    return get_cluster_labels(m)
 
 
 ' a function for getting the 2-D & 2-sided cluster-index information '
@@ -991,99 +2294,297 @@ def get_cluster_index_2d_2sided(m):
         The "less" number of clusters.
     """
 
-    x, y = np.shape(m)
-    b1 = np.zeros([x+2, y+2])
-    b1[1:x+1, 1:y+1] = m
-    b2 = np.zeros([x+2, y+2])
-    b2[1:x+1, 1:y+1] = m
-    index_m1 = np.zeros([x, y])
-    index_m2 = np.zeros([x, y])
-    index_n1 = 0
-    index_n2 = 0
-
-    for i in range(x):
-        for j in range(y):
-            ii = i + 1
-            jj = j + 1
-            index = True
-            if b1[ii-1, jj] != 1 and b1[ii+1, jj] != 1 and b1[ii, jj-1] != 1 and b1[ii, jj+1] != 1:
-                index = False
-            if b1[ii, jj] == 1 and index == True:
-                min_index = index_n1 + 1
-                if b1[ii - 1, jj] == 1:
-                    min_index = np.min([min_index, index_m1[i - 1, j]])
-                if b1[ii, jj - 1] == 1:
-                    min_index = np.min([min_index, index_m1[i, j - 1]])
-                k1 = 0
-                while b1[ii, jj - k1] == 1:
-                    index_m1[i, j - k1] = min_index
-                    k1 = k1 + 1
-                k2 = 0
-                while b1[ii - k2, jj] == 1:
-                    index_m1[i - k2, j] = min_index
-                    k2 = k2 + 1
-                k = 0
-                while b1[ii, jj + k] == 1:
-                    index_m1[i, j + k] = min_index
-                    k = k + 1
-                k = 0
-                while b1[ii + k, jj] == 1:
-                    index_m1[i + k, j] = min_index
-                    k = k + 1
-                if b1[ii, jj - 1] != 1:
-                    index_n1 = index_n1 + 1
-                    k = 0
-                    m = 0
-                    while b1[ii, jj + k] == 1:
-                        if b1[ii - 1, jj + k] == 1:
-                            m = 1
-                        k = k + 1
-                    if m == 1:
-                        index_n1 = index_n1 - 1
-
-    for i in range(x):
-        for j in range(y):
-            ii = i + 1
-            jj = j + 1
-            index = True
-            if b2[ii - 1, jj] != -1 and b2[ii + 1, jj] != -1 and b2[ii, jj - 1] != -1 and b2[ii, jj + 1] != -1:
-                index = False
-            if b2[ii, jj] == -1 and index == True:
-                min_index = index_n2 + 1
-                if b2[ii - 1, jj] == -1:
-                    min_index = np.min([min_index, index_m2[i - 1, j]])
-                if b2[ii, jj - 1] == -1:
-                    min_index = np.min([min_index, index_m2[i, j - 1]])
-                k1 = 0
-                while b2[ii, jj - k1] == -1:
-                    index_m2[i, j - k1] = min_index
-                    k1 = k1 + 1
-                k2 = 0
-                while b2[ii - k2, jj] == -1:
-                    index_m2[i - k2, j] = min_index
-                    k2 = k2 + 1
-                k = 0
-                while b2[ii, jj + k] == -1:
-                    index_m2[i, j + k] = min_index
-                    k = k + 1
-                k = 0
-                while b2[ii + k, jj] == -1:
-                    index_m2[i + k, j] = min_index
-                    k = k + 1
-                if b2[ii, jj - 1] != -1:
-                    index_n2 = index_n2 + 1
-                    k = 0
-                    m = 0
-                    while b2[ii, jj + k] == -1:
-                        if b2[ii - 1, jj + k] == -1:
-                            m = 1
-                        k = k + 1
-                    if m == 1:
-                        index_n2 = index_n2 - 1
+    index_m1, index_n1 = get_cluster_labels(np.asarray(m) == 1)
+    index_m2, index_n2 = get_cluster_labels(np.asarray(m) == -1)
 
     return index_m1, index_n1, index_m2, index_n2
 
 
+' a function for cluster based permutation test by sign-flips '
+
+def clusterbased_permutation_signflip(x, p_threshold=0.05, iter=1000, sided=1, seed=None):
+
+    """
+    Cluster based permutation test (one-sample against 0) by sign-flips for results of any dimension
+
+    Parameters
+    ----------
+    x : array
+        The results (such as results-level or results1-results2).
+        The shape of x should be [n_subs, ...]. n_subs represents the number of subjects.
+    p_threshold : float. Default is 0.05.
+        The threshold of p-values (one-sided for each side) for the cluster-forming & the cluster-level test.
+    iter : int. Default is 1000.
+        The times for iteration.
+    sided : int 1 or 2. Default is 1.
+        If sided=1, test x > 0. If sided=2, test x > 0 and x < 0.
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the sign-flips.
+
+    Returns
+    -------
+    ps : array
+        The shape of ps is [...]. The values in ps should be 0 or 1 (or -1 if sided=2), which represent not
+        significant point or significantly greater point (or significantly less point) after cluster-based
+        permutation test.
+
+    Notes
+    -----
+    The surrogate t-maps of a block of sign-flips are given by one matrix product (see signflip_tvalues()) and the
+    clusters of all of them are labelled at once (see get_cluster_max_masses()). The cluster mass is the sum of the
+    t-values within a cluster, and each cluster is compared with the maximum cluster masses of the surrogate maps.
+    Only the points in the significant clusters are significant.
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    nsubs = np.shape(x)[0]
+    shape = np.shape(x)[1:]
+    x = np.reshape(x, [nsubs, -1])
+
+    ts = np.reshape(signflip_tvalues(x, np.ones([1, nsubs]))[0], shape)
+
+    # the cluster-forming thresholds of the t-values
+    tcrit = np.reshape(stdtrit(np.sum(~np.isnan(x), axis=0) - 1, 1 - p_threshold), shape)
+
+    ps = np.zeros(shape)
+    ps[ts > tcrit] = 1
+
+    signs = [1]
+    if sided == 2:
+        ps[ts < -tcrit] = -1
+        signs = [1, -1]
+
+    clusters = [get_cluster_labels(ps == sign) for sign in signs]
+
+    # the isolated significant points aren't in any cluster
+    for k, sign in enumerate(signs):
+        ps[(ps == sign) & (clusters[k][0] == 0)] = 0
+
+    if np.sum([cluster[1] for cluster in clusters]) == 0:
+        return ps
+
+    flips = signflip_matrix(nsubs, iter=iter, seed=seed)
+
+    permu_ts = np.zeros([len(signs), iter])
+    print("\nPermutation test")
+
+    # a block of surrogate t-maps at a time to limit the memory
+    block = max(1, int(2**22 / np.shape(x)[1]))
+
+    for i in range(0, iter, block):
+
+        tperms = np.reshape(signflip_tvalues(x, flips[i:i+block]), (-1,) + shape)
+
+        for k, sign in enumerate(signs):
+            permu_ts[k, i:i+block] = get_cluster_max_masses(sign * tperms > tcrit, sign * tperms)
+
+        show_progressbar("Calculating", min(i+block, iter)*100/iter)
+
+    print("\nCluster-based permutation test finished!\n")
+
+    for k, sign in enumerate(signs):
+
+        cluster_index, cluster_n = clusters[k]
+
+        if cluster_n == 0:
+            continue
+
+        cluster_ts = np.bincount(cluster_index.ravel(), weights=sign * ts.ravel(), minlength=cluster_n+1)[1:]
+
+        # the number of the surrogate maximum masses smaller than the mass of each cluster
+        index = np.sum(permu_ts[k][:, None] < cluster_ts, axis=0)
+
+        # drop the clusters that aren't significant
+        drop = np.concatenate(([False], index < iter * (1 - p_threshold)))
+        ps[drop[cluster_index]] = 0
+
+    return ps
+
+
+' a function for threshold-free cluster enhancement of a batch of maps '
+
+def tfce_maps(ts, E=0.5, H=2, dh=0.1):
+
+    """
+    Threshold-free cluster enhancement (TFCE) of the positive values of a batch of maps
+
+    Parameters
+    ----------
+    ts : array
+        The statistical maps (such as t-values). The shape of ts must be [n_maps, ...].
+    E : float. Default is 0.5.
+        The exponent of the cluster extent.
+    H : float. Default is 2.
+        The exponent of the threshold (height).
+    dh : float. Default is 0.1.
+        The step of the thresholds.
+
+    Returns
+    -------
+    enhanced : array
+        The TFCE values with the same shape as ts. The points whose values are lower than dh (or NaNs) get 0.
+
+    Notes
+    -----
+    The TFCE value of a point p is the sum of e(h)^E * h^H * dh over the thresholds h = dh, 2*dh, ... not higher than
+    the value of p, where e(h) is the extent of the cluster containing p at the threshold h.
+    The values are sorted once. The thresholds are visited from the highest one and the points above each threshold
+    are added incrementally by the sorted order, so only the points already above the threshold are updated. All the
+    maps are labelled together at each threshold by scipy.ndimage.label with a structure that doesn't connect the
+    points of different maps.
+    """
+
+    ts = np.asarray(ts, dtype=np.float64)
+    shape = np.shape(ts)
+
+    # NaNs are never above a threshold
+    values = np.where(np.isnan(ts), -np.inf, ts).ravel()
+
+    # sort the values once (descending)
+    order = np.argsort(-values, kind="stable")
+    sortedv = values[order]
+
+    # connect the neighbours along each axis within the maps only
+    structure = np.zeros([3] * len(shape), dtype=bool)
+    structure[1] = ndimage.generate_binary_structure(len(shape) - 1, 1)
+
+    mask = np.zeros([len(values)], dtype=bool)
+    enhanced = np.zeros([len(values)])
+
+    nsteps = int(sortedv[0] / dh) if sortedv[0] > 0 else 0
+    n = 0
+
+    for k in range(nsteps, 0, -1):
+
+        h = k * dh
+
+        # add the points whose values are not lower than h
+        nabove = np.searchsorted(-sortedv, -h, side="right")
+        mask[order[n:nabove]] = True
+        n = nabove
+
+        labels = ndimage.label(np.reshape(mask, shape), structure)[0].ravel()
+
+        # the extents of the clusters containing the points above h
+        index = order[:n]
+        extents = np.bincount(labels[index])
+        enhanced[index] = enhanced[index] + extents[labels[index]] ** E * h ** H * dh
+
+    return np.reshape(enhanced, shape)
+
+
+' a function for threshold-free cluster enhancement '
+
+def tfce(ts, E=0.5, H=2, dh=0.1):
+
+    """
+    Threshold-free cluster enhancement (TFCE) for 1-D, 2-D or 3-D results
+
+    Parameters
+    ----------
+    ts : array
+        The statistical map (such as t-values), such as a time course [n_ts], a temporal generalization matrix
+        [n_ts, n_ts] or a searchlight map [n_x, n_y, n_z].
+    E : float. Default is 0.5.
+        The exponent of the cluster extent.
+    H : float. Default is 2.
+        The exponent of the threshold (height).
+    dh : float. Default is 0.1.
+        The step of the thresholds.
+
+    Returns
+    -------
+    enhanced : array
+        The TFCE map with the same shape as ts. The positive values are enhanced by the positive clusters and the
+        negative values are enhanced (negatively) by the negative clusters.
+    """
+
+    ts = np.asarray(ts, dtype=np.float64)[None]
+
+    return tfce_maps(ts, E, H, dh)[0] - tfce_maps(-ts, E, H, dh)[0]
+
+
+' a function for TFCE based permutation test by sign-flips '
+
+def tfce_permutation_signflip(x, iter=1000, sided=1, E=0.5, H=2, dh=0.1, seed=None):
+
+    """
+    TFCE based permutation test (one-sample against 0) by sign-flips for results of any dimension
+
+    Parameters
+    ----------
+    x : array
+        The results (such as results-level or results1-results2).
+        The shape of x should be [n_subs, ...]. n_subs represents the number of subjects.
+    iter : int. Default is 1000.
+        The times for iteration.
+    sided : int 1 or 2. Default is 1.
+        If sided=1, test x > 0. If sided=2, test x > 0 and x < 0.
+    E : float. Default is 0.5.
+        The exponent of the cluster extent.
+    H : float. Default is 2.
+        The exponent of the threshold (height).
+    dh : float. Default is 0.1.
+        The step of the thresholds (t-values).
+    seed : int or numpy.random.Generator. Default is None.
+        The seed of the random number generator for the sign-flips.
+
+    Returns
+    -------
+    enhanced : array
+        The TFCE map of the t-values. The shape of enhanced is [...].
+    p_fwe : array
+        The FWE-corrected p-values by the maximum TFCE value of the sign-flipped maps. The shape of p_fwe is [...].
+
+    Notes
+    -----
+    The t-maps of a block of sign-flips are given by one matrix product (see signflip_tvalues()) and enhanced together
+    (see tfce_maps()).
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    nsubs = np.shape(x)[0]
+    shape = np.shape(x)[1:]
+    x = np.reshape(x, [nsubs, -1])
+
+    ts = np.reshape(signflip_tvalues(x, np.ones([1, nsubs])), (1,) + shape)
+
+    enhanced = tfce_maps(ts, E, H, dh)[0]
+    if sided == 2:
+        enhanced = enhanced - tfce_maps(-ts, E, H, dh)[0]
+
+    flips = signflip_matrix(nsubs, iter=iter, seed=seed)
+
+    permu_tfces = np.zeros([iter])
+    print("\nPermutation test")
+
+    # a block of sign-flipped maps at a time to limit the memory
+    block = max(1, int(2**20 / np.shape(x)[1]))
+
+    for i in range(0, iter, block):
+
+        tperms = np.reshape(signflip_tvalues(x, flips[i:i+block]), (-1,) + shape)
+        axis = tuple(range(1, len(shape)+1))
+
+        permu_tfces[i:i+block] = np.max(tfce_maps(tperms, E, H, dh), axis=axis)
+        if sided == 2:
+            permu_tfces[i:i+block] = np.maximum(permu_tfces[i:i+block], np.max(tfce_maps(-tperms, E, H, dh), axis=axis))
+
+        show_progressbar("Calculating", min(i+block, iter)*100/iter)
+
+    print("\nTFCE permutation test finished!\n")
+
+    # count the maximum TFCE values not smaller than the real TFCE values
+    # a tiny tolerance keeps the rounding errors from counting as smaller
+    stat = np.abs(enhanced) if sided == 2 else enhanced
+    ni = iter - np.searchsorted(np.sort(permu_tfces), stat - 1e-12, side="left")
+
+    p_fwe = np.float64((ni + 1) / (iter + 1))
+    p_fwe[np.isnan(ts[0])] = np.nan
+
+    return enhanced, p_fwe
+
+
 ' a function for 1-sample & 1-sided cluster based permutation test for 1-D results '
 
 def clusterbased_permutation_1d_1samp_1sided(results, level=0, p_threshold=0.05, iter=1000):
@@ -1111,57 +2612,7 @@ def clusterbased_permutation_1d_1samp_1sided(results, level=0, p_threshold=0.05,
         point after cluster-based permutation test, respectively.
     """
 
-    nsubs, x = np.shape(results)
-
-    ps = np.zeros([x])
-    ts = np.zeros([x])
-    for t in range(x):
-        ts[t], p = ttest_1samp(results[:, t], level, alternative='greater')
-        if p < p_threshold and ts[t] > 0:
-            ps[t] = 1
-        else:
-            ps[t] = 0
-
-    cluster_index, cluster_n = get_cluster_index_1d_1sided(ps)
-    print(cluster_n)
-
-    if cluster_n != 0:
-        cluster_ts = np.zeros([cluster_n])
-        for i in range(cluster_n):
-            for t in range(x):
-                if cluster_index[t] == i + 1:
-                    cluster_ts[i] = cluster_ts[i] + ts[t]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("\nPermutation test")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n])
-            for j in range(cluster_n):
-                for t in range(x):
-                    if cluster_index[t] == j + 1:
-                        v = np.hstack((results[:, t], chance))
-                        vshuffle = np.random.permutation(v)
-                        v1 = vshuffle[:nsubs]
-                        v2 = vshuffle[nsubs:]
-                        permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nCluster-based permutation test finished!\n")
-
-        for i in range(cluster_n):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t in range(x):
-                    if cluster_index[t] == i + 1:
-                        ps[t] = 0
-
-    return ps
+    return clusterbased_permutation_signflip(np.asarray(results) - level, p_threshold=p_threshold, iter=iter, sided=1)
 
 
 ' a function for 1-sample & 2-sided cluster based permutation test for 1-D results '
@@ -1191,96 +2642,7 @@ def clusterbased_permutation_1d_1samp_2sided(results, level=0, p_threshold=0.05,
         significantly greater point or significantly less point after cluster-based permutation test, respectively.
     """
 
-    nsubs, x = np.shape(results)
-
-    ps = np.zeros([x])
-    ts = np.zeros([x])
-    for t in range(x):
-        ts[t], p = ttest_1samp(results[:, t], level, alternative='greater')
-        if p < p_threshold and ts[t] > 0:
-            ps[t] = 1
-        ts[t], p = ttest_1samp(results[:, t], level, alternative='less')
-        if p < p_threshold and ts[t] < 0:
-            ps[t] = -1
-
-    cluster_index1, cluster_n1, cluster_index2, cluster_n2 = get_cluster_index_1d_2sided(ps)
-    print(cluster_n1, cluster_n2)
-
-    if cluster_n1 != 0:
-        cluster_ts = np.zeros([cluster_n1])
-        for i in range(cluster_n1):
-            for t in range(x):
-                if cluster_index1[t] == i + 1:
-                    cluster_ts[i] = cluster_ts[i] + ts[t]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("\nPermutation test\n")
-        print("Side 1 begin:")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n1])
-            for j in range(cluster_n1):
-                for t in range(x):
-                    if cluster_index1[t] == j + 1:
-                        v = np.hstack((results[:, t], chance))
-                        vshuffle = np.random.permutation(v)
-                        v1 = vshuffle[:nsubs]
-                        v2 = vshuffle[nsubs:]
-                        permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 1 finished!\n")
-
-        for i in range(cluster_n1):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t in range(x):
-                    if cluster_index1[t] == i + 1:
-                        ps[t] = 0
-
-    if cluster_n1 != 0:
-        cluster_ts = np.zeros([cluster_n2])
-        for i in range(cluster_n2):
-            for t in range(x):
-                if cluster_index2[t] == i + 1:
-                    cluster_ts[i] = cluster_ts[i] + ts[t]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("Side 2 begin:\n")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n2])
-            for j in range(cluster_n2):
-                for t in range(x):
-                    if cluster_index2[t] == j + 1:
-                        v = np.hstack((results[:, t], chance))
-                        vshuffle = np.random.permutation(v)
-                        v1 = vshuffle[:nsubs]
-                        v2 = vshuffle[nsubs:]
-                        permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="less")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 2 finished!\n")
-                print("Cluster-based permutation test finished!\n")
-
-        for i in range(cluster_n2):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] < permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t in range(x):
-                    if cluster_index2[t] == i + 1:
-                        ps[t] = 0
-
-    return ps
+    return clusterbased_permutation_signflip(np.asarray(results) - level, p_threshold=p_threshold, iter=iter, sided=2)
 
 
 ' a function for 1-sample & 1-sided cluster based permutation test for 2-D results '
@@ -1310,61 +2672,7 @@ def clusterbased_permutation_2d_1samp_1sided(results, level=0, p_threshold=0.05,
         significant point after cluster-based permutation test, respectively.
     """
 
-    nsubs, x1, x2 = np.shape(results)
-
-    ps = np.zeros([x1, x2])
-    ts = np.zeros([x1, x2])
-    for t1 in range(x1):
-        for t2 in range(x2):
-            ts[t1, t2], p = ttest_1samp(results[:, t1, t2], level, alternative='greater')
-            if p < p_threshold and ts[t1, t2] > 0:
-                ps[t1, t2] = 1
-            else:
-                ps[t1, t2] = 0
-
-    cluster_index, cluster_n = get_cluster_index_2d_1sided(ps)
-    print(cluster_n)
-
-    if cluster_n != 0:
-        cluster_ts = np.zeros([cluster_n])
-        for i in range(cluster_n):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("\nPermutation test")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n])
-            for j in range(cluster_n):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index[t1, t2] == j + 1:
-                            v = np.hstack((results[:, t1, t2], chance))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nCluster-based permutation test finished!\n")
-
-        for i in range(cluster_n):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
-
-    return ps
+    return clusterbased_permutation_signflip(np.asarray(results) - level, p_threshold=p_threshold, iter=iter, sided=1)
 
 
 ' a function for 1-sample & 2-sided cluster based permutation test for 2-D results '
@@ -1380,7 +2688,7 @@ def clusterbased_permutation_2d_1samp_2sided(results, level=0, p_threshold=0.05,
         A result matrix.
         The shape of results should be [n_subs, x1, x2]. n_subs represents the number of subjects.
     level : float. Default is 0.
-        A expected value in null hypothesis. (Here, results > level)
+        An expected value in null hypothesis. (Here, results > level)
     p_threshold : float. Default is 0.05.
         The threshold of p-values.
     iter : int. Default is 1000.
@@ -1391,104 +2699,10 @@ def clusterbased_permutation_2d_1samp_2sided(results, level=0, p_threshold=0.05,
     p : float
         The permutation test result, p-value.
         The shape of p is [x1, x2]. The values in ps should be 0 or 1 or -1, which represent not significant point or
-        significantly greater point or significantly less point after cluster-based permutation test, respectively.
+        significantly greater point or significantly less point after cluster-based permutation test.
     """
 
-    nsubs, x1, x2 = np.shape(results)
-
-    ps = np.zeros([x1, x2])
-    ts = np.zeros([x1, x2])
-    for t1 in range(x1):
-        for t2 in range(x2):
-            ts[t1, t2], p = ttest_1samp(results[:, t1, t2], level, alternative='greater')
-            if p < p_threshold and ts[t1, t2] > 0:
-                ps[t1, t2] = 1
-            ts[t1, t2], p = ttest_1samp(results[:, t1, t2], level, alternative='less')
-            if p < p_threshold and ts[t1, t2] < 0:
-                ps[t1, t2] = -1
-
-    cluster_index1, cluster_n1, cluster_index2, cluster_n2 = get_cluster_index_2d_2sided(ps)
-    print(cluster_n1, cluster_n2)
-
-    if cluster_n1 != 0:
-        cluster_ts = np.zeros([cluster_n1])
-        for i in range(cluster_n1):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index1[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("\nPermutation test\n")
-        print("Side 1 begin:")
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n1])
-            for j in range(cluster_n1):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index1[t1, t2] == j + 1:
-                            v = np.hstack((results[:, t1, t2], chance))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 1 finished!\n")
-
-        for i in range(cluster_n1):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index1[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
-
-    if cluster_n2 != 0:
-        cluster_ts = np.zeros([cluster_n2])
-        for i in range(cluster_n2):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index2[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        chance = np.full([nsubs], level)
-        print("Side 2 begin:\n")
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n2])
-            for j in range(cluster_n2):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index2[t1, t2] == j + 1:
-                            v = np.hstack((results[:, t1, t2], chance))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="less")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 2 finished!\n")
-                print("Cluster-based permutation test finished!\n")
-
-        for i in range(cluster_n2):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] < permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1-p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index2[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
-
-    return ps
+    return clusterbased_permutation_signflip(np.asarray(results) - level, p_threshold=p_threshold, iter=iter, sided=2)
 
 
 ' a function for 1-sided cluster based permutation test for 2-D results '
@@ -1519,69 +2733,12 @@ def clusterbased_permutation_2d_1sided(results1, results2, p_threshold=0.05, ite
         significant point after cluster-based permutation test.
     """
 
-    nsubs1, x11, x12 = np.shape(results1)
-    nsubs2, x21, x22 = np.shape(results2)
-
-    if nsubs1 != nsubs2 and x11 != x21 and x12 != x22:
+    if np.shape(results1) != np.shape(results2) or len(np.shape(results1)) != 3:
 
         return "Invalid input!"
 
-    nsubs = nsubs1
-    x1 = x11
-    x2 = x12
-
-    ps = np.zeros([x1, x2])
-    ts = np.zeros([x1, x2])
-    for t1 in range(x1):
-        for t2 in range(x2):
-            ts[t1, t2], p = ttest_rel(results1[:, t1, t2], results2[:, t1, t2], alternative="greater")
-            if p < p_threshold and ts[t1, t2] > 0:
-                ps[t1, t2] = 1
-            else:
-                ps[t1, t2] = 0
-
-    cluster_index, cluster_n = get_cluster_index_2d_1sided(ps)
-    print(cluster_n)
-
-    if cluster_n != 0:
-        cluster_ts = np.zeros([cluster_n])
-        for i in range(cluster_n):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        print("\nPermutation test")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n])
-            for j in range(cluster_n):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index[t1, t2] == j + 1:
-                            v = np.hstack((results1[:, t1, t2], results2[:, t1, t2]))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nCluster-based permutation test finished!\n")
-
-        for i in range(cluster_n):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1 - p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
-
-    return ps
+    return clusterbased_permutation_signflip(np.asarray(results1) - np.asarray(results2), p_threshold=p_threshold,
+                                             iter=iter, sided=1)
 
 
 ' a function for 2-sided cluster based permutation test for 2-D results '
@@ -1612,110 +2769,113 @@ def clusterbased_permutation_2d_2sided(results1, results2, p_threshold=0.05, ite
         significantly greater point or significantly less point after cluster-based permutation test.
     """
 
-    nsubs1, x11, x12 = np.shape(results1)
-    nsubs2, x21, x22 = np.shape(results2)
-
-    if nsubs1 != nsubs2 and x11 != x21 and x12 != x22:
+    if np.shape(results1) != np.shape(results2) or len(np.shape(results1)) != 3:
 
         return "Invalid input!"
 
-    nsubs = nsubs1
-    x1 = x11
-    x2 = x12
-
-    ps = np.zeros([x1, x2])
-    ts = np.zeros([x1, x2])
-    for t1 in range(x1):
-        for t2 in range(x2):
-            ts[t1, t2], p = ttest_rel(results1[:, t1, t2], results2[:, t1, t2], alternative="greater")
-            if p < p_threshold and ts[t1, t2] > 0:
-                ps[t1, t2] = 1
-            ts[t1, t2], p = ttest_rel(results1[:, t1, t2], results2[:, t1, t2], alternative="less")
-            if p < p_threshold and ts[t1, t2] < 0:
-                ps[t1, t2] = -1
-
-    cluster_index1, cluster_n1, cluster_index2, cluster_n2 = get_cluster_index_2d_2sided(ps)
-    print(cluster_n1, cluster_n2)
-
-    if cluster_n1 != 0:
-        cluster_ts = np.zeros([cluster_n1])
-        for i in range(cluster_n1):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index1[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        print("\nPermutation test\n")
-        print("Side 1 begin:")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n1])
-            for j in range(cluster_n1):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index1[t1, t2] == j + 1:
-                            v = np.hstack((results1[:, t1, t2], results2[:, t1, t2]))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="greater")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 1 finished!\n")
-
-        for i in range(cluster_n1):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] > permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1 - p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index1[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
-
-    if cluster_n2 != 0:
-        cluster_ts = np.zeros([cluster_n2])
-        for i in range(cluster_n2):
-            for t1 in range(x1):
-                for t2 in range(x2):
-                    if cluster_index2[t1, t2] == i + 1:
-                        cluster_ts[i] = cluster_ts[i] + ts[t1, t2]
-
-        permu_ts = np.zeros([iter])
-        print("Side 2 begin:\n")
-
-        for i in range(iter):
-            permu_cluster_ts = np.zeros([cluster_n2])
-            for j in range(cluster_n2):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index2[t1, t2] == j + 1:
-                            v = np.hstack((results1[:, t1, t2], results2[:, t1, t2]))
-                            vshuffle = np.random.permutation(v)
-                            v1 = vshuffle[:nsubs]
-                            v2 = vshuffle[nsubs:]
-                            permu_cluster_ts[j] = permu_cluster_ts[j] + ttest_rel(v1, v2, alternative="less")[0]
-            permu_ts[i] = np.max(permu_cluster_ts)
-            show_progressbar("Calculating", (i+1)*100/iter)
-            if i == (iter - 1):
-                print("\nSide 2 finished!\n")
-                print("Cluster-based permutation test finished!\n")
-
-        for i in range(cluster_n2):
-            index = 0
-            for j in range(iter):
-                if cluster_ts[i] < permu_ts[j]:
-                    index = index + 1
-            if index < iter * (1 - p_threshold):
-                for t1 in range(x1):
-                    for t2 in range(x2):
-                        if cluster_index2[t1, t2] == i + 1:
-                            ps[t1, t2] = 0
+    return clusterbased_permutation_signflip(np.asarray(results1) - np.asarray(results2), p_threshold=p_threshold,
+                                             iter=iter, sided=2)
 
-    return ps
+
+' a function for copying an array into shared memory '
+
+def to_shared_memory(array):
+
+    """
+    Copy an array into a block of shared memory, so that it can be used by other processes without pickling
+
+    Parameters
+    ----------
+    array : array
+        The array.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The block of shared memory. Call shm.close() and shm.unlink() after use.
+    shared : array
+        The copy of the array in the shared memory.
+    """
+
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    shared[...] = array
+
+    return shm, shared
+
+
+' a function for getting an array from shared memory '
+
+def from_shared_memory(name, shape, dtype):
+
+    """
+    Get an array from a block of shared memory created by to_shared_memory()
+
+    Parameters
+    ----------
+    name : string
+        The name of the block of shared memory (shm.name).
+    shape : tuple
+        The shape of the array.
+    dtype : data-type
+        The data type of the array.
+
+    Returns
+    -------
+    shm : multiprocessing.shared_memory.SharedMemory
+        The block of shared memory. Keep a reference to it as long as the array is used.
+    shared : array
+        The array in the shared memory.
+    """
+
+    shm = shared_memory.SharedMemory(name=name)
+
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+' a function for running tasks in a pool of processes '
+
+def pool_imap(function, tasks, n_jobs=2, initializer=None, initargs=()):
+
+    """
+    Run tasks in a pool of processes and yield the results in the order of the tasks
+
+    Parameters
+    ----------
+    function : function
+        A module-level function applied to each task.
+    tasks : iterable
+        The tasks. They are generated lazily, and at most 2*n_jobs tasks are pending at the same time.
+    n_jobs : int. Default is 2.
+        The number of processes. If n_jobs=-1, all the CPUs are used.
+    initializer : function. Default is None.
+        A function called once by each process at its start.
+    initargs : tuple. Default is ().
+        The arguments of the initializer.
+
+    Returns
+    -------
+    results : generator
+        The results of the tasks, in the order of the tasks.
+    """
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer, initargs=initargs) as executor:
+
+        pending = deque()
+
+        for task in tasks:
+
+            pending.append(executor.submit(function, task))
+
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+
+        while len(pending) > 0:
+            yield pending.popleft().result()
 
 
 ' a function for showing the progress bar '
@@ -7,6 +7,7 @@ __author__ = 'Zitong Lu'
 import numpy as np
 import unittest
 from neurora.corr_cal_by_rdm import rdms_corr, fmrirdms_corr
+from neurora.stuff import CondensedRDM
 
 class test_corr_cal_by_rdm(unittest.TestCase):
 
@@ -29,6 +30,13 @@ class test_corr_cal_by_rdm(unittest.TestCase):
         output = rdms_corr(demo_rdm, eeg_rdms)
         self.assertEqual(output.shape[0], 3)
 
+        eeg_rdms = CondensedRDM(np.random.rand(3, 4, 28))
+        output = rdms_corr(demo_rdm, eeg_rdms)
+        self.assertEqual(output.shape, (3, 4, 2))
+
+        output = rdms_corr(demo_rdm, eeg_rdms, method="pearson", permutation=True, mantel=True, seed=0)
+        self.assertEqual(output.shape, (3, 4, 2))
+
         eeg_rdms = np.random.rand(2, 3, 4, 5, 8, 8)
         output = rdms_corr(demo_rdm, eeg_rdms)
         self.assertEqual(output, "Invalid input!")
@@ -44,5 +52,9 @@ class test_corr_cal_by_rdm(unittest.TestCase):
         output = fmrirdms_corr(demo_rdm, fmri_rdms)
         self.assertEqual(output, "Invalid input!")
 
+        fmri_rdms = np.random.rand(3, 4, 5, 28)
+        output = fmrirdms_corr(demo_rdm, fmri_rdms)
+        self.assertEqual(output.shape, (3, 4, 5, 2))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
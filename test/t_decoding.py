@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+' a module for testing neurora.decoding module '
+
+__author__ = 'Zitong Lu'
+
+import numpy as np
+import unittest
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.linear_model import RidgeClassifier
+from sklearn.model_selection import train_test_split
+from neurora.decoding import linear_classifiers_fit, linear_classifiers_predict, decoding_pseudo_trials, \
+    decoding_smooth_1d, decoding_smooth_2d, tbyt_decoding_kfold, tbyt_decoding_holdout, ct_decoding_kfold, \
+    ct_decoding_holdout, bidirectional_transfer_decoding
+
+class test_decoding(unittest.TestCase):
+
+    def test_linear_classifiers(self):
+
+        rng = np.random.default_rng(0)
+
+        for n, nfeatures in [(2, 8), (3, 8), (2, 100)]:
+
+            labels = np.repeat(np.arange(n), 20)
+            x = rng.standard_normal([20 * n, nfeatures, 4]) + labels[:, None, None] * \
+                rng.standard_normal([1, nfeatures, 1])
+            train_index, test_index = train_test_split(np.arange(20 * n), test_size=0.3, random_state=0,
+                                                       stratify=labels)
+
+            for classifier, model in [("lda", LinearDiscriminantAnalysis(solver="lsqr", shrinkage="auto")),
+                                      ("ridge", RidgeClassifier(alpha=1))]:
+
+                weights, biases = linear_classifiers_fit(x[train_index], labels[train_index], n, classifier)
+                predictions = linear_classifiers_predict(weights, biases, x[test_index], n, classifier)
+                self.assertEqual(predictions.shape, (4, len(test_index)))
+
+                for t in range(4):
+                    model.fit(x[train_index, :, t], labels[train_index])
+                    self.assertTrue(np.array_equal(predictions[t], model.predict(x[test_index, :, t])))
+
+        output = linear_classifiers_fit(x, labels, 2, classifier="knn")
+        self.assertEqual(output, "Invalid input!")
+
+    def test_decoding_pseudo_trials(self):
+
+        # the categories of 23 trials (5, 8 & 10 trials) & a trial to ignore
+        labels = np.array([2, 0, 1, 1, 2, 0, 2, 1, 0, 2, 1, 2, 0, 1, 2, 2, 1, -1, 2, 1, 0, 2, 1, 2])
+        # the single feature of each trial is a unique power of 2, so the sum of the trials identifies them
+        data = np.reshape(2.0 ** np.arange(len(labels)), [len(labels), 1, 1]) * np.ones([1, 1, 3])
+
+        pseudo = decoding_pseudo_trials(data, labels, n=3, navg=2, nrepeats=4, rng=0)
+
+        # int(5 / 2) = 2 pseudo-trials of each category
+        self.assertEqual(pseudo.shape, (4, 3, 2, 1, 3))
+
+        for i in range(4):
+            for k in range(3):
+                used = []
+                for j in range(2):
+                    total = int(round(pseudo[i, k, j, 0, 0] * 2))
+                    trials = [index for index in range(len(labels)) if total >> index & 1]
+                    # each pseudo-trial is the average of navg distinct trials of the category
+                    self.assertEqual(len(trials), 2)
+                    self.assertTrue(np.all(labels[trials] == k))
+                    used = used + trials
+                # the pseudo-trials of a category don't share trials
+                self.assertEqual(len(set(used)), len(used))
+
+        # the repeats are shuffled independently
+        self.assertFalse(np.array_equal(pseudo[0], pseudo[1]) and np.array_equal(pseudo[1], pseudo[2]))
+
+    def test_decoding_smooth(self):
+
+        for nts in [1, 3, 4, 8]:
+
+            acc = np.random.rand(2, nts, nts)
+
+            # the average of the 5 (5*5) neighbours truncated at the edges
+            smooth_acc = np.zeros([2, nts, nts])
+            for t1 in range(nts):
+                for t2 in range(nts):
+                    smooth_acc[:, t1, t2] = np.average(acc[:, max(t1-2, 0):t1+3, max(t2-2, 0):t2+3], axis=(1, 2))
+
+            self.assertTrue(np.allclose(decoding_smooth_2d(acc), smooth_acc))
+            self.assertTrue(np.allclose(decoding_smooth_1d(acc[:, 0]),
+                                        [[np.average(acc[i, 0, max(t-2, 0):t+3]) for t in range(nts)]
+                                         for i in range(2)]))
+
+    def test_ct_decoding_kfold(self):
+
+        data = np.random.rand(2, 40, 8, 30)
+        labels = np.tile(np.repeat([0, 1], 20), [2, 1])
+        data[:, 20:, :, 10:20] += 0.5
+
+        acc = ct_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=2, smooth=False, seed=1)
+        self.assertEqual(acc.shape, (2, 6, 6))
+
+        # the diagonal of the cross-temporal results is the time-by-time decoding
+        tbyt_acc = tbyt_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=2, smooth=False, seed=1)
+        self.assertTrue(np.allclose(np.diagonal(acc, axis1=1, axis2=2), tbyt_acc))
+
+        smooth_acc = ct_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=2, seed=1)
+        self.assertTrue(np.allclose(smooth_acc, decoding_smooth_2d(acc)))
+
+        acc = ct_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=2, classifier="lda", seed=1)
+        self.assertEqual(acc.shape, (2, 6, 6))
+
+    def test_ct_decoding_holdout(self):
+
+        data = np.random.rand(2, 40, 8, 30)
+        labels = np.tile(np.repeat([0, 1], 20), [2, 1])
+
+        acc = ct_decoding_holdout(data, labels, navg=5, iter=3, smooth=False, classifier="ridge", seed=2)
+        self.assertEqual(acc.shape, (2, 6, 6))
+
+        tbyt_acc = tbyt_decoding_holdout(data, labels, navg=5, iter=3, smooth=False, classifier="ridge", seed=2)
+        self.assertTrue(np.allclose(np.diagonal(acc, axis1=1, axis2=2), tbyt_acc))
+
+    def test_bidirectional_transfer_decoding(self):
+
+        rng = np.random.default_rng(5)
+        labels = np.tile(np.repeat([0, 1], 20), [2, 1])
+        pattern = rng.standard_normal([8, 1])
+
+        # the same category pattern at time-window 1 of data1 (8 windows) & at time-window 4 of data2 (6 windows)
+        data1 = rng.random([2, 40, 8, 40])
+        data2 = rng.random([2, 40, 8, 30])
+        data1[:, 20:, :, 5:10] += pattern
+        data2[:, 20:, :, 20:25] += pattern
+
+        acc1to2, acc2to1 = bidirectional_transfer_decoding(data1, labels, data2, labels, iter=2, smooth=False,
+                                                           classifier="lda", seed=6)
+
+        # [n_subs, n_tws1, n_tws2] & [n_subs, n_tws2, n_tws1]
+        self.assertEqual(acc1to2.shape, (2, 8, 6))
+        self.assertEqual(acc2to1.shape, (2, 6, 8))
+
+        # trained on data1 at window 1 & tested on data2 at window 4 (and conversely)
+        self.assertTrue(np.all(acc1to2[:, 1, 4] > 0.9))
+        self.assertTrue(np.all(acc2to1[:, 4, 1] > 0.9))
+        self.assertTrue(np.all(np.average(acc1to2, axis=0) <= np.average(acc1to2, axis=0)[1, 4]))
+        self.assertTrue(np.all(np.average(acc2to1, axis=0) <= np.average(acc2to1, axis=0)[4, 1]))
+
+    def test_decoding_n_jobs(self):
+
+        data = np.random.rand(2, 40, 8, 30)
+        labels = np.tile(np.repeat([0, 1], 20), [2, 1])
+
+        # the seeds of the (subject, repeat) units don't depend on the number of processes
+        acc1 = tbyt_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=3, seed=3, n_jobs=1)
+        acc2 = tbyt_decoding_kfold(data, labels, navg=5, nfolds=2, nrepeats=3, seed=3, n_jobs=2)
+        self.assertTrue(np.array_equal(acc1, acc2))
+
+        acc1 = ct_decoding_holdout(data, labels, navg=5, iter=3, classifier="lda", seed=4, n_jobs=1)
+        acc2 = ct_decoding_holdout(data, labels, navg=5, iter=3, classifier="lda", seed=4, n_jobs=2)
+        self.assertTrue(np.array_equal(acc1, acc2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,6 +29,11 @@ class test_nps_cal(unittest.TestCase):
         output = nps_fmri(fmri_data)
         self.assertEqual(output.shape[0], 10)
 
+        mask = np.zeros([13, 23, 12])
+        mask[4:9, 4:9, 4:9] = 1
+        output = nps_fmri(fmri_data, mask=mask)
+        self.assertTrue(np.isnan(output[:, 0, 0, 0]).all())
+
         fmri_data = np.random.rand(1, 10, 13, 23, 12)
         output = nps_fmri(fmri_data)
         self.assertEqual(output, "Invalid input!")
@@ -4,12 +4,39 @@
 
 __author__ = 'Zitong Lu'
 
+import os
+import tempfile
 import numpy as np
 import unittest
-from neurora.rdm_cal import bhvRDM, eegRDM, fmriRDM, fmriRDM_roi
+from neurora.rdm_cal import batchRDM, crossnobisRDM, bhvRDM, eegRDM, eegRDM_bydecoding, fmriRDM, fmriRDM_roi
+from neurora.stuff import SphereSearchlight
 
 class test_rdm_cal(unittest.TestCase):
 
+    def test_batchRDM(self):
+
+        data = np.random.rand(5, 8, 20)
+        rdms = batchRDM(data)
+        self.assertEqual(rdms.shape, (5, 8, 8))
+
+        rdms = batchRDM(data, method="euclidean")
+        self.assertEqual(rdms.shape, (5, 8, 8))
+
+        rdms = batchRDM(data, method="mahalanobis", noise=np.random.rand(5, 40, 20))
+        self.assertEqual(rdms.shape, (5, 8, 8))
+        self.assertTrue(np.allclose(rdms, np.transpose(rdms, (0, 2, 1))))
+
+        output = batchRDM(data, method="cosine")
+        self.assertEqual(output, "Invalid input!")
+
+    def test_crossnobisRDM(self):
+
+        folds = np.random.rand(5, 3, 8, 20)
+        noise = np.random.rand(5, 40, 20)
+        rdms = crossnobisRDM(folds, noise)
+        self.assertEqual(rdms.shape, (5, 8, 8))
+        self.assertTrue(np.allclose(rdms, np.transpose(rdms, (0, 2, 1))))
+
     def test_bhvRDM(self):
 
         bhv_data = np.random.rand(8, 10, 20)
@@ -38,6 +65,16 @@ class test_rdm_cal(unittest.TestCase):
         rdms = eegRDM(eeg_data, sub_opt=0, chl_opt=1, time_opt=1)
         self.assertEqual(rdms.shape[0], 32)
 
+        rdms = eegRDM(eeg_data, sub_opt=1, chl_opt=0, time_opt=1, method="mahalanobis")
+        self.assertEqual(rdms.shape, (10, 10, 8, 8))
+
+        rdms = eegRDM(eeg_data, sub_opt=0, chl_opt=0, time_opt=1, time_win=1, time_step=1, method="crossnobis",
+                      nfolds=3)
+        self.assertEqual(rdms.shape, (50, 8, 8))
+
+        output = eegRDM(eeg_data, method="crossnobis", nfolds=16)
+        self.assertEqual(output, "Invalid input!")
+
         rdms = eegRDM(eeg_data, sub_opt=1, chl_opt=0, time_opt=0)
         self.assertEqual(rdms.shape[0], 10)
 
@@ -50,10 +87,33 @@ class test_rdm_cal(unittest.TestCase):
         rdms = eegRDM(eeg_data, sub_opt=1, chl_opt=1, time_opt=1)
         self.assertEqual(rdms.shape[0], 10)
 
+        rdms = eegRDM(eeg_data, sub_opt=1, chl_opt=0, time_opt=1, condensed=True, dtype=np.float32)
+        self.assertEqual(rdms.shape, (10, 10))
+        self.assertEqual(rdms.vectors.shape, (10, 10, 28))
+
+        rdms = eegRDM(eeg_data, sub_opt=1, chl_opt=0, time_opt=1, condensed=True, dtype=np.int32)
+        self.assertEqual(rdms, "Invalid input!")
+
         eeg_data = np.random.rand(8, 10, 15, 32)
         output = bhvRDM(eeg_data)
         self.assertEqual(output, "Invalid input!")
 
+    def test_eegRDM_bydecoding(self):
+
+        eeg_data = np.random.rand(4, 2, 20, 8, 20)
+        rdms = eegRDM_bydecoding(eeg_data, navg=5, nfolds=2, nrepeats=1)
+        self.assertEqual(rdms.shape, (2, 4, 4, 4))
+        self.assertTrue(np.array_equal(rdms, np.transpose(rdms, (0, 1, 3, 2))))
+
+        rdms = eegRDM_bydecoding(eeg_data, navg=5, nfolds=2, nrepeats=1, classifier="lda")
+        self.assertEqual(rdms.shape, (2, 4, 4, 4))
+
+        output = eegRDM_bydecoding(eeg_data, navg=5, nfolds=5)
+        self.assertEqual(output, "Invalid input!")
+
+        output = eegRDM_bydecoding(eeg_data, classifier="knn")
+        self.assertEqual(output, "Invalid input!")
+
     def test_fmriRDM(self):
 
         fmri_data = np.random.rand(8, 10, 13, 23, 12)
@@ -63,6 +123,24 @@ class test_rdm_cal(unittest.TestCase):
         rdms = fmriRDM(fmri_data, sub_opt=1)
         self.assertEqual(rdms.shape[0], 10)
 
+        mask = np.zeros([13, 23, 12])
+        mask[4:9, 4:9, 4:9] = 1
+        rdms = fmriRDM(fmri_data, sub_opt=0, mask=mask)
+        self.assertEqual(rdms.shape[0], 11)
+        self.assertTrue(np.isnan(rdms[0, 0, 0]).all())
+        self.assertFalse(np.isnan(rdms[4, 4, 4]).any())
+
+        searchlight = SphereSearchlight([13, 23, 12], radius=2, mask=mask)
+        rdms = fmriRDM(fmri_data, sub_opt=1, searchlight=searchlight)
+        self.assertEqual(rdms.shape, (10, 13, 23, 12, 8, 8))
+
+        output = fmriRDM(fmri_data, sub_opt=1, mask=mask, n_jobs=2)
+        self.assertTrue(np.array_equal(output, fmriRDM(fmri_data, sub_opt=1, mask=mask), equal_nan=True))
+
+        filename = os.path.join(tempfile.mkdtemp(), "rdms.npy")
+        output = fmriRDM(fmri_data, sub_opt=1, mask=mask, out=filename)
+        self.assertEqual(output.shape, (10, 11, 21, 10, 28))
+
     def test_fmriRDM_roi(self):
 
         fmri_data = np.random.rand(8, 10, 13, 23, 12)
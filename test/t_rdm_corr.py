@@ -7,7 +7,8 @@ __author__ = 'Zitong Lu'
 import numpy as np
 import unittest
 from neurora.rdm_corr import rdm_correlation_pearson, rdm_correlation_spearman, rdm_correlation_kendall, rdm_distance,\
-    rdm_similarity
+    rdm_similarity, rdm_correlation_spearman_batch
+from neurora.stuff import CondensedRDM
 
 class test_rdm_corr(unittest.TestCase):
 
@@ -35,10 +36,28 @@ class test_rdm_corr(unittest.TestCase):
         rp = rdm_correlation_spearman(rdm1, rdm2, permutation=False)
         self.assertEqual(len(rp), 2)
 
+        rp = rdm_correlation_spearman(CondensedRDM.from_rdm(rdm1), rdm2, permutation=False)
+        self.assertEqual(len(rp), 2)
+
+        rp = rdm_correlation_spearman(rdm1, rdm2, permutation=True, mantel=True, seed=0)
+        self.assertEqual(len(rp), 2)
+
         rdm1 = np.random.rand(8, 7)
         rp = rdm_correlation_spearman(rdm1, rdm2)
         self.assertEqual(rp, "Invalid input!")
 
+    def test_rdm_correlation_spearman_batch(self):
+
+        rdm1 = np.random.rand(8, 8)
+        rdms2 = np.random.rand(3, 4, 8, 8)
+        rp = rdm_correlation_spearman_batch(rdm1, rdms2)
+        self.assertEqual(rp.shape, (3, 4, 2))
+        self.assertTrue(np.allclose(rp[1, 2], rdm_correlation_spearman(rdm1, rdms2[1, 2])))
+
+        rdms2 = np.random.rand(3, 8, 7)
+        rp = rdm_correlation_spearman_batch(rdm1, rdms2)
+        self.assertEqual(rp, "Invalid input!")
+
     def test_rdm_correlation_kendall(self):
 
         rdm1 = np.random.rand(8, 8)
@@ -49,6 +68,9 @@ class test_rdm_corr(unittest.TestCase):
         rp = rdm_correlation_kendall(rdm1, rdm2, permutation=False)
         self.assertEqual(len(rp), 2)
 
+        rp = rdm_correlation_kendall(np.round(rdm1 * 3), rdm2, permutation=True, variant="a")
+        self.assertEqual(len(rp), 2)
+
         rdm1 = np.random.rand(8, 7)
         rp = rdm_correlation_kendall(rdm1, rdm2)
         self.assertEqual(rp, "Invalid input!")
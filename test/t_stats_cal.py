@@ -26,6 +26,11 @@ class test_stats_cal(unittest.TestCase):
         output = stats_fmri(corrs, permutation=False)
         self.assertEqual(output.shape[0], 13)
 
+        corrs[:, 0, 0, 0] = np.nan
+        output = stats_fmri(corrs, permutation=True, iter=100)
+        self.assertEqual(output.shape, (13, 14, 12, 2))
+        self.assertTrue(np.isnan(output[0, 0, 0, 1]))
+
         corrs = np.random.rand(8, 13, 14, 12)
         output = stats_fmri(corrs, permutation=False)
         self.assertEqual(output, "Invalid input!")
@@ -7,8 +7,14 @@ __author__ = 'Zitong Lu'
 import os
 import numpy as np
 import unittest
-from neurora.stuff import limtozero, get_affine, fisherz_rdm, fwe_correct, fdr_correct, correct_by_threshold, \
-    get_bg_ch2, get_bg_ch2bet, get_HOcort, datamask, position_to_mni, mask_to, permutation_test, permutation_corr
+from scipy.stats import kendalltau
+from neurora.stuff import limtozero, get_affine, fwe_correct, fdr_correct, correct_by_threshold, \
+    get_bg_ch2, get_bg_ch2bet, get_HOcort, datamask, position_to_mni, mask_to, permutation_test, permutation_corr, \
+    sliding_time_windows, window_average, searchlight_patches, searchlight_centers, \
+    SphereSearchlight, to_shared_memory, from_shared_memory, pool_imap, rdm_to_condensed, condensed_to_rdm, \
+    CondensedRDM, rdm_vector, permutation_indices, permutation_corr_batch, mantel_indices, count_inversions, \
+    kendall_tau_batch, signflip_matrix, permutation_signflip, get_cluster_labels, get_cluster_index_2d_2sided, \
+    clusterbased_permutation_2d_1samp_2sided, tfce, tfce_permutation_signflip
 
 class test_stuff(unittest.TestCase):
 
@@ -22,6 +28,114 @@ class test_stuff(unittest.TestCase):
         output = limtozero(x)
         self.assertEqual(output, 2)
 
+    def test_rdm_to_condensed(self):
+
+        rdms = np.random.rand(3, 8, 8)
+        output = rdm_to_condensed(rdms)
+        self.assertEqual(output.shape, (3, 28))
+
+        output = rdm_to_condensed(np.random.rand(3, 7, 8))
+        self.assertEqual(output, "Invalid input!")
+
+    def test_condensed_to_rdm(self):
+
+        rdm = np.random.rand(8, 8)
+        rdm = rdm + rdm.T
+        np.fill_diagonal(rdm, 0)
+        output = condensed_to_rdm(rdm_to_condensed(rdm))
+        self.assertTrue(np.array_equal(output, rdm))
+
+        output = condensed_to_rdm(np.random.rand(3, 27))
+        self.assertEqual(output, "Invalid input!")
+
+    def test_CondensedRDM(self):
+
+        rdms = np.random.rand(3, 8, 8)
+        output = CondensedRDM.from_rdm(rdms, dtype=np.float32)
+        self.assertEqual(output.shape, (3,))
+        self.assertEqual(output.vectors.shape, (3, 28))
+        self.assertEqual(output.dtype, np.float32)
+        self.assertEqual(output[0].to_rdm().shape, (8, 8))
+
+        self.assertRaises(ValueError, CondensedRDM, np.random.rand(3, 27))
+        self.assertRaises(ValueError, CondensedRDM, np.random.rand(3, 28), dtype=np.int64)
+
+    def test_rdm_vector(self):
+
+        rdm = np.random.rand(8, 8)
+        output = rdm_vector(rdm)
+        self.assertEqual(output.shape, (28,))
+        self.assertTrue(np.array_equal(output, rdm_vector(CondensedRDM.from_rdm(rdm))))
+
+        output = rdm_vector(np.random.rand(7, 8))
+        self.assertEqual(output, "Invalid input!")
+
+    def test_sliding_time_windows(self):
+
+        data = np.random.rand(4, 3, 50)
+        output = sliding_time_windows(data, time_win=10, time_step=5)
+        self.assertEqual(output.shape, (4, 3, 9, 10))
+
+        output = sliding_time_windows(data, time_win=60, time_step=5)
+        self.assertEqual(output, "Invalid input!")
+
+    def test_window_average(self):
+
+        data = np.random.rand(4, 3, 50)
+        output = window_average(data, time_win=10, time_step=5)
+        self.assertEqual(output.shape, (4, 3, 9))
+        self.assertAlmostEqual(output[0, 0, 1], np.average(data[0, 0, 5:15]))
+
+        output = window_average(data, time_win=60, time_step=5)
+        self.assertEqual(output, "Invalid input!")
+
+    def test_searchlight_patches(self):
+
+        fmri_data = np.random.rand(4, 3, 9, 10, 11)
+        output = searchlight_patches(fmri_data, ksize=[3, 3, 3], strides=[2, 2, 2])
+        self.assertEqual(output.shape, (4, 3, 4, 4, 5, 3, 3, 3))
+
+        output = searchlight_patches(fmri_data, ksize=[3, 3, 13])
+        self.assertEqual(output, "Invalid input!")
+
+    def test_searchlight_centers(self):
+
+        mask = np.zeros([9, 10, 11])
+        mask[3:6, 3:6, 3:6] = 1
+        output = searchlight_centers(mask, [9, 10, 11], ksize=[3, 3, 3], strides=[1, 1, 1])
+        self.assertEqual(output.shape, (7, 8, 9))
+        self.assertEqual(np.sum(output), 27)
+
+        output = searchlight_centers(mask, [9, 10, 12])
+        self.assertEqual(output, "Invalid input!")
+
+    def test_SphereSearchlight(self):
+
+        mask = np.zeros([9, 10, 11])
+        mask[2:7, 2:7, 2:7] = 1
+        searchlight = SphereSearchlight([9, 10, 11], radius=1, mask=mask)
+        self.assertEqual(len(searchlight), 125)
+        self.assertEqual(len(searchlight.neighbors(62)), 7)
+
+        output = searchlight.to_volume(np.ones([125, 2]))
+        self.assertEqual(output.shape, (9, 10, 11, 2))
+
+    def test_to_shared_memory(self):
+
+        data = np.random.rand(4, 5)
+        shm, shared = to_shared_memory(data)
+        shm2, output = from_shared_memory(shm.name, shared.shape, shared.dtype)
+        self.assertTrue(np.array_equal(output, data))
+        shm2.close()
+        shm.close()
+        shm.unlink()
+
+    def test_pool_imap(self):
+
+        tasks = [np.arange(i) for i in range(10)]
+        output = list(pool_imap(np.sum, tasks, n_jobs=2))
+        self.assertEqual(output, [np.sum(task) for task in tasks])
+
     def test_get_affine(self):
 
         img = '../neurora/template/ch2.nii.gz'
@@ -45,6 +159,11 @@ class test_stuff(unittest.TestCase):
         output = fwe_correct(p, p_threshold)
         self.assertEqual(output.shape[0], 20)
 
+        p = np.array([[0.001, 0.02], [0.3, np.nan]])
+        output = fwe_correct(p, p_threshold)
+        self.assertAlmostEqual(output[0, 0], 0.003)
+        self.assertTrue(np.isnan(output[0, 1]))
+
     def test_fdr_correct(self):
 
         p = np.random.rand(20, 22, 21)
@@ -52,6 +171,15 @@ class test_stuff(unittest.TestCase):
         output = fdr_correct(p, p_threshold)
         self.assertEqual(output.shape[0], 20)
 
+        p = np.random.rand(3, 32, 50)
+        output = fdr_correct(p, p_threshold, method="BY", stack=True)
+        self.assertEqual(output.shape, (3, 32, 50))
+
+        p = np.array([0.01, 0.04, 0.03, 0.2])
+        output = fdr_correct(p, p_threshold)
+        self.assertTrue(np.allclose(output[:3], [0.04, 0.16/3, 0.16/3]))
+        self.assertTrue(np.isnan(output[3]))
+
     def test_correct_by_threshold(self):
 
         img = np.random.rand(20, 22, 21)
@@ -116,5 +244,111 @@ class test_stuff(unittest.TestCase):
         output = permutation_corr(v1, v2)
         self.assertIsNotNone(output)
 
+    def test_permutation_indices(self):
+
+        output = permutation_indices(20, iter=100, seed=0)
+        self.assertEqual(output.shape, (100, 20))
+        self.assertTrue(np.array_equal(output, permutation_indices(20, iter=100, seed=0)))
+
+    def test_permutation_corr_batch(self):
+
+        v1 = np.random.rand(20)
+        v2s = np.random.rand(3, 4, 20)
+        output = permutation_corr_batch(v1, v2s, seed=0)
+        self.assertEqual(output.shape, (3, 4))
+        self.assertEqual(output[1, 2], permutation_corr(v1, v2s[1, 2], seed=0))
+
+        output = permutation_corr_batch(v1, np.random.rand(3, 19))
+        self.assertEqual(output, "Invalid input")
+
+        v2s = np.random.rand(3, 20)
+        v2s[1, 5] = np.nan
+        v2s[2] = 1
+        for method in ["spearman", "pearson", "kendall"]:
+            output = permutation_corr_batch(v1, v2s, method=method, iter=100, seed=0)
+            self.assertFalse(np.isnan(output[0]))
+            self.assertTrue(np.isnan(output[1]))
+            self.assertTrue(np.isnan(output[2]))
+
+    def test_signflip_matrix(self):
+
+        output = signflip_matrix(10, iter=100, seed=0)
+        self.assertEqual(output.shape, (100, 10))
+        self.assertTrue(np.array_equal(np.abs(output), np.ones([100, 10])))
+
+    def test_permutation_signflip(self):
+
+        v1 = np.random.rand(10, 4, 5)
+        v2 = np.random.rand(10, 4, 5)
+        p, p_fwe = permutation_signflip(v1, v2, iter=200, seed=0)
+        self.assertEqual(p.shape, (4, 5))
+        self.assertTrue(np.all(p_fwe >= p))
+
+        output = permutation_signflip(v1, np.random.rand(10, 4, 4))
+        self.assertEqual(output, "Invalid input")
+
+    def test_get_cluster_labels(self):
+
+        m = np.array([[1, 1, 0, 1], [0, 1, 0, 0], [1, 0, 1, 1]])
+        output = get_cluster_labels(m)
+        self.assertEqual(output[1], 2)
+        self.assertTrue(np.array_equal(output[0], [[1, 1, 0, 0], [0, 1, 0, 0], [0, 0, 2, 2]]))
+
+        output = get_cluster_index_2d_2sided(-m)
+        self.assertEqual(output[1], 0)
+        self.assertEqual(output[3], 2)
+
+    def test_clusterbased_permutation_2d_1samp_2sided(self):
+
+        results = np.random.rand(10, 12, 12) - 0.5
+        results[:, 2:6, 2:6] = results[:, 2:6, 2:6] + 1
+        output = clusterbased_permutation_2d_1samp_2sided(results, iter=100)
+        self.assertEqual(output.shape, (12, 12))
+        self.assertTrue(np.all(output[2:6, 2:6] == 1))
+
+    def test_tfce(self):
+
+        ts = np.array([0, 1, 2, 1, 0, 3, 0])
+        output = tfce(ts, E=1, H=0, dh=1)
+        self.assertTrue(np.array_equal(output, [0, 3, 4, 3, 0, 3, 0]))
+
+        output = tfce(np.random.randn(10, 12, 8))
+        self.assertEqual(output.shape, (10, 12, 8))
+
+    def test_tfce_permutation_signflip(self):
+
+        x = np.random.rand(10, 20, 20) - 0.5
+        x[:, 5:10, 5:10] = x[:, 5:10, 5:10] + 1
+        output = tfce_permutation_signflip(x, iter=100, sided=2)
+        self.assertEqual(output[1].shape, (20, 20))
+        self.assertTrue(np.all(output[1][5:10, 5:10] < 0.05))
+
+    def test_count_inversions(self):
+
+        y = np.array([[3, 1, 2, 0], [0, 1, 2, 3]])
+        output = count_inversions(y)
+        self.assertTrue(np.array_equal(output[0], [5, 0]))
+        self.assertTrue(np.array_equal(output[1], [[0, 1, 2, 3], [0, 1, 2, 3]]))
+
+    def test_kendall_tau_batch(self):
+
+        v1 = np.round(np.random.rand(50) * 3)
+        v2s = np.random.rand(3, 4, 50)
+        output = kendall_tau_batch(v1, v2s)
+        self.assertEqual(output.shape, (3, 4))
+        self.assertAlmostEqual(output[1, 2], kendalltau(v1, v2s[1, 2])[0])
+
+        output = kendall_tau_batch(v1, v2s, variant="c")
+        self.assertEqual(output, "Invalid input")
+
+    def test_mantel_indices(self):
+
+        rdm = np.random.rand(8, 8)
+        rdm = rdm + rdm.T
+        output = mantel_indices(8, iter=100, seed=0)
+        self.assertEqual(output.shape, (100, 28))
+        labels = permutation_indices(8, iter=100, seed=0)[3]
+        self.assertTrue(np.array_equal(rdm_to_condensed(rdm)[output[3]], rdm_to_condensed(rdm[labels][:, labels])))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file